@@ -0,0 +1,150 @@
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from updater.server_control import RCON_AUTH_FAILED, RCON_COMMAND, RCON_LOGIN, RCON_RESPONSE
+
+DEFAULT_PASSWORD = "benchmark"
+MAX_PAYLOAD_BYTES = 4096
+POLL_SECONDS = 0.05
+CLOSING_COMMANDS = ("stop", "restart")
+RESPONSES = {
+    "save-off": "Automatic saving is now disabled",
+    "save-on": "Automatic saving is now enabled",
+    "save-all": "Saving the game (this may take a moment!)",
+    "save-all flush": "Saving the game (this may take a moment!)Saved the game",
+}
+
+class FakeRconRequestHandler(socketserver.BaseRequestHandler):
+    def _read_packet(self):
+        header = self._read_exactly(4)
+        if header is None:
+            return None
+        body = self._read_exactly(struct.unpack('<i', header)[0])
+        if body is None:
+            return None
+        request_id, packet_type = struct.unpack_from('<ii', body)
+        return request_id, packet_type, body[8:-2].decode('utf-8', errors='replace')
+
+    def _read_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            try:
+                chunk = self.request.recv(size - len(data))
+            except OSError:
+                return None
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _send_packet(self, request_id, packet_type, payload):
+        body = struct.pack('<ii', request_id, packet_type) + payload + b'\0\0'
+        self.request.sendall(struct.pack('<i', len(body)) + body)
+
+    def _send_response(self, request_id, response):
+        """Sends a response like the server does: split into packets of at most MAX_PAYLOAD_BYTES."""
+        data = response.encode('utf-8')
+        for start in range(0, max(1, len(data)), MAX_PAYLOAD_BYTES):
+            self._send_packet(request_id, RCON_RESPONSE, data[start:start + MAX_PAYLOAD_BYTES])
+
+    def handle(self):
+        server = self.server.fake
+        server.add_connection(self.request)
+        try:
+            self._serve(server)
+        except OSError:
+            pass
+        finally:
+            server.remove_connection(self.request)
+
+    def _serve(self, server):
+        authenticated = False
+        while True:
+            packet = self._read_packet()
+            if packet is None:
+                return
+            request_id, packet_type, payload = packet
+            if packet_type == RCON_LOGIN:
+                authenticated = payload == server.password
+                self._send_packet(request_id if authenticated else RCON_AUTH_FAILED, RCON_COMMAND, b"")
+            elif packet_type == RCON_COMMAND and authenticated:
+                response = server.run_command(payload)
+                if response is None:
+                    return
+                self._send_response(request_id, response)
+            elif authenticated:
+                self._send_response(request_id, f"Unknown request {packet_type:x}")
+            else:
+                return
+
+class FakeRconServer:
+    def __init__(self, password=DEFAULT_PASSWORD, save_seconds=0.0):
+        """
+        A local server speaking the Minecraft RCON protocol, answering save commands like a real server.
+
+        Args:
+            password (str): The password clients must log in with.
+            save_seconds (float): How long "save-all flush" takes before it answers.
+        """
+        self.password = password
+        self.save_seconds = save_seconds
+        self.responses = dict(RESPONSES)
+        self.commands = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._sockets = set()
+        self._server = None
+        self._thread = None
+
+    def add_connection(self, sock):
+        with self._lock:
+            self.connections += 1
+            self._sockets.add(sock)
+
+    def remove_connection(self, sock):
+        with self._lock:
+            self._sockets.discard(sock)
+
+    def drop_connections(self):
+        """Closes every open client connection, like a server that restarted."""
+        with self._lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run_command(self, command):
+        """Returns the response to a command, or None for one that closes the connection like "stop"."""
+        with self._lock:
+            self.commands.append(command)
+        if command == "save-all flush":
+            time.sleep(self.save_seconds)
+        if command in CLOSING_COMMANDS:
+            return None
+        if command.startswith("say "):
+            return ""
+        return self.responses.get(command, f"Unknown or incomplete command: {command}")
+
+    def start(self):
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeRconRequestHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(POLL_SECONDS,), name="fake-rcon", daemon=True)
+        self._thread.start()
+        return self.settings()
+
+    def settings(self):
+        """Returns the rcon settings for a FileManager pointed at this server."""
+        host, port = self._server.server_address
+        return {'host': host, 'port': port, 'password': self.password}
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
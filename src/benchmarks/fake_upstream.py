@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+from downloaders.geyser_downloader import GeyserDownloader
+from downloaders.geyser_floodgate_downloader import FloodgateDownloader
+from downloaders.paper_downloader import BASE_URL as PAPER_BASE_URL
+from downloaders.paper_downloader import PROJECT as PAPER_PROJECT
+from downloaders.viaversion_downloader import ViaVersionDownloader
+from updater.build_cache import LEGACY_CACHE_FILE
+from updater.mirror import MirrorRecorder, MirrorRequestHandler, create_mirror_server
+
+DEFAULT_ARTIFACT_SIZE_MB = 8
+WRITE_CHUNK_SIZE = 1024 * 1024
+SPIGOTMC_VERSION_ID = "1000001"
+
+class RequestCounters:
+    def __init__(self):
+        """Counts the requests a fake upstream answered and the body bytes it sent, per host."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_served = 0
+            self.by_host = {}
+
+    def count_request(self, host):
+        with self._lock:
+            self.requests += 1
+            self.by_host[host] = self.by_host.get(host, 0) + 1
+
+    def count_bytes(self, size):
+        with self._lock:
+            self.bytes_served += size
+
+    def snapshot(self):
+        with self._lock:
+            return {'requests': self.requests, 'bytes_served': self.bytes_served, 'requests_by_host': dict(self.by_host)}
+
+class CountingMirrorRequestHandler(MirrorRequestHandler):
+    counters = None
+
+    def _serve(self, send_body):
+        self.counters.count_request(urlsplit(self.path).path.lstrip('/').partition('/')[0])
+        super()._serve(send_body)
+
+    def send_header(self, keyword, value):
+        if keyword == 'Content-Length' and self.command == 'GET':
+            self.counters.count_bytes(int(value))
+        super().send_header(keyword, value)
+
+class FakeUpstream:
+    def __init__(self, root, seed_file=LEGACY_CACHE_FILE, artifact_size_mb=DEFAULT_ARTIFACT_SIZE_MB):
+        """
+        Records PaperMC v2, GeyserMC v2 and SpigotMC responses into a mirror directory and serves them locally.
+
+        Paper builds are replayed from seed_file (the legacy Paper build cache); jars are random
+        data of artifact_size_mb with their real SHA-256 in the metadata, so downloads verify.
+
+        Args:
+            root (str): The directory the responses are recorded into.
+            seed_file (str): A paper_build_cache.json to take Paper versions and builds from.
+            artifact_size_mb (int): The size of every served jar.
+        """
+        self.root = root
+        self.seed_file = seed_file
+        self.artifact_size = artifact_size_mb * 1024 * 1024
+        self.recorder = MirrorRecorder(root)
+        self.counters = RequestCounters()
+        self.server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _record_json(self, url, data):
+        self.recorder.record_bytes(url, json.dumps(data).encode(), 'application/json')
+
+    def _record_jar(self, url, seed):
+        """Records a jar of random data for url and returns its SHA-256."""
+        sha256 = hashlib.sha256()
+        temp_path = os.path.join(self.root, f".{seed}.jar")
+        with open(temp_path, 'wb') as f:
+            remaining = self.artifact_size
+            while remaining > 0:
+                data = os.urandom(min(WRITE_CHUNK_SIZE, remaining))
+                sha256.update(data)
+                f.write(data)
+                remaining -= len(data)
+        self.recorder.record_file(url, temp_path)
+        os.remove(temp_path)
+        return sha256.hexdigest()
+
+    def _load_seed_builds(self):
+        try:
+            with open(self.seed_file, 'r') as f:
+                builds = list(json.load(f).values())
+        except (FileNotFoundError, json.JSONDecodeError):
+            builds = []
+        if not builds:
+            builds = [{'version': '1.21.4', 'build': 1, 'channel': 'default',
+                       'downloads': {'application': {'name': 'paper-1.21.4-1.jar'}}}]
+        return builds
+
+    def _populate_paper(self):
+        versions = {}
+        for build in self._load_seed_builds():
+            versions.setdefault(build['version'], []).append(dict(build))
+        ordered_versions = sorted(versions, key=lambda v: [int(part) for part in v.split('.') if part.isdigit()])
+        self._record_json(f"{PAPER_BASE_URL}/projects/{PAPER_PROJECT}",
+                          {'project_id': PAPER_PROJECT, 'project_name': 'Paper', 'versions': ordered_versions})
+        for version in ordered_versions:
+            builds = sorted(versions[version], key=lambda build: build['build'])
+            served = {builds[-1]['build']}
+            stable = [build for build in builds if build.get('channel') == 'default']
+            if stable:
+                served.add(stable[-1]['build'])
+            for build in builds:
+                build.setdefault('downloads', {}).setdefault(
+                    'application', {'name': f"paper-{version}-{build['build']}.jar"})
+                build_url = f"{PAPER_BASE_URL}/projects/{PAPER_PROJECT}/versions/{version}/builds/{build['build']}"
+                if build['build'] in served:
+                    application = build['downloads']['application']
+                    application['sha256'] = self._record_jar(
+                        f"{build_url}/downloads/{application['name']}", f"paper-{version}-{build['build']}")
+                self._record_json(build_url, build)
+            self._record_json(f"{PAPER_BASE_URL}/projects/{PAPER_PROJECT}/versions/{version}",
+                              {'project_id': PAPER_PROJECT, 'version': version,
+                               'builds': [build['build'] for build in builds]})
+            self._record_json(f"{PAPER_BASE_URL}/projects/{PAPER_PROJECT}/versions/{version}/builds",
+                              {'project_id': PAPER_PROJECT, 'project_name': 'Paper', 'version': version,
+                               'builds': [{key: value for key, value in build.items()
+                                           if key not in ('project_id', 'project_name', 'version')}
+                                          for build in builds]})
+
+    def _populate_geysermc(self, downloader_class, version="2.6.0", build=700):
+        name = f"{downloader_class.PROJECT}-{downloader_class.DOWNLOAD_SUBPATH}.jar"
+        download_url = downloader_class.DOWNLOAD_BASE_URL_V2.format(
+            project=downloader_class.PROJECT, version=version, build=build, download=downloader_class.DOWNLOAD_SUBPATH)
+        sha256 = self._record_jar(download_url, f"{downloader_class.PROJECT}-{build}")
+        info = {'project_id': downloader_class.PROJECT, 'version': version, 'build': build,
+                'downloads': {downloader_class.DOWNLOAD_SUBPATH: {'name': name, 'sha256': sha256}}}
+        self._record_json(downloader_class.API_BASE_URL_V2_LATEST, info)
+        self._record_json(downloader_class.API_BASE_URL_V2_BUILD.format(
+            project=downloader_class.PROJECT, version=version, build=build), info)
+
+    def _populate_spigotmc(self, resource_url=ViaVersionDownloader.SPIGOTMC_URL):
+        resource_path = urlsplit(resource_url).path.strip('/').rsplit('/', 1)[0]
+        href = f"{resource_path}/download?version={SPIGOTMC_VERSION_ID}"
+        page = (
+            "<!DOCTYPE html><html><head><title>Benchmark resource</title></head><body>"
+            + "<div class=\"navigation\"><a href=\"/\">Home</a></div>" * 200
+            + f"<label class=\"downloadButton\"><a href=\"{href}\" class=\"inner\">Download Now</a></label>"
+            + "<div class=\"history\">version history</div>" * 2000
+            + "</body></html>"
+        )
+        self.recorder.record_bytes(resource_url, page.encode(), 'text/html')
+        self._record_jar(f"https://www.spigotmc.org/{href}", "spigotmc")
+
+    def populate(self):
+        """Records every fake upstream response under root."""
+        os.makedirs(self.root, exist_ok=True)
+        self._populate_paper()
+        self._populate_geysermc(GeyserDownloader)
+        self._populate_geysermc(FloodgateDownloader)
+        self._populate_spigotmc()
+
+    def start(self, host="127.0.0.1", port=0):
+        handler = type('BenchmarkMirrorRequestHandler', (CountingMirrorRequestHandler,), {'counters': self.counters})
+        self.server = create_mirror_server(self.root, host, port, handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
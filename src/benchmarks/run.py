@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.fake_rcon import FakeRconServer
+from benchmarks.fake_upstream import DEFAULT_ARTIFACT_SIZE_MB, FakeUpstream
+from benchmarks.worlds import generate_world, touch_world
+from downloaders.paper_downloader import StableVersionStrategy
+from downloaders.registry import DEFAULT_ARTIFACTS
+from updater.artifact_downloader import configure_artifact_downloader
+from updater.build_cache import configure_build_cache
+from updater.file_manager import FileManager
+from updater.http_client import configure_http_client
+from updater.incremental_backup import IncrementalBackup
+from updater.metrics import get_metrics
+from updater.update_plan import UpdatePlan
+
+DEFAULT_OUTPUT_DIRECTORY = "benchmark_results"
+DEFAULT_WORLD_SIZE_MB = 64
+BENCHMARK_ARTIFACTS = DEFAULT_ARTIFACTS + [{'type': 'viaversion', 'name': 'ViaVersion'}]
+BACKUP_COMPRESSIONS = ("gzip", "gzip-indexed", "zstd", "none")
+RCON_SAVE_SECONDS = 0.25
+RCON_BACKUPS = 3
+COMPARED_METRICS = ("seconds", "requests", "bytes_served", "bytes_hashed", "megabytes_per_second")
+
+def peak_rss_kb():
+    """Returns the process's peak resident set size so far in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+class Benchmark:
+    def __init__(self, work_directory, upstream, verbose=False):
+        """
+        Runs update and backup scenarios against a FakeUpstream and collects one result per scenario.
+
+        Args:
+            work_directory (str): A scratch directory for caches, downloads, worlds and backups.
+            upstream (FakeUpstream): The started fake upstream every request goes to.
+            verbose (bool): Whether to show the output of the code under test.
+        """
+        self.work_directory = work_directory
+        self.upstream = upstream
+        self.verbose = verbose
+        self.results = []
+
+    def reset_clients(self, name):
+        """Points the shared clients at the fake upstream with empty caches, like a first run on a new host."""
+        state_directory = os.path.join(self.work_directory, name)
+        os.makedirs(state_directory, exist_ok=True)
+        configure_build_cache(database=os.path.join(state_directory, "build_cache.sqlite3"), legacy_file=None)
+        configure_http_client(mirror_url=self.upstream.url)
+        configure_artifact_downloader()
+        return state_directory
+
+    def close(self):
+        """Flushes the caches in the scratch directory and detaches the shared clients from it."""
+        configure_http_client(cache=False)
+        configure_build_cache(database=":memory:", legacy_file=None)
+
+    def measure(self, name, scenario, **details):
+        """Runs scenario() and records its wall time, upstream traffic, hashing and peak memory."""
+        self.upstream.counters.reset()
+        metrics = get_metrics()
+        hashed_before = metrics.total("hashed_bytes_total")
+        output = io.StringIO()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            if not self.verbose:
+                stack.enter_context(contextlib.redirect_stdout(output))
+                stack.enter_context(contextlib.redirect_stderr(output))
+            extra = scenario() or {}
+        seconds = time.perf_counter() - started
+        result = dict(name=name, seconds=round(seconds, 4), bytes_hashed=metrics.total("hashed_bytes_total") - hashed_before,
+                      peak_rss_kb=peak_rss_kb(), **self.upstream.counters.snapshot())
+        result.update(details)
+        result.update(extra)
+        self.results.append(result)
+        print(f"{name:<28} {seconds:8.2f}s  {result['requests']:4d} requests  {result['bytes_hashed']:>12} bytes hashed")
+        return result
+
+    def run_resolution(self):
+        self.reset_clients("resolution")
+        self.measure("stable_resolution_cold", lambda: {'resolved': StableVersionStrategy().get_version_and_build()})
+        self.measure("stable_resolution_warm", lambda: {'resolved': StableVersionStrategy().get_version_and_build()})
+
+    def run_update(self):
+        state_directory = self.reset_clients("update")
+        download_directory = os.path.join(state_directory, "downloads")
+        plan = UpdatePlan(BENCHMARK_ARTIFACTS)
+
+        def update():
+            results = plan.run(download_directory)
+            return {'failed': [result['artifact'] for result in results if result['error']]}
+
+        self.measure("update_cold", update, artifacts=len(BENCHMARK_ARTIFACTS))
+        self.measure("update_warm", update, artifacts=len(BENCHMARK_ARTIFACTS))
+
+    def run_backups(self, world_size_mb):
+        server_directory = os.path.join(self.work_directory, "server")
+        world_bytes = generate_world(server_directory, world_size_mb)
+        megabytes = world_bytes / (1024 * 1024)
+
+        def throughput(result):
+            result['megabytes_per_second'] = round(megabytes / result['seconds'], 2) if result['seconds'] else None
+
+        for compression in BACKUP_COMPRESSIONS:
+            backup_directory = os.path.join(self.work_directory, f"backups_{compression}")
+            file_manager = FileManager(server_directory, backup_directory, "benchmark", compression=compression)
+
+            def backup():
+                file_manager.create_server_backup()
+                return {'save_off_seconds': file_manager.save_off_seconds,
+                        'backup_bytes': sum(entry.stat().st_size for entry in os.scandir(backup_directory)
+                                            if entry.is_file())}
+
+            throughput(self.measure(f"backup_archive_{compression}", backup, world_bytes=world_bytes))
+
+        self.run_rcon_backups(server_directory)
+
+        repository = IncrementalBackup(server_directory, os.path.join(self.work_directory, "incremental"))
+        throughput(self.measure("backup_incremental_full", lambda: {'snapshot': repository.create_snapshot()},
+                                world_bytes=world_bytes))
+        touched = touch_world(server_directory)
+        time.sleep(1.0 - time.time() % 1.0)
+        throughput(self.measure("backup_incremental_touched", lambda: {'snapshot': repository.create_snapshot()},
+                                world_bytes=world_bytes, touched_chunks=touched))
+
+    def run_rcon_backups(self, server_directory):
+        """Backs up through a fake RCON server whose flush takes RCON_SAVE_SECONDS, reusing one connection."""
+        rcon = FakeRconServer(save_seconds=RCON_SAVE_SECONDS)
+        file_manager = FileManager(server_directory, os.path.join(self.work_directory, "backups_rcon"), "benchmark",
+                                   compression="none", rcon=rcon.start())
+
+        def backups():
+            save_off_seconds = []
+            for _ in range(RCON_BACKUPS):
+                file_manager.create_server_backup()
+                save_off_seconds.append(round(file_manager.save_off_seconds, 4))
+            return {'save_off_seconds': save_off_seconds, 'rcon_connections': rcon.connections,
+                    'rcon_commands': len(rcon.commands)}
+
+        try:
+            self.measure("backup_archive_none_rcon", backups, backups=RCON_BACKUPS, flush_seconds=RCON_SAVE_SECONDS)
+        finally:
+            rcon.stop()
+
+def compare(results, baseline_file):
+    """Prints how each scenario's metrics moved relative to a previous results file."""
+    with open(baseline_file, 'r') as f:
+        baseline = {result['name']: result for result in json.load(f)['scenarios']}
+    print(f"\n--- Compared with {baseline_file} ---")
+    for result in results:
+        previous = baseline.get(result['name'])
+        if not previous:
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            before, after = previous.get(metric), result.get(metric)
+            if before and after is not None:
+                changes.append(f"{metric} {(after - before) / before * 100:+.1f}%")
+        print(f"{result['name']:<28} {', '.join(changes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks updates and backups against a local fake upstream")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIRECTORY, help="The directory results are written to as JSON")
+    parser.add_argument("--world-size-mb", type=int, default=DEFAULT_WORLD_SIZE_MB, help="The size of the synthetic world")
+    parser.add_argument("--artifact-size-mb", type=int, default=DEFAULT_ARTIFACT_SIZE_MB, help="The size of every served jar")
+    parser.add_argument("--seed-file", default="paper_build_cache.json", help="The Paper build cache to replay builds from")
+    parser.add_argument("--skip-backups", action="store_true", help="Only benchmark resolution and downloads")
+    parser.add_argument("--baseline", help="A previous results file to compare with")
+    parser.add_argument("--work-directory", help="Keep the scratch data here instead of a temporary directory")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the code under test")
+    args = parser.parse_args()
+
+    work_directory = args.work_directory or tempfile.mkdtemp(prefix="updater-benchmark-")
+    upstream = FakeUpstream(os.path.join(work_directory, "upstream"), args.seed_file, args.artifact_size_mb)
+    print(f"--- Recording fake upstream in {upstream.root} ---")
+    upstream.populate()
+    print(f"--- Fake upstream listening on {upstream.start()} ---")
+    benchmark = Benchmark(work_directory, upstream, args.verbose)
+    try:
+        benchmark.run_resolution()
+        benchmark.run_update()
+        if not args.skip_backups:
+            benchmark.run_backups(args.world_size_mb)
+    finally:
+        benchmark.close()
+        upstream.stop()
+        if not args.work_directory:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'world_size_mb': args.world_size_mb,
+        'artifact_size_mb': args.artifact_size_mb,
+        'scenarios': benchmark.results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    output_file = os.path.join(args.output, f"benchmark_{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.json")
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"--- Results written to {output_file} ---")
+    if args.baseline:
+        compare(benchmark.results, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import random
+import struct
+import time
+import zlib
+
+from updater.region_file import CHUNKS_PER_REGION, REGION_EXTENSION, REGION_HEADER_SIZE, SECTOR_SIZE
+
+ZLIB_COMPRESSION = 2
+DIMENSIONS = ("world/region", "world_nether/DIM-1/region", "world_the_end/DIM1/region")
+
+def _random_bytes(rng, size):
+    return rng.getrandbits(size * 8).to_bytes(size, 'little') if size else b''
+
+def _chunk_payload(rng, size=12 * 1024):
+    """Returns zlib data shaped like a chunk: a repetitive block palette followed by noisier block states."""
+    palette = _random_bytes(rng, 64)
+    repetitive = palette * (size // 2 // len(palette))
+    return zlib.compress(repetitive + _random_bytes(rng, size - len(repetitive)), 1)
+
+def _chunk_record(payload):
+    record = struct.pack('>IB', len(payload) + 1, ZLIB_COMPRESSION) + payload
+    padding = -len(record) % SECTOR_SIZE
+    return record + b'\0' * padding
+
+def write_region_file(path, rng, chunks=CHUNKS_PER_REGION):
+    """Writes an Anvil region file (.mca) with the given number of populated chunks."""
+    locations = bytearray(SECTOR_SIZE)
+    timestamps = bytearray(SECTOR_SIZE)
+    body = []
+    sector = REGION_HEADER_SIZE // SECTOR_SIZE
+    now = int(time.time())
+    for index in range(chunks):
+        record = _chunk_record(_chunk_payload(rng))
+        sectors = len(record) // SECTOR_SIZE
+        struct.pack_into('>I', locations, index * 4, (sector << 8) | sectors)
+        struct.pack_into('>I', timestamps, index * 4, now)
+        body.append(record)
+        sector += sectors
+    with open(path, 'wb') as f:
+        f.write(locations)
+        f.write(timestamps)
+        for record in body:
+            f.write(record)
+    return os.path.getsize(path)
+
+def generate_world(server_directory, size_mb, seed=0):
+    """Creates a synthetic server directory of roughly size_mb megabytes and returns its size in bytes."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    total = 0
+    for directory in DIMENSIONS + ("plugins", "logs"):
+        os.makedirs(os.path.join(server_directory, directory), exist_ok=True)
+    with open(os.path.join(server_directory, "world", "level.dat"), 'wb') as f:
+        total += f.write(zlib.compress(_random_bytes(rng, 2048)))
+    with open(os.path.join(server_directory, "server.properties"), 'w') as f:
+        total += f.write("motd=Benchmark\nlevel-name=world\n")
+    with open(os.path.join(server_directory, "logs", "latest.log"), 'w') as f:
+        total += f.write("[00:00:00] [Server thread/INFO]: Done\n" * 2000)
+
+    region = 0
+    while total < target:
+        directory = DIMENSIONS[region % len(DIMENSIONS)]
+        x, z = divmod(region // len(DIMENSIONS), 8)
+        chunks = min(CHUNKS_PER_REGION, max(1, (target - total) // (16 * 1024)))
+        total += write_region_file(os.path.join(server_directory, directory, f"r.{x}.{z}.mca"), rng, chunks)
+        region += 1
+    return total
+
+def region_files(server_directory):
+    for directory in DIMENSIONS:
+        path = os.path.join(server_directory, directory)
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(REGION_EXTENSION):
+                    yield os.path.join(path, name)
+
+def touch_world(server_directory, fraction=0.05, seed=1):
+    """Rewrites a fraction of the chunks in every region file, the way a running server does between backups."""
+    rng = random.Random(seed)
+    touched = 0
+    for path in region_files(server_directory):
+        with open(path, 'r+b') as f:
+            header = f.read(REGION_HEADER_SIZE)
+            populated = [index for index in range(CHUNKS_PER_REGION)
+                         if struct.unpack_from('>I', header, index * 4)[0]]
+            for index in rng.sample(populated, max(1, int(len(populated) * fraction))):
+                location = struct.unpack_from('>I', header, index * 4)[0]
+                record = _chunk_record(_chunk_payload(rng))
+                if len(record) // SECTOR_SIZE > location & 0xFF:
+                    f.seek(0, os.SEEK_END)
+                    offset = f.tell() // SECTOR_SIZE
+                    f.seek(index * 4)
+                    f.write(struct.pack('>I', (offset << 8) | len(record) // SECTOR_SIZE))
+                    f.seek(offset * SECTOR_SIZE)
+                else:
+                    f.seek((location >> 8) * SECTOR_SIZE)
+                f.write(record)
+                saved = struct.unpack_from('>I', header, SECTOR_SIZE + index * 4)[0]
+                f.seek(SECTOR_SIZE + index * 4)
+                f.write(struct.pack('>I', max(int(time.time()), saved + 1)))
+                touched += 1
+    return touched
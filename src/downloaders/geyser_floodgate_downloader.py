@@ -6,5 +6,5 @@ class FloodgateDownloader(GeyserMcDownloader):
     DOWNLOAD_SUBPATH = "spigot"
     DEFAULT_DOWNLOAD_DIR = "floodgate_downloads"
 
-    def __init__(self, download_directory=DEFAULT_DOWNLOAD_DIR):
-        super().__init__(download_directory)
+    def __init__(self, download_directory=DEFAULT_DOWNLOAD_DIR, http_client=None, version="latest", build="latest"):
+        super().__init__(download_directory, http_client, version, build)
@@ -1,29 +1,37 @@
 import requests
 import os
-from tqdm import tqdm
 import json
-import hashlib
+
+from updater.artifact_downloader import get_artifact_downloader
+from updater.fingerprints import get_fingerprint_index
+from updater.http_client import get_http_client
+from updater.metrics import get_metrics
 
 class GeyserMcDownloader:
     API_BASE_URL_V2_LATEST = ""
+    API_BASE_URL_V2_BUILD = "https://download.geysermc.org/v2/projects/{project}/versions/{version}/builds/{build}"
     DOWNLOAD_BASE_URL_V2 = "https://download.geysermc.org/v2/projects/{project}/versions/{version}/builds/{build}/downloads/{download}"
     PROJECT = ""
     DOWNLOAD_SUBPATH = ""
     DEFAULT_DOWNLOAD_DIR = ""
 
-    def __init__(self, download_directory):
+    def __init__(self, download_directory, http_client=None, version="latest", build="latest"):
         self.download_directory = download_directory
         os.makedirs(download_directory, exist_ok=True)
         self._latest_info = None
+        self.version = version
+        self.build = build
+        self.http_client = http_client or get_http_client()
+        self.fingerprints = get_fingerprint_index(download_directory)
+        self.artifact_downloader = get_artifact_downloader()
 
     def _fetch_latest_info(self):
         if self._latest_info:
             return self._latest_info
 
         try:
-            response = requests.get(self.API_BASE_URL_V2_LATEST)
-            response.raise_for_status()
-            self._latest_info = response.json()
+            with get_metrics().span("resolve"):
+                self._latest_info = self.http_client.get_json(self._info_url())
             return self._latest_info
         except requests.exceptions.RequestException as e:
             print(f"Error fetching latest info for {self.PROJECT} from API: {e}")
@@ -32,6 +40,11 @@ class GeyserMcDownloader:
             print(f"Error decoding {self.PROJECT} API response.")
             return None
 
+    def _info_url(self):
+        if str(self.version) == "latest" and str(self.build) == "latest":
+            return self.API_BASE_URL_V2_LATEST
+        return self.API_BASE_URL_V2_BUILD.format(project=self.PROJECT, version=self.version, build=self.build)
+
     def get_latest_version(self):
         info = self._fetch_latest_info()
         return info.get("version") if info else None
@@ -52,8 +65,7 @@ class GeyserMcDownloader:
         if os.path.exists(filepath):
             print(f"File '{os.path.basename(filepath)}' already exists. Checking hash...")
             try:
-                with open(filepath, 'rb') as f:
-                    file_hash = hashlib.sha256(f.read()).hexdigest()
+                file_hash = self.fingerprints.sha256(filepath)
                 if file_hash == expected_hash:
                     print("Hash matches. Skipping download.")
                     return True
@@ -65,38 +77,6 @@ class GeyserMcDownloader:
                 return False
         return False
 
-    def _download_file(self, download_url, filename, download_directory="."):
-        os.makedirs(download_directory, exist_ok=True)
-        filepath = os.path.join(download_directory, filename)
-        temp_file = None
-        try:
-            print(f"Downloading {filename} from {download_url}...")
-            response = requests.get(download_url, stream=True)
-            response.raise_for_status()
-            total_size_in_bytes = int(response.headers.get('content-length', 0))
-            block_size = 1024
-            progress_bar = tqdm(total=total_size_in_bytes, unit='iB', unit_scale=True)
-            temp_file = open(filepath, 'wb')
-            for data in response.iter_content(block_size):
-                progress_bar.update(len(data))
-                temp_file.write(data)
-            progress_bar.close()
-            if total_size_in_bytes != 0 and progress_bar.n != total_size_in_bytes:
-                print("ERROR, something went wrong during download.")
-                return None
-            else:
-                print(f"Successfully downloaded to {filepath}")
-                return filepath
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading file: {e}")
-            return None
-        except Exception as e:
-            print(f"An unexpected error occurred during download: {e}")
-            return None
-        finally:
-            if temp_file:
-                temp_file.close()
-
     def download_latest(self):
         latest_info = self._fetch_latest_info()
 
@@ -127,4 +107,4 @@ class GeyserMcDownloader:
         )
 
         print(f"Downloading {self.PROJECT} version {version} build {build} as {filename}...")
-        return self._download_file(download_url, filename, self.download_directory)
+        return self.artifact_downloader.download(download_url, filepath, expected_hash)
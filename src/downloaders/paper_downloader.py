@@ -1,13 +1,16 @@
-import json
 import requests
 import os
-from tqdm import tqdm
-import hashlib
 from abc import ABC, abstractmethod
 
+from updater.artifact_downloader import get_artifact_downloader
+from updater.build_cache import get_build_cache
+from updater.fingerprints import get_fingerprint_index
+from updater.http_client import get_http_client
+from updater.metrics import get_metrics
+from updater.paper_warmup import get_paper_warmup
+
 BASE_URL = "https://api.papermc.io/v2"
 PROJECT = "paper"
-CACHE_FILE = "paper_build_cache.json"
 DEFAULT_DOWNLOAD_DIR = "paper_downloads"
 
 class VersionFetchStrategy(ABC):
@@ -20,16 +23,12 @@ class LatestVersionStrategy(VersionFetchStrategy):
         url = f"{BASE_URL}/projects/{PROJECT}"
         try:
             print(f"Getting versions from {url}")
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            data = get_http_client().get_json(url)
             latest_version = data['versions'][-1] if data['versions'] else None
             if latest_version:
                 url_version = f"{BASE_URL}/projects/{PROJECT}/versions/{latest_version}"
                 print(f"Getting builds from {url_version}")
-                response_version = requests.get(url_version)
-                response_version.raise_for_status()
-                version_data = response_version.json()
+                version_data = get_http_client().get_json(url_version)
                 latest_build = version_data['builds'][-1]['build'] if version_data['builds'] else None
                 return latest_version, latest_build
             return None, None
@@ -42,38 +41,17 @@ class StableVersionStrategy(VersionFetchStrategy):
         url_projects = f"{BASE_URL}/projects/{PROJECT}"
         try:
             print(f"Getting versions from {url_projects}")
-            response_projects = requests.get(url_projects)
-            response_projects.raise_for_status()
-            project_data = response_projects.json()
+            project_data = get_http_client().get_json(url_projects)
             versions = project_data['versions']
 
             if not versions:
                 return None, None
 
             for version in reversed(versions):
-                url_version = f"{BASE_URL}/projects/{PROJECT}/versions/{version}"
-                print(f"Getting builds from {url_version}")
-                response_version = requests.get(url_version)
-                response_version.raise_for_status()
-                version_data = response_version.json()
-                builds = version_data['builds']
-
-                if not builds:
-                    continue
-
-                latest_build_number = builds[-1]
-                url_build = f"{BASE_URL}/projects/{PROJECT}/versions/{version}/builds/{latest_build_number}"
-                print(f"Getting build from {url_build}")
-                response_build = requests.get(url_build)
-                response_build.raise_for_status()
-                build_data = response_build.json()
-                if build_data.get('channel') == 'default':
-                    return version, latest_build_number
-
-                for build_number in reversed(builds[:-1]):
-                    build_data = self._get_build_data_static(version, build_number)
-                    if build_data and build_data.get('channel') == 'default':
-                        return version, build_number
+                builds = self._get_builds_static(version)
+                for build_data in reversed(builds):
+                    if build_data.get('channel') == 'default':
+                        return version, build_data['build']
 
             return None, None
         except requests.exceptions.RequestException as e:
@@ -81,72 +59,84 @@ class StableVersionStrategy(VersionFetchStrategy):
             return None, None
 
     @staticmethod
-    def _get_build_data_static(version, build_number):
-        cache = PaperDownloader._load_cache_static()
-        cache_key = f"{version}-{build_number}"
-        if cache_key in cache:
-            print(f"Found cached version for {cache_key}")
-            return cache[cache_key]
+    def _get_builds_static(version, build_cache=None):
+        """Fetches every build of a version in one request and stores them in the build cache."""
+        build_cache = build_cache or get_build_cache()
+        url_builds = f"{BASE_URL}/projects/{PROJECT}/versions/{version}/builds"
+        print(f"Getting builds from {url_builds}")
+        builds_data = get_http_client().get_json(url_builds)
+        builds = [
+            dict(build, project_id=builds_data.get('project_id', PROJECT),
+                 project_name=builds_data.get('project_name'), version=version)
+            for build in builds_data.get('builds', [])
+        ]
+        build_cache.put_many(PROJECT, version, builds)
+        return builds
+
+    @staticmethod
+    def _get_build_data_static(version, build_number, build_cache=None):
+        build_cache = build_cache or get_build_cache()
+        build_data = build_cache.get(PROJECT, version, build_number)
+        if build_data:
+            print(f"Found cached version for {version}-{build_number}")
+            return build_data
 
         url_build = f"{BASE_URL}/projects/{PROJECT}/versions/{version}/builds/{build_number}"
         try:
             print(f"Getting build from {url_build}")
-            response_build = requests.get(url_build)
-            response_build.raise_for_status()
-            build_data = response_build.json()
-            cache[cache_key] = build_data
-            PaperDownloader._save_cache_static(cache)
+            build_data = get_http_client().get_json(url_build)
+            build_cache.put(PROJECT, version, build_number, build_data)
             return build_data
         except requests.exceptions.RequestException as e:
             print(f"Error fetching build info for {version} build {build_number}: {e}")
             return None
 
+class PinnedVersionStrategy(VersionFetchStrategy):
+    def __init__(self, version, build=None, channel="stable"):
+        self.version = str(version)
+        self.build = build
+        self.channel = channel
+
+    def get_version_and_build(self):
+        if self.build:
+            return self.version, int(self.build)
+        try:
+            builds = StableVersionStrategy._get_builds_static(self.version)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching Paper builds for {self.version}: {e}")
+            return None, None
+        for build_data in reversed(builds):
+            if self.channel == "latest" or build_data.get('channel') == 'default':
+                return self.version, build_data['build']
+        return None, None
+
 class PaperDownloader:
-    def __init__(self, download_directory=DEFAULT_DOWNLOAD_DIR, version_strategy=StableVersionStrategy()):
+    def __init__(self, download_directory=DEFAULT_DOWNLOAD_DIR, version_strategy=StableVersionStrategy(), build_cache=None,
+                 http_client=None):
         self.download_directory = download_directory
         os.makedirs(download_directory, exist_ok=True)
         self.version_strategy = version_strategy
-
-    @staticmethod
-    def _load_cache_static():
-        try:
-            with open(CACHE_FILE, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
-        except json.JSONDecodeError:
-            print("Error decoding cache file. Starting with an empty cache.")
-            return {}
-
-    @staticmethod
-    def _save_cache_static(cache):
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(cache, f, indent=4)
+        self.build_cache = build_cache or get_build_cache()
+        self.http_client = http_client or get_http_client()
+        self.fingerprints = get_fingerprint_index(download_directory)
+        self.artifact_downloader = get_artifact_downloader()
 
     def _get_build_data(self, version, build_number):
-        cache = self._load_cache_static()
-        cache_key = f"{version}-{build_number}"
-        if cache_key in cache:
-            return cache[cache_key]
+        return StableVersionStrategy._get_build_data_static(version, build_number, self.build_cache)
 
-        url_build = f"{BASE_URL}/projects/{PROJECT}/versions/{version}/builds/{build_number}"
-        try:
-            print(f"Getting build from {url_build}")
-            response_build = requests.get(url_build)
-            response_build.raise_for_status()
-            build_data = response_build.json()
-            cache[cache_key] = build_data
-            self._save_cache_static(cache)
-            return build_data
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching build info for {version} build {build_number}: {e}")
-            return None
+    def _previous_build(self, filepath):
+        """Returns the most recently downloaded other Paper jar in the download directory, if any."""
+        candidates = [
+            entry for entry in os.scandir(self.download_directory)
+            if entry.name.startswith(f"{PROJECT}-") and entry.name.endswith('.jar')
+            and entry.path != filepath and entry.is_file()
+        ]
+        return max(candidates, key=lambda entry: entry.stat().st_mtime_ns).path if candidates else None
 
     def _check_existing_file(self, filepath, expected_hash):
         if os.path.exists(filepath):
             print(f"File '{os.path.basename(filepath)}' already exists. Checking hash...")
-            with open(filepath, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
+            file_hash = self.fingerprints.sha256(filepath)
             if file_hash == expected_hash:
                 print("Hash matches. Skipping download.")
                 return True
@@ -155,46 +145,41 @@ class PaperDownloader:
                 return False
         return False
 
+    def _warm_up(self, filepath, build_sha256):
+        """Runs the optional paperclip patch step for a downloaded build, so the next restart doesn't."""
+        warmup = get_paper_warmup()
+        if warmup:
+            warmup.warm(filepath, build_sha256)
+        return filepath
+
     def download(self):
-        version, build = self.version_strategy.get_version_and_build()
+        try:
+            return self._download()
+        finally:
+            self.build_cache.flush()
+
+    def _download(self):
+        with get_metrics().span("resolve"):
+            version, build = self.version_strategy.get_version_and_build()
+            build_data = self._get_build_data(version, build) if version else None
         if version:
             print(f"Downloading Paper version: {version}, build: {build}")
-            build_data = self._get_build_data(version, build)
             if build_data and 'downloads' in build_data and 'application' in build_data['downloads']:
                 filename = build_data['downloads']['application']['name']
                 expected_hash = build_data['downloads']['application']['sha256']
                 filepath = os.path.join(self.download_directory, filename)
 
-                if not self._check_existing_file(filepath, expected_hash):
-                    download_url = f"{BASE_URL}/projects/{PROJECT}/versions/{version}/builds/{build}/downloads/{filename}"
-                    self._download_file(download_url, filename, self.download_directory)
+                if self._check_existing_file(filepath, expected_hash):
+                    return self._warm_up(filepath, expected_hash)
+                download_url = f"{BASE_URL}/projects/{PROJECT}/versions/{version}/builds/{build}/downloads/{filename}"
+                filepath = self.artifact_downloader.download(download_url, filepath, expected_hash,
+                                                             base_path=self._previous_build(filepath))
+                return self._warm_up(filepath, expected_hash) if filepath else None
             else:
                 print("Could not retrieve Paper download information.")
         else:
             print("Could not determine the Paper version and build to download.")
-
-    def _download_file(self, download_url, filename, download_directory="."):
-        os.makedirs(download_directory, exist_ok=True)
-        filepath = os.path.join(download_directory, filename)
-        try:
-            print(f"Downloading {filename} from {download_url}...")
-            response = requests.get(download_url, stream=True)
-            response.raise_for_status()
-            total_size_in_bytes = int(response.headers.get('content-length', 0))
-            block_size = 1024
-            progress_bar = tqdm(total=total_size_in_bytes, unit='iB', unit_scale=True)
-            with open(filepath, 'wb') as file:
-                for data in response.iter_content(block_size):
-                    progress_bar.update(len(data))
-                    file.write(data)
-            progress_bar.close()
-            if total_size_in_bytes != 0 and progress_bar.n != total_size_in_bytes:
-                print("ERROR, something went wrong")
-            print(f"Successfully downloaded to {filepath}")
-            return filepath
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading file: {e}")
-            return None
+        return None
 
 if __name__ == "__main__":
     downloader_stable = PaperDownloader()
@@ -0,0 +1,121 @@
+from downloaders.geyser_downloader import GeyserDownloader
+from downloaders.geyser_floodgate_downloader import FloodgateDownloader
+from downloaders.paper_downloader import (
+    LatestVersionStrategy, PaperDownloader, PinnedVersionStrategy, StableVersionStrategy
+)
+from downloaders.spigotmc_downloader import DEFAULT_CACHE_TTL, SpigotMCPluginDownloader
+from downloaders.viaversion_downloader import ViaVersionDownloader
+
+DOWNLOADERS = {}
+
+DEFAULT_ARTIFACTS = [
+    {'type': 'paper', 'name': 'Paper'},
+    {'type': 'geyser', 'name': 'Geyser'},
+    {'type': 'floodgate', 'name': 'Floodgate'},
+]
+
+class ArtifactHandle:
+    def __init__(self, download, latest_build=None):
+        """
+        Wraps what the update engine needs from a downloader.
+
+        Args:
+            download (callable): Downloads the artifact and returns its path, or None on failure.
+            latest_build (callable): Cheaply returns the upstream (version, build), used by the daemon.
+        """
+        self.download = download
+        self.latest_build = latest_build
+
+def register_downloader(artifact_type):
+    """Registers a factory(download_directory, artifact) -> ArtifactHandle for an artifact type."""
+    def decorator(factory):
+        DOWNLOADERS[artifact_type] = factory
+        return factory
+    return decorator
+
+def artifact_name(artifact):
+    name = artifact.get('name') or artifact['type']
+    if artifact.get('version') and not artifact.get('name'):
+        name = f"{name}-{artifact['version']}"
+    return name
+
+def create_artifact(artifact, download_directory):
+    artifact_type = artifact.get('type')
+    if artifact_type not in DOWNLOADERS:
+        raise ValueError(f"Unknown artifact type '{artifact_type}', expected one of: {', '.join(sorted(DOWNLOADERS))}")
+    return DOWNLOADERS[artifact_type](download_directory, artifact)
+
+@register_downloader('paper')
+def _paper(download_directory, artifact):
+    if artifact.get('version'):
+        strategy = PinnedVersionStrategy(artifact['version'], artifact.get('build'), artifact.get('channel', 'stable'))
+    elif artifact.get('channel') == 'latest':
+        strategy = LatestVersionStrategy()
+    else:
+        strategy = StableVersionStrategy()
+
+    def download():
+        print("\n--- Processing Paper Minecraft ---")
+        return PaperDownloader(download_directory, version_strategy=strategy).download()
+
+    def latest_build():
+        version, build = strategy.get_version_and_build()
+        return (version, build) if version else None
+
+    return ArtifactHandle(download, latest_build)
+
+def _geysermc(downloader_class, download_directory, artifact):
+    version = artifact.get('version', 'latest')
+    build = artifact.get('build', 'latest')
+    label = artifact_name(artifact)
+
+    def download():
+        downloader = downloader_class(download_directory, version=version, build=build)
+        print(f"\n--- Checking and Downloading {label} ---")
+        filepath = downloader.download_latest()
+        print(f"--- {label} check complete. ---")
+        resolved_version = downloader.get_latest_version()
+        resolved_build = downloader.get_latest_build()
+        if resolved_version and resolved_build:
+            print(f"{label} Version: {resolved_version}")
+            print(f"{label} Build: {resolved_build}")
+        else:
+            print(f"Could not retrieve {label} version and build.")
+        return filepath
+
+    def latest_build():
+        downloader = downloader_class(download_directory, version=version, build=build)
+        resolved_version = downloader.get_latest_version()
+        return (resolved_version, downloader.get_latest_build()) if resolved_version else None
+
+    return ArtifactHandle(download, latest_build)
+
+@register_downloader('geyser')
+def _geyser(download_directory, artifact):
+    return _geysermc(GeyserDownloader, download_directory, artifact)
+
+@register_downloader('floodgate')
+def _floodgate(download_directory, artifact):
+    return _geysermc(FloodgateDownloader, download_directory, artifact)
+
+def _spigotmc_handle(create_downloader):
+    def latest_build():
+        version = create_downloader().latest_version()
+        return (version,) if version else None
+
+    return ArtifactHandle(lambda: create_downloader().download_latest(), latest_build)
+
+@register_downloader('viaversion')
+def _viaversion(download_directory, artifact):
+    return _spigotmc_handle(lambda: ViaVersionDownloader(download_directory))
+
+@register_downloader('spigotmc')
+def _spigotmc(download_directory, artifact):
+    if not artifact.get('url') or not artifact.get('filename'):
+        raise ValueError(f"SpigotMC artifact '{artifact_name(artifact)}' needs both 'url' and 'filename'.")
+    return _spigotmc_handle(
+        lambda: SpigotMCPluginDownloader(
+            download_directory, artifact['filename'], artifact['url'],
+            cache_ttl=artifact.get('cache_ttl', DEFAULT_CACHE_TTL),
+        )
+    )
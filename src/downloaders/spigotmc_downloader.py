@@ -1,37 +1,116 @@
-import requests
+import codecs
+import json
 import os
-import hashlib
-from bs4 import BeautifulSoup
-from tqdm import tqdm
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from updater.artifact_downloader import get_artifact_downloader
+from updater.fingerprints import get_fingerprint_index
+from updater.http_client import get_http_client
+from updater.metrics import get_metrics
+
+CACHE_FILENAME = ".spigotmc_cache.json"
+METADATA_SUFFIX = ".meta.json"
+DEFAULT_CACHE_TTL = 3600
+PAGE_CHUNK_SIZE = 16 * 1024
+RESOURCE_ID_PATTERN = re.compile(r"resources/[^/]*?\.?(\d+)/")
+
+_cache_lock = threading.Lock()
+
+class _DownloadLinkParser(HTMLParser):
+    """Finds the first <a class="inner" href="..."> and ignores everything after it."""
+
+    def __init__(self):
+        super().__init__()
+        self.href = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.href is not None or tag != 'a':
+            return
+        attributes = dict(attrs)
+        if 'inner' in (attributes.get('class') or '').split() and attributes.get('href'):
+            self.href = attributes['href']
+
+def parse_download_link(href):
+    """Returns (resource_id, version_id) from a SpigotMC download link, either of which may be None."""
+    resource_match = RESOURCE_ID_PATTERN.search(href)
+    version = parse_qs(urlsplit(href).query).get('version', [None])[0]
+    return (resource_match.group(1) if resource_match else None), version
 
 class SpigotMCPluginDownloader:
     SPIGOTMC_URL = ""
     DEFAULT_DOWNLOAD_DIR = ""
     FILENAME = ""
 
-    def __init__(self, download_directory, filename, spigotmc_url):
+    def __init__(self, download_directory, filename, spigotmc_url, http_client=None, cache_ttl=DEFAULT_CACHE_TTL):
         self.download_directory = download_directory
         os.makedirs(download_directory, exist_ok=True)
+        self.http_client = http_client or get_http_client()
+        self.fingerprints = get_fingerprint_index(download_directory)
+        self.artifact_downloader = get_artifact_downloader()
         self.FILENAME = filename
         self.SPIGOTMC_URL = spigotmc_url
+        self.cache_ttl = cache_ttl
+        self.cache_file = os.path.join(download_directory, CACHE_FILENAME)
+        self.version_id = None
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _update_cache(self, **fields):
+        with _cache_lock:
+            cache = self._load_cache()
+            cache.setdefault(self.SPIGOTMC_URL, {}).update(fields)
+            temp_file = f"{self.cache_file}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(cache, f, indent=4)
+            os.replace(temp_file, self.cache_file)
 
     def _fetch_download_url(self):
+        with _cache_lock:
+            cached = self._load_cache().get(self.SPIGOTMC_URL, {})
+        if cached.get('href') and time.time() - cached.get('fetched_at', 0) < self.cache_ttl:
+            get_metrics().count("spigotmc_cache_hits_total")
+            self.version_id = cached.get('version_id')
+            return f"https://www.spigotmc.org/{cached['href']}"
+        get_metrics().count("spigotmc_cache_misses_total")
+        with get_metrics().span("resolve"):
+            return self._resolve_download_url(cached)
+
+    def _resolve_download_url(self, cached):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://www.spigotmc.org/',
             'Accept-Language': 'en-US,en;q=0.9'
         }
+        if cached.get('href') and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
         try:
-            response = requests.get(self.SPIGOTMC_URL, headers=headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            download_link_element = soup.find('a', {'class': 'inner'})
-            if download_link_element and 'href' in download_link_element.attrs:
-                href = download_link_element['href']
-                return f"https://www.spigotmc.org/{href}"
+            response = self.http_client.get(self.SPIGOTMC_URL, headers=headers, stream=True)
+            if response.status_code == 304:
+                response.close()
+                href = cached['href']
+                etag = cached['etag']
             else:
+                response.raise_for_status()
+                href = self._find_download_link(response)
+                etag = response.headers.get('ETag')
+            if not href:
                 print(f"Could not find the main download link on {self.SPIGOTMC_URL}.")
                 return None
+            resource_id, self.version_id = parse_download_link(href)
+            self._update_cache(href=href, etag=etag, resource_id=resource_id, version_id=self.version_id,
+                               fetched_at=time.time())
+            return f"https://www.spigotmc.org/{href}"
         except requests.exceptions.RequestException as e:
             print(f"Error fetching {self.SPIGOTMC_URL}: {e}")
             return None
@@ -39,26 +118,65 @@ class SpigotMCPluginDownloader:
             print(f"An unexpected error occurred while fetching download URL from {self.SPIGOTMC_URL}: {e}")
             return None
 
-    def _check_existing_file(self, filepath, expected_hash=None):
-        if os.path.exists(filepath):
-            if expected_hash:
-                print(f"File '{os.path.basename(filepath)}' already exists. Checking hash (if available)...")
-                try:
-                    with open(filepath, 'rb') as f:
-                        file_hash = hashlib.sha256(f.read()).hexdigest()
-                    if file_hash == expected_hash:
-                        print("Hash matches. Skipping download.")
-                        return True
-                    else:
-                        print("Hash mismatch. Downloading new file.")
-                        return False
-                except Exception as e:
-                    print(f"Error reading existing file: {e}")
-                    return False
+    def _find_download_link(self, response):
+        """Parses the page as it streams in and stops reading at the first download link."""
+        parser = _DownloadLinkParser()
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        consumed = []
+        try:
+            for chunk in response.iter_content(PAGE_CHUNK_SIZE):
+                consumed.append(chunk)
+                parser.feed(decoder.decode(chunk))
+                if parser.href:
+                    break
             else:
-                print(f"File '{os.path.basename(filepath)}' already exists. Skipping download.")
-                return True
-        return False
+                parser.feed(decoder.decode(b'', final=True))
+        finally:
+            response.close()
+        self.http_client.record_bytes(self.SPIGOTMC_URL, b''.join(consumed), 'text/html')
+        return parser.href
+
+    def _metadata_path(self, filepath):
+        return f"{filepath}{METADATA_SUFFIX}"
+
+    def _load_metadata(self, filepath):
+        try:
+            with open(self._metadata_path(filepath), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_metadata(self, filepath, download_url):
+        """Records which upstream version the installed jar is, next to the jar."""
+        metadata = {
+            'download_url': download_url,
+            'version_id': self.version_id,
+            'size': os.path.getsize(filepath),
+            'sha256': self.fingerprints.sha256(filepath),
+        }
+        temp_file = f"{self._metadata_path(filepath)}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(metadata, f, indent=4)
+        os.replace(temp_file, self._metadata_path(filepath))
+
+    def _is_installed(self, filepath):
+        """Checks the installed jar against its sidecar: same upstream version, size and hash."""
+        if not self.version_id or not os.path.exists(filepath):
+            return False
+        metadata = self._load_metadata(filepath)
+        if metadata.get('version_id') != self.version_id:
+            if metadata:
+                print(f"{self.FILENAME} is at version {metadata.get('version_id')}, upstream has {self.version_id}.")
+            return False
+        if metadata.get('size') != os.path.getsize(filepath) or metadata.get('sha256') != self.fingerprints.sha256(filepath):
+            print(f"{self.FILENAME} does not match its recorded size and hash. Downloading it again.")
+            return False
+        return True
+
+    def latest_version(self):
+        """Returns the upstream version id (or download link), from the cache while it's fresh."""
+        download_url = self._fetch_download_url()
+        return self.version_id or download_url
 
     def download_latest(self):
         download_url = self._fetch_download_url()
@@ -69,40 +187,13 @@ class SpigotMCPluginDownloader:
 
         filepath = os.path.join(self.download_directory, self.FILENAME)
 
-        if self._check_existing_file(filepath):
+        if self._is_installed(filepath):
+            print(f"{self.FILENAME} is already at version {self.version_id}. Skipping download.")
             return filepath
 
         print(f"Downloading latest {self.FILENAME} from {download_url}...")
-        return self._download_file(download_url, self.FILENAME, self.download_directory)
+        downloaded = self.artifact_downloader.download(download_url, filepath)
+        if downloaded:
+            self._write_metadata(downloaded, download_url)
+        return downloaded
 
-    def _download_file(self, download_url, filename, download_directory="."):
-        os.makedirs(download_directory, exist_ok=True)
-        filepath = os.path.join(download_directory, filename)
-        temp_file = None
-        try:
-            print(f"Downloading {filename} from {download_url}...")
-            response = requests.get(download_url, stream=True)
-            response.raise_for_status()
-            total_size_in_bytes = int(response.headers.get('content-length', 0))
-            block_size = 1024
-            progress_bar = tqdm(total=total_size_in_bytes, unit='iB', unit_scale=True)
-            temp_file = open(filepath, 'wb')
-            for data in response.iter_content(block_size):
-                progress_bar.update(len(data))
-                temp_file.write(data)
-            progress_bar.close()
-            if total_size_in_bytes != 0 and progress_bar.n != total_size_in_bytes:
-                print("ERROR, something went wrong during download.")
-                return None
-            else:
-                print(f"Successfully downloaded to {filepath}")
-                return filepath
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading file: {e}")
-            return None
-        except Exception as e:
-            print(f"An unexpected error occurred during download: {e}")
-            return None
-        finally:
-            if temp_file:
-                temp_file.close()
@@ -1,16 +1,31 @@
 import os
 import argparse
+import fnmatch
 import yaml
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from downloaders.paper_downloader import PaperDownloader
-from downloaders.geyser_downloader import GeyserDownloader
-from downloaders.geyser_floodgate_downloader import FloodgateDownloader
+from downloaders.registry import DEFAULT_ARTIFACTS, artifact_name
+from updater.artifact_downloader import configure_artifact_downloader
+from updater.artifact_store import ArtifactStore, DEFAULT_STORE_DIRECTORY
+from updater.build_cache import configure_build_cache
+from updater.daemon import UpdateDaemon
+from updater.deployment import DEFAULT_KEEP_RELEASES, DEFAULT_SERVER_JAR, Deployment, deploy_path, switch_release
 from updater.file_manager import FileManager
+from updater.http_client import configure_http_client
+from updater.metrics import configure_metrics
+from updater.incremental_backup import DEFAULT_FULL_EVERY
+from updater.mirror import DEFAULT_MIRROR_PORT, serve_mirror
+from updater.paper_warmup import configure_paper_warmup, get_paper_warmup
+from updater.server_control import RconError, open_control_channel
+from updater.update_plan import UpdatePlan
 
 DEFAULT_DOWNLOAD_DIRECTORY = "downloads"
 CONFIG_FILE = "config.yaml"
 EXAMPLE_CONFIG_FILE = "example.config.yaml"
+DEFAULT_MAX_WORKERS = 3
+DEFAULT_BACKUP_WORKERS = 2
+DEFAULT_RESTART_WARNING_SECONDS = 10
 
 def load_config(filepath=CONFIG_FILE):
     if not os.path.exists(filepath):
@@ -22,20 +37,78 @@ def load_config(filepath=CONFIG_FILE):
 
     try:
         with open(filepath, 'r') as f:
-            config = yaml.safe_load(f) or {}
-        return config.get('servers', {})
+            return yaml.safe_load(f) or {}
     except yaml.YAMLError as e:
         print(f"Error parsing '{filepath}': {e}")
         sys.exit(1)
 
 def main():
     parser = argparse.ArgumentParser(description="Minecraft Server Management Utility")
-    parser.add_argument("--server", help="The name of the server configuration to use (as defined under 'servers' in config.yaml)")
+    parser.add_argument("--server", help="The name of the server configuration to use (as defined under 'servers' in config.yaml); glob patterns select several servers")
+    parser.add_argument("--all-servers", action="store_true", help="Update every server defined under 'servers' in config.yaml")
+    parser.add_argument("--workers", type=int, help="Maximum number of artifacts to resolve and download at the same time")
+    parser.add_argument("--backup-workers", type=int, help="Maximum number of server backups to run at the same time")
+    parser.add_argument("--daemon", action="store_true", help="Keep running, poll for new builds and back up on the schedule in settings.daemon")
+    parser.add_argument("--mirror-record", metavar="DIRECTORY", help="Store every fetched response and artifact in DIRECTORY so it can be served with --mirror-serve")
+    parser.add_argument("--mirror-serve", metavar="DIRECTORY", help="Serve a recorded mirror to other hosts (set settings.http.mirror_url on them)")
+    parser.add_argument("--mirror-host", default="127.0.0.1", help="The address --mirror-serve listens on, e.g. 0.0.0.0 to serve other hosts")
+    parser.add_argument("--mirror-port", type=int, default=DEFAULT_MIRROR_PORT, help="The port --mirror-serve listens on")
+    parser.add_argument("--retention-report", action="store_true", help="Show which backups of --server the retention policy keeps and deletes, without deleting")
+    parser.add_argument("--list-snapshots", action="store_true", help="List the incremental backup snapshots of --server")
+    parser.add_argument("--restore", metavar="BACKUP", help="Restore an incremental backup snapshot or a backup archive of --server")
+    parser.add_argument("--restore-target", help="The directory to restore into (defaults to a new directory next to the backups)")
+    parser.add_argument("--restore-path", action="append", help="Only restore this file or directory (may be repeated)")
+    parser.add_argument("--verify", metavar="BACKUP", help="Check every file in an indexed backup archive of --server against its checksum")
+    parser.add_argument("--rollback", action="store_true", help="Switch --server back to the jars it ran before the last deployment")
     args = parser.parse_args()
 
+    if args.mirror_serve:
+        serve_mirror(args.mirror_serve, args.mirror_host, args.mirror_port)
+        return
+
     download_directory = DEFAULT_DOWNLOAD_DIRECTORY
-    servers_config = load_config()
+    config = load_config()
+    servers_config = config.get('servers', {})
+    settings = config.get('settings', {})
+    max_workers = args.workers or settings.get('max_workers', DEFAULT_MAX_WORKERS)
+    backup_workers = args.backup_workers or settings.get('backup_workers', DEFAULT_BACKUP_WORKERS)
+    if settings.get('metrics'):
+        configure_metrics(**settings['metrics'])
+    if settings.get('build_cache'):
+        configure_build_cache(**settings['build_cache'])
+    if settings.get('http') or args.mirror_record:
+        http_settings = dict(settings.get('http', {}))
+        if args.mirror_record:
+            http_settings['record_directory'] = args.mirror_record
+        configure_http_client(**http_settings)
+    if settings.get('download'):
+        configure_artifact_downloader(**settings['download'])
+    if settings.get('paper_warmup'):
+        configure_paper_warmup(**settings['paper_warmup'])
+
+    if args.all_servers or (args.server and glob_pattern(args.server)):
+        pattern = '*' if args.all_servers else args.server
+        server_names = fnmatch.filter(servers_config.keys(), pattern)
+        if not server_names:
+            print(f"Error: No server configuration matches '{pattern}' in {CONFIG_FILE} under the 'servers' section.")
+            sys.exit(1)
+        store = ArtifactStore(settings.get('artifact_store', DEFAULT_STORE_DIRECTORY))
+        server_artifacts = {name: artifacts_for(settings, servers_config[name]) for name in server_names}
+        plan = build_plan(merge_artifacts(server_artifacts))
+        if args.daemon:
+            run_daemon(
+                settings, plan, store.staging_directory,
+                lambda names: deploy_servers(
+                    server_names, servers_config, server_artifacts,
+                    distribute_downloads(server_names, servers_config, server_artifacts, store, plan, max_workers, names),
+                ),
+                lambda: wait_for_backups(backup_servers(server_names, servers_config, backup_workers)),
+            )
+            return
+        run_batch(server_names, servers_config, server_artifacts, store, plan, max_workers, backup_workers)
+        return
 
+    server_settings = {}
     if args.server:
         server_name = args.server
         if server_name not in servers_config:
@@ -43,56 +116,281 @@ def main():
             sys.exit(1)
 
         server_settings = servers_config[server_name]
-        server_download_directory = server_settings.get('download_directory')
-        server_directory = server_settings.get('server_directory')
-        backup_directory = server_settings.get('backup_directory')
-        screen_name = server_settings.get('screen_name', 'minecraft')
-        exclude_backup = server_settings.get('backup_exclude', [])
+        if args.retention_report:
+            create_file_manager(server_settings).report_retention()
+            return
+        if args.verify:
+            if not create_file_manager(server_settings).verify_backup(args.verify, server_settings.get('backup_threads')):
+                sys.exit(1)
+            return
+        if args.list_snapshots or args.restore:
+            restore_server(server_settings, args.restore, args.restore_target, args.restore_path)
+            return
+        if args.rollback:
+            if not rollback_server(server_settings):
+                sys.exit(1)
+            return
+
+        download_directory = server_settings.get('download_directory')
+
+    artifacts = artifacts_for(settings, server_settings)
+    plan = build_plan(artifacts)
+    if args.daemon:
+        backup = (lambda: wait_for_backups([backup_server(server_settings)])) if args.server else None
+        run_daemon(
+            settings, plan, download_directory,
+            lambda names: deploy_server(server_settings, artifacts, update_directory(download_directory, plan, max_workers, names)),
+            backup,
+        )
+        return
+
+    if args.server:
+        file_manager = backup_server(server_settings)
+    results = update_directory(download_directory, plan, max_workers)
+    if args.server:
+        deploy_server(server_settings, artifacts, results)
+        file_manager.wait_for_background_backup()
+
+def artifacts_for(settings, server_settings=None):
+    """Returns a server's artifact list, falling back to settings.artifacts and then Paper, Geyser and Floodgate."""
+    return (server_settings or {}).get('artifacts') or settings.get('artifacts') or DEFAULT_ARTIFACTS
+
+def build_plan(artifacts):
+    try:
+        return UpdatePlan(artifacts)
+    except ValueError as e:
+        print(f"Error in the artifacts configuration: {e}")
+        sys.exit(1)
+
+def merge_artifacts(server_artifacts):
+    """
+    Combines several servers' artifact lists so that each artifact is fetched once.
 
-        download_directory = server_download_directory
-        backup_files(server_directory, backup_directory, screen_name, exclude_backup)
+    When a server configures an artifact differently from a server before it, e.g. pins another
+    Paper version, its copy is renamed to <name>@<server> in server_artifacts, so both are fetched.
+    """
+    merged = {}
+    for server_name, artifacts in server_artifacts.items():
+        renamed = {}
+        while True:
+            renamed_artifacts = [rename_artifact(artifact, renamed) for artifact in artifacts]
+            conflicts = [artifact_name(artifact) for artifact in renamed_artifacts
+                         if artifact_name(artifact) in merged and merged[artifact_name(artifact)] != artifact]
+            if not conflicts:
+                break
+            renamed.update({name: f"{name}@{server_name}" for name in conflicts})
+        if renamed:
+            server_artifacts[server_name] = renamed_artifacts
+            print(f"Server '{server_name}' configures {', '.join(renamed)} differently; fetching its own "
+                  f"{', '.join(renamed.values())}.")
+        for artifact in renamed_artifacts:
+            merged.setdefault(artifact_name(artifact), artifact)
+    return list(merged.values())
 
+def rename_artifact(artifact, renamed):
+    """Returns an artifact with the renamed names applied to it and its 'after', still deploying to the same path."""
+    name = artifact_name(artifact)
+    after = [renamed.get(dependency, dependency) for dependency in artifact.get('after', [])]
+    if name not in renamed and after == artifact.get('after', []):
+        return artifact
+    copy = dict(artifact)
+    if after:
+        copy['after'] = after
+    if name in renamed:
+        copy['name'] = renamed[name]
+        if artifact.get('type') != 'paper':
+            copy['deploy_as'] = deploy_path(artifact, name)
+    return copy
+
+def update_directory(download_directory, plan, max_workers=DEFAULT_MAX_WORKERS, names=None):
     print(f"--- Downloading server files to: {download_directory} ---")
-    download_paper(download_directory)
-    download_geyser(download_directory)
-    download_floodgate(download_directory)
-
-def download_floodgate(download_directory):
-    print("\n--- Checking and Downloading Latest Floodgate ---")
-    floodgate_downloader = FloodgateDownloader(download_directory)
-    floodgate_downloader.download_latest()
-    print("--- Floodgate check complete. ---")
-    latest_floodgate_version = floodgate_downloader.get_latest_version()
-    latest_floodgate_build = floodgate_downloader.get_latest_build()
-    if latest_floodgate_version and latest_floodgate_build:
-        print(f"Latest Floodgate Version: {latest_floodgate_version}")
-        print(f"Latest Floodgate Build: {latest_floodgate_build}")
-    else:
-        print("Could not retrieve latest Floodgate version and build.")
-
-def download_geyser(download_directory):
-    geyser_downloader = GeyserDownloader(download_directory)
-    print("--- Checking and Downloading Latest Geyser ---")
-    geyser_downloader.download_latest()
-    print("--- Geyser check complete. ---")
-    latest_geyser_version = geyser_downloader.get_latest_version()
-    latest_geyser_build = geyser_downloader.get_latest_build()
-    if latest_geyser_version and latest_geyser_build:
-        print(f"Latest Geyser Version: {latest_geyser_version}")
-        print(f"Latest Geyser Build: {latest_geyser_build}")
-    else:
-        print("Could not retrieve latest Geyser version and build.")
+    results = plan.run(download_directory, max_workers, names)
+    print_download_report(results)
+    return results
+
+def glob_pattern(value):
+    return any(char in value for char in '*?[')
+
+def run_batch(server_names, servers_config, server_artifacts, store, plan, max_workers=DEFAULT_MAX_WORKERS,
+              backup_workers=DEFAULT_BACKUP_WORKERS):
+    """Backs up several servers in parallel, then downloads each artifact once and links it into the servers using it."""
+    print(f"--- Updating servers: {', '.join(server_names)} ---")
+    file_managers = backup_servers(server_names, servers_config, backup_workers)
+    results = distribute_downloads(server_names, servers_config, server_artifacts, store, plan, max_workers)
+    deploy_servers(server_names, servers_config, server_artifacts, results)
+    wait_for_backups(file_managers)
+
+def backup_servers(server_names, servers_config, backup_workers=DEFAULT_BACKUP_WORKERS):
+    with ThreadPoolExecutor(max_workers=max(1, backup_workers)) as executor:
+        futures = [executor.submit(backup_server, servers_config[name]) for name in server_names]
+        return [future.result() for future in as_completed(futures)]
+
+def wait_for_backups(file_managers):
+    for file_manager in file_managers:
+        file_manager.wait_for_background_backup()
 
-def download_paper(download_directory):
-    paper_downloader = PaperDownloader(download_directory)
-    print("\n--- Processing Paper Minecraft ---")
-    paper_downloader.download()
+def distribute_downloads(server_names, servers_config, server_artifacts, store, plan, max_workers=DEFAULT_MAX_WORKERS,
+                         names=None):
+    """Downloads each artifact once into the store and links it into the download directory of every server using it."""
+    print(f"--- Downloading server files to: {store.staging_directory} ---")
+    results = plan.run(store.staging_directory, max_workers, names)
+    for result in results:
+        if result['error']:
+            continue
+        digest = store.add(result['path'])
+        filename = os.path.basename(result['path'])
+        for name in server_names:
+            download_directory = servers_config[name].get('download_directory')
+            uses_artifact = any(artifact_name(artifact) == result['artifact'] for artifact in server_artifacts[name])
+            if download_directory and uses_artifact:
+                store.link_into(digest, download_directory, filename)
+    print_download_report(results)
+    return results
 
-def backup_files(server_dir, backup_dir, screen_name, exclude):
+def deploy_servers(server_names, servers_config, server_artifacts, results):
+    for name in server_names:
+        deploy_server(servers_config[name], server_artifacts[name], results)
+    return results
+
+def create_deployment(server_settings):
+    deploy_settings = server_settings.get('deploy') or {}
+    return Deployment(
+        server_settings.get('server_directory'),
+        deploy_settings.get('server_jar', DEFAULT_SERVER_JAR),
+        deploy_settings.get('keep', DEFAULT_KEEP_RELEASES),
+    )
+
+def switch_server_release(server_settings, deployment, release):
+    deploy_settings = server_settings.get('deploy') or {}
+    warmup = get_paper_warmup()
+    server_jar = deployment.load_release(release)['files'].get(deployment.server_jar)
+    if warmup and server_jar:
+        warmup.apply(server_jar['sha256'], deployment.server_directory)
+    control = open_control_channel(server_settings.get('screen_name', 'minecraft'), server_settings.get('rcon'))
+    return switch_release(
+        deployment, release, control, deploy_settings.get('restart_command'),
+        deploy_settings.get('restart_warning_seconds', DEFAULT_RESTART_WARNING_SECONDS),
+    )
+
+def deploy_server(server_settings, artifacts, results):
+    """Stages the jars downloaded for a server as a release and switches to it, when the server has deploy settings."""
+    if not server_settings.get('deploy'):
+        return results
+    try:
+        deployment = create_deployment(server_settings)
+    except OSError as e:
+        print(f"Error: Not deploying to {server_settings.get('server_directory')}, {e}")
+        return results
+    artifacts_by_name = {artifact_name(artifact): artifact for artifact in artifacts}
+    files = {}
+    for result in results:
+        if result['error'] or result['artifact'] not in artifacts_by_name:
+            continue
+        relative_path = deploy_path(artifacts_by_name[result['artifact']], result['artifact'], deployment.server_jar)
+        if relative_path:
+            files[relative_path] = result['path']
+    if not files:
+        return results
+    print(f"\n--- Deploying to {deployment.server_directory} ---")
+    try:
+        release = deployment.stage(files)
+    except (ValueError, OSError) as e:
+        print(f"Error: Not deploying to {deployment.server_directory}, {e}")
+        return results
+    try:
+        switch_server_release(server_settings, deployment, release)
+    except (OSError, RconError) as e:
+        print(f"Error: Could not switch {deployment.server_directory} to release {release}: {e}")
+    return results
+
+def rollback_server(server_settings):
+    deployment = create_deployment(server_settings)
+    previous = deployment.previous_release()
+    if not previous:
+        print(f"Error: {deployment.server_directory} has no previous release to roll back to.")
+        return False
+    print(f"\n--- Rolling back {deployment.server_directory} to release {previous} ---")
+    return switch_server_release(server_settings, deployment, previous)
+
+def run_daemon(settings, plan, download_directory, update, backup=None):
+    UpdateDaemon(plan.watchers(download_directory), update, backup, **settings.get('daemon', {})).run()
+
+def backup_server(server_settings):
+    server_directory = server_settings.get('server_directory')
+    backup_directory = server_settings.get('backup_directory')
+    screen_name = server_settings.get('screen_name', 'minecraft')
+    exclude_backup = server_settings.get('backup_exclude', [])
+    return backup_files(server_directory, backup_directory, screen_name, exclude_backup, **backup_options(server_settings))
+
+def backup_options(server_settings):
+    return {
+        'compression': server_settings.get('backup_compression', 'gzip'),
+        'compression_level': server_settings.get('backup_compression_level'),
+        'compression_threads': server_settings.get('backup_threads'),
+        'verbose': server_settings.get('backup_verbose', False),
+        'backup_mode': server_settings.get('backup_mode', 'archive'),
+        'full_every': server_settings.get('backup_full_every', DEFAULT_FULL_EVERY),
+        'snapshot_first': server_settings.get('backup_snapshot_first', False),
+        'retention': server_settings.get('backup_retention'),
+        'region_aware': server_settings.get('backup_region_aware', True),
+        'rcon': server_settings.get('rcon'),
+    }
+
+def create_file_manager(server_settings):
+    return FileManager(
+        server_settings.get('server_directory'),
+        server_settings.get('backup_directory'),
+        server_settings.get('screen_name', 'minecraft'),
+        **backup_options(server_settings),
+    )
+
+def restore_server(server_settings, snapshot=None, target_directory=None, paths=None):
+    file_manager = create_file_manager(server_settings)
+    if snapshot and os.path.isfile(file_manager.find_backup(snapshot)):
+        archive_name = os.path.basename(snapshot)
+        target_directory = target_directory or os.path.join(file_manager.backup_directory, f"restore_{archive_name}")
+        print(f"\n--- Restoring {archive_name} to {target_directory} ---")
+        try:
+            file_manager.restore_backup(snapshot, target_directory, paths)
+        except (ValueError, OSError) as e:
+            print(f"Error: Could not restore {archive_name}: {e}")
+            sys.exit(1)
+        return
+    incremental_backup = file_manager.get_incremental_backup()
+    if not snapshot:
+        print("--- Incremental backup snapshots ---")
+        for name in incremental_backup.list_snapshots():
+            print(name)
+        return
+    if snapshot not in incremental_backup.list_snapshots():
+        print(f"Error: Snapshot '{snapshot}' not found in {incremental_backup.snapshots_directory}.")
+        sys.exit(1)
+    target_directory = target_directory or os.path.join(file_manager.backup_directory, f"restore_{snapshot}")
+    print(f"\n--- Restoring snapshot {snapshot} to {target_directory} ---")
+    try:
+        incremental_backup.restore(snapshot, target_directory, paths)
+    except (ValueError, OSError) as e:
+        print(f"Error: Could not restore snapshot {snapshot}: {e}")
+        sys.exit(1)
+
+def print_download_report(results):
+    print("\n--- Download Report ---")
+    for result in results:
+        if result['error']:
+            status = f"FAILED ({result['error']})"
+        else:
+            status = result['path']
+        print(f"{result['artifact']:<10} {result['seconds']:6.1f}s  {status}")
+
+def backup_files(server_dir, backup_dir, screen_name, exclude, **options):
     print("\n--- Backing up Server Files ---")
-    file_manager = FileManager(server_dir, backup_dir, screen_name)
+    file_manager = FileManager(server_dir, backup_dir, screen_name, **options)
     file_manager.create_server_backup(exclude_patterns=exclude)
-    print("--- Server backup complete. ---")
+    if file_manager.background_backup:
+        print("--- Server files copied, backup continues in the background. ---")
+    else:
+        print("--- Server backup complete. ---")
+    return file_manager
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,165 @@
+import fnmatch
+import hashlib
+import os
+import re
+import tarfile
+import time
+
+from updater.deployment import deployed_target
+
+PROGRESS_INTERVAL_SECONDS = 10
+TAR_BLOCK_SIZE = 512
+
+class ExcludeMatcher:
+    def __init__(self, patterns=None):
+        """
+        Compiles tar-style exclude patterns into a single regular expression.
+
+        A path is excluded when a pattern matches the whole relative path or any one of its
+        components, so "logs" excludes every directory called logs and "world/*.old" excludes
+        matching files in world.
+
+        Args:
+            patterns (list): The glob patterns to exclude.
+        """
+        self.patterns = list(patterns or [])
+        self._regex = re.compile('|'.join(f"(?:{fnmatch.translate(pattern)})" for pattern in self.patterns)) \
+            if self.patterns else None
+
+    def matches(self, relative_path):
+        if self._regex is None:
+            return False
+        if self._regex.match(relative_path):
+            return True
+        return any(self._regex.match(part) for part in relative_path.split('/'))
+
+def walk_directory(source_directory, exclude_matcher=None, excluded=None):
+    """
+    Yields (relative_path, DirEntry) for everything under source_directory, parents first.
+
+    Top-level names starting with a dot are skipped, matching what the shell glob '*' used to
+    pass to tar. Symlinks are returned as entries and never followed. If excluded is a list, the
+    relative paths the exclude_matcher left out are appended to it.
+    """
+    exclude_matcher = exclude_matcher or ExcludeMatcher()
+    pending = [("", source_directory)]
+    while pending:
+        relative_directory, directory = pending.pop()
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        subdirectories = []
+        for entry in entries:
+            if not relative_directory and entry.name.startswith('.'):
+                continue
+            relative_path = f"{relative_directory}/{entry.name}" if relative_directory else entry.name
+            if exclude_matcher.matches(relative_path):
+                if excluded is not None:
+                    excluded.append(relative_path)
+                continue
+            yield relative_path, entry
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append((relative_path, entry.path))
+        pending.extend(reversed(subdirectories))
+
+class ArchiveStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def throughput(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.files} entries, {self.bytes / 1048576:.1f} MiB in {self.seconds:.1f}s "
+                f"({self.throughput / 1048576:.1f} MiB/s)")
+
+class _HashingReader:
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        return data
+
+def _member_type(tarinfo):
+    if tarinfo.isreg():
+        return 'file'
+    if tarinfo.isdir():
+        return 'directory'
+    if tarinfo.issym():
+        return 'symlink'
+    return 'other'
+
+class Archiver:
+    def __init__(self, source_directory, exclude_patterns=None, verbose=False):
+        """
+        Initializes an in-process tar writer for a directory.
+
+        The archiver never changes the working directory and keeps no shared state, so several
+        archivers can run in different threads at the same time.
+
+        Args:
+            source_directory (str): The directory to archive; paths are stored relative to it.
+            exclude_patterns (list): tar-style glob patterns to leave out.
+            verbose (bool): Whether to print every archived path.
+        """
+        self.source_directory = source_directory
+        self.exclude_matcher = ExcludeMatcher(exclude_patterns)
+        self.verbose = verbose
+
+    def write(self, fileobj, members=None):
+        """Streams a tar archive into a writable binary file object and returns its ArchiveStats.
+
+        If members is a list, a record of every entry's offsets in the uncompressed tar stream,
+        metadata and SHA-256 is appended to it, for an archive index. Symlinks into .deployments
+        are stored as the jars they point at, since the archive leaves .deployments out.
+        """
+        stats = ArchiveStats()
+        started = time.monotonic()
+        last_progress = started
+        with tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+            for relative_path, entry in walk_directory(self.source_directory, self.exclude_matcher):
+                path = entry.path
+                if entry.is_symlink():
+                    path = deployed_target(self.source_directory, entry.path) or path
+                tarinfo = tar.gettarinfo(path, arcname=relative_path)
+                if tarinfo is None:
+                    continue
+                if self.verbose:
+                    print(relative_path)
+                header_offset = tar.offset
+                reader = None
+                if tarinfo.isreg():
+                    with open(path, 'rb') as f:
+                        reader = _HashingReader(f) if members is not None else f
+                        tar.addfile(tarinfo, reader)
+                    stats.bytes += tarinfo.size
+                else:
+                    tar.addfile(tarinfo)
+                stats.files += 1
+                if members is not None:
+                    member = {
+                        'name': relative_path,
+                        'type': _member_type(tarinfo),
+                        'offset': header_offset,
+                        'data_offset': tar.offset - -(-tarinfo.size // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE,
+                        'size': tarinfo.size if tarinfo.isreg() else 0,
+                        'mode': tarinfo.mode,
+                        'mtime': tarinfo.mtime,
+                    }
+                    if reader is not None:
+                        member['sha256'] = reader.sha256.hexdigest()
+                    if tarinfo.issym():
+                        member['linkname'] = tarinfo.linkname
+                    members.append(member)
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                    stats.seconds = now - started
+                    print(f"Archiving {self.source_directory}: {stats}")
+                    last_progress = now
+        stats.seconds = time.monotonic() - started
+        return stats
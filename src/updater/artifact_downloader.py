@@ -0,0 +1,252 @@
+import hashlib
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from tqdm import tqdm
+
+from updater.fingerprints import get_fingerprint_index, hash_file
+from updater.http_client import get_http_client
+from updater.jar_delta import apply_delta, create_delta, delta_url
+from updater.metrics import get_metrics
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_SEGMENTS = 1
+DEFAULT_PARALLEL_THRESHOLD = 32 * 1024 * 1024
+PART_SUFFIX = ".part"
+DELTA_SUFFIX = ".delta"
+
+class ArtifactDownloader:
+    def __init__(self, http_client=None, chunk_size=DEFAULT_CHUNK_SIZE, segments=DEFAULT_SEGMENTS,
+                 parallel_threshold=DEFAULT_PARALLEL_THRESHOLD, delta=False):
+        """
+        Initializes the download engine shared by every downloader.
+
+        Files are written to a ".part" file next to the destination and renamed into place once
+        complete and verified. An existing ".part" file is resumed with an HTTP Range request.
+
+        Args:
+            http_client (HttpClient): The client used for requests, defaults to the shared client.
+            chunk_size (int): The number of bytes read and written at a time.
+            segments (int): The number of ranges fetched in parallel for large artifacts, 1 to disable.
+            parallel_threshold (int): The minimum size in bytes for a parallel download.
+            delta (bool): When a previous version is given and a mirror is configured, ask the mirror
+                for a delta from it and rebuild the new version locally before falling back to a full
+                download. A host recording a mirror stores such deltas for the others.
+        """
+        self.http_client = http_client or get_http_client()
+        self.chunk_size = chunk_size
+        self.segments = segments
+        self.parallel_threshold = parallel_threshold
+        self.delta = delta
+
+    def download(self, download_url, filepath, expected_hash=None, base_path=None):
+        """Downloads a file atomically, returning its path or None on failure.
+
+        base_path is a previous version of the file that a delta can be applied to, if any.
+        """
+        with get_metrics().span("download"):
+            return self._download(download_url, filepath, expected_hash, base_path)
+
+    def _download(self, download_url, filepath, expected_hash=None, base_path=None):
+        if base_path and not os.path.isfile(base_path):
+            base_path = None
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        part_path = f"{filepath}{PART_SUFFIX}"
+        filename = os.path.basename(filepath)
+        try:
+            print(f"Downloading {filename} from {download_url}...")
+            file_hash = None
+            if self.delta and base_path and self.http_client.mirror_url and not os.path.exists(part_path):
+                file_hash = self._download_delta(download_url, part_path, base_path, expected_hash)
+            delta_applied = file_hash is not None
+            if file_hash is None and self.segments > 1 and not os.path.exists(part_path):
+                try:
+                    file_hash = self._download_segments(download_url, part_path)
+                except requests.exceptions.RequestException:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                    raise
+            if file_hash is None:
+                file_hash = self._download_stream(download_url, part_path, expected_hash)
+            if file_hash is None:
+                print("ERROR, something went wrong during download.")
+                return None
+            if expected_hash and file_hash != expected_hash:
+                print(f"ERROR, hash mismatch for downloaded {filename}.")
+                os.remove(part_path)
+                return None
+            os.replace(part_path, filepath)
+            get_fingerprint_index(os.path.dirname(filepath) or ".").record(filepath, file_hash)
+            self.http_client.record_file(download_url, filepath)
+            if base_path and self.http_client.recorder and not delta_applied:
+                self._record_delta(download_url, filepath, base_path)
+            print(f"Successfully downloaded to {filepath}")
+            return filepath
+        except requests.exceptions.RequestException as e:
+            print(f"Error downloading file: {e}")
+            return None
+        except OSError as e:
+            print(f"An unexpected error occurred during download: {e}")
+            return None
+
+    def _download_delta(self, download_url, part_path, base_path, expected_hash=None):
+        """Rebuilds the file from base_path and a delta served by the mirror, or returns None if that fails."""
+        metrics = get_metrics()
+        base_hash = get_fingerprint_index(os.path.dirname(base_path) or ".").sha256(base_path)
+        delta_path = f"{part_path}{DELTA_SUFFIX}"
+        try:
+            response = self.http_client.get(delta_url(download_url, base_hash), stream=True)
+            if response.status_code != 200:
+                response.close()
+                metrics.count("delta_misses_total")
+                return None
+            with open(delta_path, 'wb') as f:
+                for data in response.iter_content(self.chunk_size):
+                    f.write(data)
+            delta_size = os.path.getsize(delta_path)
+            file_hash = apply_delta(base_path, delta_path, part_path, base_hash)
+            if expected_hash and file_hash != expected_hash:
+                raise ValueError("the rebuilt file does not match the expected hash")
+        except (requests.exceptions.RequestException, ValueError, KeyError, OSError, zlib.error) as e:
+            print(f"Could not apply a delta from {os.path.basename(base_path)}, downloading in full: {e}")
+            metrics.count("delta_misses_total")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return None
+        finally:
+            if os.path.exists(delta_path):
+                os.remove(delta_path)
+        saved = os.path.getsize(part_path) - delta_size
+        print(f"Rebuilt {os.path.basename(part_path[:-len(PART_SUFFIX)])} from "
+              f"{os.path.basename(base_path)} and a {delta_size} byte delta.")
+        metrics.count("delta_hits_total")
+        metrics.count("downloaded_bytes_total", delta_size)
+        metrics.count("delta_saved_bytes_total", max(0, saved))
+        return file_hash
+
+    def _record_delta(self, download_url, filepath, base_path):
+        """Stores a delta from base_path to the downloaded file in the mirror being recorded."""
+        delta_path = f"{filepath}{DELTA_SUFFIX}"
+        try:
+            with get_metrics().span("delta"):
+                delta_size = create_delta(base_path, filepath, delta_path)
+            base_hash = get_fingerprint_index(os.path.dirname(base_path) or ".").sha256(base_path)
+            self.http_client.record_file(delta_url(download_url, base_hash), delta_path, "application/octet-stream")
+            print(f"Recorded a {delta_size} byte delta from {os.path.basename(base_path)} to {os.path.basename(filepath)}.")
+        except (ValueError, OSError, zlib.error) as e:
+            print(f"Could not create a delta from {os.path.basename(base_path)}: {e}")
+        finally:
+            if os.path.exists(delta_path):
+                os.remove(delta_path)
+
+    def _complete_part_hash(self, response, part_path, offset, expected_hash=None):
+        """Returns the hash of a ".part" file the server says is already complete (416), or None if it isn't."""
+        total_size = response.headers.get('Content-Range', '').rpartition('/')[2]
+        if total_size.isdigit() and int(total_size) != offset:
+            return None
+        file_hash = hash_file(part_path, self.chunk_size)
+        if expected_hash and file_hash != expected_hash:
+            return None
+        print(f"The partial download is already complete ({offset} bytes).")
+        return file_hash
+
+    def _download_stream(self, download_url, part_path, expected_hash=None):
+        sha256 = hashlib.sha256()
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f"bytes={offset}-"} if offset else {}
+
+        response = self.http_client.get(download_url, stream=True, headers=headers)
+        if response.status_code == 416:
+            response.close()
+            file_hash = self._complete_part_hash(response, part_path, offset, expected_hash) if offset else None
+            if file_hash:
+                return file_hash
+            os.remove(part_path)
+            return self._download_stream(download_url, part_path, expected_hash)
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            print(f"Resuming download at {offset} bytes.")
+            with open(part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                    sha256.update(chunk)
+            mode = 'ab'
+        else:
+            offset = 0
+            mode = 'wb'
+
+        content_length = int(response.headers.get('content-length', 0))
+        total_size = offset + content_length if content_length else 0
+        progress_bar = tqdm(total=total_size, initial=offset, unit='iB', unit_scale=True)
+        with open(part_path, mode) as f:
+            for data in response.iter_content(self.chunk_size):
+                progress_bar.update(len(data))
+                f.write(data)
+                sha256.update(data)
+        progress_bar.close()
+        get_metrics().count("downloaded_bytes_total", progress_bar.n - offset)
+        get_metrics().count("hashed_bytes_total", progress_bar.n)
+        if total_size != 0 and progress_bar.n != total_size:
+            return None
+        return sha256.hexdigest()
+
+    def _download_segments(self, download_url, part_path):
+        """Fetches a large artifact as several byte ranges at once, or returns None if the server can't."""
+        response = self.http_client.head(download_url)
+        if not response.ok or response.headers.get('Accept-Ranges') != 'bytes':
+            return None
+        total_size = int(response.headers.get('content-length', 0))
+        if total_size < self.parallel_threshold:
+            return None
+
+        segment_size = -(-total_size // self.segments)
+        ranges = [(start, min(start + segment_size, total_size) - 1) for start in range(0, total_size, segment_size)]
+        with open(part_path, 'wb') as f:
+            f.truncate(total_size)
+
+        progress_bar = tqdm(total=total_size, unit='iB', unit_scale=True)
+        progress_lock = threading.Lock()
+
+        def fetch(byte_range):
+            start, end = byte_range
+            segment = self.http_client.get(download_url, stream=True, headers={'Range': f"bytes={start}-{end}"})
+            segment.raise_for_status()
+            if segment.status_code != 206:
+                raise requests.exceptions.RequestException(f"Server ignored range request for {download_url}")
+            with open(part_path, 'r+b') as f:
+                f.seek(start)
+                for data in segment.iter_content(self.chunk_size):
+                    f.write(data)
+                    with progress_lock:
+                        progress_bar.update(len(data))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.segments) as executor:
+                list(executor.map(fetch, ranges))
+        finally:
+            progress_bar.close()
+        get_metrics().count("downloaded_bytes_total", progress_bar.n)
+        if progress_bar.n != total_size:
+            os.remove(part_path)
+            return None
+        return hash_file(part_path, self.chunk_size)
+
+_artifact_downloader = None
+_artifact_downloader_lock = threading.Lock()
+
+def configure_artifact_downloader(**settings):
+    """Replaces the shared download engine, e.g. with settings from config.yaml."""
+    global _artifact_downloader
+    with _artifact_downloader_lock:
+        _artifact_downloader = ArtifactDownloader(**settings)
+        return _artifact_downloader
+
+def get_artifact_downloader():
+    global _artifact_downloader
+    with _artifact_downloader_lock:
+        if _artifact_downloader is None:
+            _artifact_downloader = ArtifactDownloader()
+        return _artifact_downloader
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+from updater.fingerprints import get_fingerprint_index
+
+DEFAULT_STORE_DIRECTORY = "artifact_store"
+
+class ArtifactStore:
+    def __init__(self, store_directory=DEFAULT_STORE_DIRECTORY):
+        """
+        Initializes a content-addressed store shared by every server's download directory.
+
+        Args:
+            store_directory (str): The directory holding the stored artifacts.
+        """
+        self.store_directory = store_directory
+        self.objects_directory = os.path.join(store_directory, "objects")
+        self.staging_directory = os.path.join(store_directory, "staging")
+        os.makedirs(self.objects_directory, exist_ok=True)
+        os.makedirs(self.staging_directory, exist_ok=True)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_directory, digest[:2], digest)
+
+    def add(self, filepath):
+        """Stores a file under its SHA-256 digest and returns the digest, reusing the hash the downloader recorded."""
+        digest = get_fingerprint_index(os.path.dirname(filepath) or ".").sha256(filepath)
+        object_path = self.object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            self._place(filepath, object_path)
+        return digest
+
+    def link_into(self, digest, directory, filename):
+        """Makes a stored artifact available as directory/filename, hardlinking where possible."""
+        os.makedirs(directory, exist_ok=True)
+        object_path = self.object_path(digest)
+        target = os.path.join(directory, filename)
+        if os.path.exists(target) and os.path.samefile(object_path, target):
+            return target
+        self._place(object_path, target)
+        return target
+
+    @staticmethod
+    def _place(source, target):
+        temp_target = f"{target}.tmp"
+        if os.path.exists(temp_target):
+            os.remove(temp_target)
+        try:
+            os.link(source, temp_target)
+        except OSError:
+            shutil.copy2(source, temp_target)
+        os.replace(temp_target, target)
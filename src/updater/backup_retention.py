@@ -0,0 +1,209 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from updater.indexed_archive import index_path
+
+CATALOG_DIRECTORY = ".catalog"
+CATALOG_FILENAME = "backups.json"
+BACKUP_FILENAME_PATTERN = re.compile(
+    r"^mcbackup_(?P<server>.+)_(?P<timestamp>\d{4}-\d{2}-\d{2}-\d{2})(?P<extension>\.tar(?:\.gz|\.zst)?)$"
+)
+BACKUP_TIMESTAMP_FORMAT = "%Y-%m-%d-%H"
+
+_catalog_locks = {}
+_catalog_locks_lock = threading.Lock()
+
+def _catalog_lock(backup_directory):
+    key = os.path.abspath(backup_directory)
+    with _catalog_locks_lock:
+        return _catalog_locks.setdefault(key, threading.Lock())
+
+def parse_backup_filename(filename):
+    """Returns (server, timestamp) for a backup archive's filename, or None for anything else."""
+    match = BACKUP_FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+    try:
+        return match.group('server'), datetime.strptime(match.group('timestamp'), BACKUP_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+class BackupCatalog:
+    def __init__(self, backup_directory):
+        """
+        Initializes the index of backup archives kept in a backup directory.
+
+        The index maps each archive to its server, timestamp and size. The directory is only
+        listed again when its mtime no longer matches the one recorded with the index; the index
+        lives in its own subdirectory so that rewriting it leaves that mtime alone.
+
+        Args:
+            backup_directory (str): The directory holding the backup archives.
+        """
+        self.backup_directory = backup_directory
+        self.catalog_directory = os.path.join(backup_directory, CATALOG_DIRECTORY)
+        self.catalog_file = os.path.join(self.catalog_directory, CATALOG_FILENAME)
+        self._lock = _catalog_lock(backup_directory)
+
+    def _load(self, check_directory=True):
+        try:
+            with open(self.catalog_file, 'r') as f:
+                catalog = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if check_directory and catalog.get('directory_mtime_ns') != os.stat(self.backup_directory).st_mtime_ns:
+            return None
+        return catalog['backups']
+
+    def _save(self, backups):
+        os.makedirs(self.catalog_directory, exist_ok=True)
+        catalog = {'directory_mtime_ns': os.stat(self.backup_directory).st_mtime_ns, 'backups': backups}
+        temp_file = f"{self.catalog_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(catalog, f)
+        os.replace(temp_file, self.catalog_file)
+
+    def _scan(self):
+        backups = {}
+        with os.scandir(self.backup_directory) as entries:
+            for entry in entries:
+                parsed = parse_backup_filename(entry.name)
+                if parsed and entry.is_file():
+                    server, timestamp = parsed
+                    backups[entry.name] = {
+                        'server': server,
+                        'timestamp': timestamp.strftime(BACKUP_TIMESTAMP_FORMAT),
+                        'size': entry.stat().st_size,
+                    }
+        return backups
+
+    def _backups(self, rescan=False):
+        backups = None if rescan else self._load()
+        if backups is None:
+            backups = self._scan()
+            self._save(backups)
+        return backups
+
+    def add(self, backup_path):
+        """Records a newly written archive without listing the directory again."""
+        filename = os.path.basename(backup_path)
+        parsed = parse_backup_filename(filename)
+        if not parsed:
+            return
+        with self._lock:
+            backups = self._load(check_directory=False)
+            if backups is None:
+                backups = self._scan()
+            server, timestamp = parsed
+            backups[filename] = {
+                'server': server,
+                'timestamp': timestamp.strftime(BACKUP_TIMESTAMP_FORMAT),
+                'size': os.path.getsize(backup_path),
+            }
+            self._save(backups)
+
+    def list(self, server=None, rescan=False):
+        """Returns (filename, server, timestamp, size) tuples, newest first."""
+        with self._lock:
+            backups = self._backups(rescan)
+        entries = [
+            (filename, entry['server'], datetime.strptime(entry['timestamp'], BACKUP_TIMESTAMP_FORMAT), entry['size'])
+            for filename, entry in backups.items()
+            if server is None or entry['server'] == server
+        ]
+        return sorted(entries, key=lambda entry: (entry[2], entry[0]), reverse=True)
+
+    def remove(self, filenames):
+        """Deletes several archives and updates the index once."""
+        with self._lock:
+            backups = self._backups()
+            for filename in filenames:
+                filepath = os.path.join(self.backup_directory, filename)
+                try:
+                    os.remove(filepath)
+                    print(f"Deleting old backup: {filepath}")
+                    if os.path.exists(index_path(filepath)):
+                        os.remove(index_path(filepath))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error deleting {filepath}: {e}")
+                    continue
+                backups.pop(filename, None)
+            self._save(backups)
+
+class RetentionPolicy:
+    TIERS = {
+        'hourly': lambda timestamp: timestamp.strftime("%Y-%m-%d-%H"),
+        'daily': lambda timestamp: timestamp.strftime("%Y-%m-%d"),
+        'weekly': lambda timestamp: "%d-W%02d" % timestamp.isocalendar()[:2],
+        'monthly': lambda timestamp: timestamp.strftime("%Y-%m"),
+    }
+
+    def __init__(self, hourly=None, daily=None, weekly=None, monthly=None, days_to_keep=30, max_total_gb=None):
+        """
+        Initializes a backup retention policy.
+
+        When any grandfather-father-son tier is set, the newest backup of each of the last N
+        hours, days, ISO weeks and months is kept. Otherwise everything newer than days_to_keep
+        is kept. A size quota then removes the oldest remaining backups, never the newest one.
+
+        Args:
+            hourly (int): The number of hourly backups to keep.
+            daily (int): The number of daily backups to keep.
+            weekly (int): The number of weekly backups to keep.
+            monthly (int): The number of monthly backups to keep.
+            days_to_keep (int): The age cutoff used when no tier is set.
+            max_total_gb (float): The maximum total size of one server's backups.
+        """
+        self.tiers = {'hourly': hourly, 'daily': daily, 'weekly': weekly, 'monthly': monthly}
+        self.days_to_keep = days_to_keep
+        self.max_total_gb = max_total_gb
+
+    def select(self, backups, now=None):
+        """Splits catalog entries (newest first) into (keep, delete) lists."""
+        now = now or datetime.now()
+        if any(self.tiers.values()):
+            kept_names = set()
+            for tier, count in self.tiers.items():
+                if not count:
+                    continue
+                buckets = set()
+                for filename, _, timestamp, _ in backups:
+                    bucket = self.TIERS[tier](timestamp)
+                    if bucket not in buckets:
+                        buckets.add(bucket)
+                        kept_names.add(filename)
+                        if len(buckets) >= count:
+                            break
+        else:
+            cutoff = now - timedelta(days=self.days_to_keep)
+            kept_names = {filename for filename, _, timestamp, _ in backups if timestamp >= cutoff}
+        if backups:
+            kept_names.add(backups[0][0])
+
+        keep = [backup for backup in backups if backup[0] in kept_names]
+        delete = [backup for backup in backups if backup[0] not in kept_names]
+        if self.max_total_gb:
+            max_total_bytes = self.max_total_gb * 1024 ** 3
+            while len(keep) > 1 and sum(backup[3] for backup in keep) > max_total_bytes:
+                delete.append(keep.pop())
+        return keep, delete
+
+def apply_retention(backup_directory, server, policy, dry_run=False):
+    """Deletes a server's backups that the policy doesn't keep and returns the deleted filenames."""
+    catalog = BackupCatalog(backup_directory)
+    keep, delete = policy.select(catalog.list(server, rescan=dry_run))
+    if dry_run:
+        print(f"--- Retention report for {server} in {backup_directory} ---")
+        for filename, _, _, size in keep:
+            print(f"keep    {filename} ({size / 1048576:.1f} MiB)")
+        for filename, _, _, size in delete:
+            print(f"delete  {filename} ({size / 1048576:.1f} MiB)")
+        return [backup[0] for backup in delete]
+    if delete:
+        catalog.remove([backup[0] for backup in delete])
+    return [backup[0] for backup in delete]
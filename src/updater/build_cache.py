@@ -0,0 +1,189 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from updater.metrics import get_metrics
+
+DEFAULT_CACHE_DATABASE = "paper_build_cache.sqlite3"
+LEGACY_CACHE_FILE = "paper_build_cache.json"
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_AGE_DAYS = 180
+
+class BuildCache:
+    def __init__(self, database=DEFAULT_CACHE_DATABASE, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, legacy_file=LEGACY_CACHE_FILE):
+        """
+        Initializes a build metadata cache keyed by (project, version, build).
+
+        Lookups are served from memory first and then from a SQLite database. New entries are
+        kept in memory until flush() writes them in a single transaction. The same database keeps
+        the HTTP client's revalidated JSON responses, one row per URL.
+
+        Args:
+            database (str): The path to the SQLite database file.
+            max_entries (int): The maximum number of builds kept in the database.
+            max_age_days (int): Builds fetched longer ago than this are evicted on flush.
+            legacy_file (str): A JSON cache file to import when the database is created, if it exists.
+        """
+        self.database = database
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.legacy_file = legacy_file
+        self._memory = {}
+        self._pending = {}
+        self._responses = {}
+        self._pending_responses = {}
+        self._lock = threading.RLock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.database)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.database, check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS builds ("
+                    "project TEXT NOT NULL, version TEXT NOT NULL, build INTEGER NOT NULL, "
+                    "data TEXT NOT NULL, fetched_at REAL NOT NULL, "
+                    "PRIMARY KEY (project, version, build))"
+                )
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+                )
+            row_count = self._connection.execute("SELECT COUNT(*) FROM builds").fetchone()[0]
+            if row_count == 0 and self.legacy_file:
+                self._import_legacy_file()
+        return self._connection
+
+    def _import_legacy_file(self):
+        try:
+            with open(self.legacy_file, 'r') as f:
+                legacy_cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        now = time.time()
+        rows = [
+            (data.get('project_id'), data.get('version'), data.get('build'), json.dumps(data), now)
+            for data in legacy_cache.values()
+            if data.get('project_id') and data.get('version') and data.get('build') is not None
+        ]
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO builds VALUES (?, ?, ?, ?, ?)", rows)
+        print(f"Imported {len(rows)} cached builds from {self.legacy_file}")
+
+    def get(self, project, version, build):
+        key = (project, str(version), int(build))
+        with self._lock:
+            if key in self._memory:
+                get_metrics().count("build_cache_hits_total")
+                return self._memory[key]
+            row = self._connect().execute(
+                "SELECT data FROM builds WHERE project = ? AND version = ? AND build = ?", key
+            ).fetchone()
+            if row is None:
+                get_metrics().count("build_cache_misses_total")
+                return None
+            get_metrics().count("build_cache_hits_total")
+            data = json.loads(row[0])
+            self._memory[key] = data
+            return data
+
+    def put(self, project, version, build, data):
+        key = (project, str(version), int(build))
+        with self._lock:
+            self._memory[key] = data
+            self._pending[key] = data
+
+    def put_many(self, project, version, builds):
+        """Stores every build of a version, e.g. from a builds-list response."""
+        with self._lock:
+            for data in builds:
+                self.put(project, version, data['build'], data)
+
+    def get_response(self, url):
+        """Returns the cached {'etag', 'last_modified', 'data'} of a URL, or None."""
+        with self._lock:
+            if url in self._responses:
+                return self._responses[url]
+            row = self._connect().execute(
+                "SELECT etag, last_modified, data FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            response = {'etag': row[0], 'last_modified': row[1], 'data': json.loads(row[2])} if row else None
+            self._responses[url] = response
+            return response
+
+    def put_response(self, url, etag, last_modified, data):
+        """Stores a URL's response unless the cached one is identical, so unchanged responses are never rewritten."""
+        response = {'etag': etag, 'last_modified': last_modified, 'data': data}
+        with self._lock:
+            if self.get_response(url) == response:
+                return
+            self._responses[url] = response
+            self._pending_responses[url] = response
+
+    def flush(self):
+        """Writes pending builds and responses in one transaction and applies the eviction policy."""
+        with self._lock:
+            if not self._pending and not self._pending_responses:
+                return
+            now = time.time()
+            rows = [key + (json.dumps(data), now) for key, data in self._pending.items()]
+            responses = [
+                (url, response['etag'], response['last_modified'], json.dumps(response['data']), now)
+                for url, response in self._pending_responses.items()
+            ]
+            connection = self._connect()
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO builds VALUES (?, ?, ?, ?, ?)", rows)
+                connection.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", responses)
+                self._evict(connection, now)
+            self._pending.clear()
+            self._pending_responses.clear()
+
+    def _evict(self, connection, now):
+        if self.max_age_days:
+            connection.execute("DELETE FROM builds WHERE fetched_at < ?", (now - self.max_age_days * 86400,))
+        if self.max_entries:
+            connection.execute(
+                "DELETE FROM builds WHERE rowid NOT IN "
+                "(SELECT rowid FROM builds ORDER BY fetched_at DESC, build DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+_build_cache = None
+_build_cache_lock = threading.Lock()
+
+def configure_build_cache(**settings):
+    """Replaces the shared build cache, e.g. with settings from config.yaml."""
+    global _build_cache
+    with _build_cache_lock:
+        if _build_cache is not None:
+            _build_cache.close()
+        _build_cache = BuildCache(**settings)
+        return _build_cache
+
+def get_build_cache():
+    global _build_cache
+    with _build_cache_lock:
+        if _build_cache is None:
+            _build_cache = BuildCache()
+        return _build_cache
+
+@atexit.register
+def _flush_build_cache():
+    with _build_cache_lock:
+        if _build_cache is not None:
+            _build_cache.close()
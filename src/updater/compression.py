@@ -0,0 +1,110 @@
+import os
+import shutil
+import subprocess
+
+from updater.indexed_archive import IndexedGzipWriter
+
+DEFAULT_COMPRESSION = "gzip"
+DEFAULT_THREADS = os.cpu_count() or 1
+
+class ExternalCompressorWriter:
+    def __init__(self, command, path):
+        """Streams everything written to it through an external compressor into path."""
+        self.command = command
+        self._output = open(path, 'wb')
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=self._output)
+        except OSError:
+            self._output.close()
+            raise
+
+    def write(self, data):
+        return self._process.stdin.write(data)
+
+    def close(self):
+        if self._process.stdin.closed:
+            return
+        self._process.stdin.close()
+        return_code = self._process.wait()
+        self._output.close()
+        if return_code:
+            raise subprocess.CalledProcessError(return_code, self.command)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CompressionBackend:
+    NAME = ""
+    EXTENSION = ""
+    DEFAULT_LEVEL = None
+    INDEXED = False
+
+    def __init__(self, level=None, threads=None):
+        """
+        Initializes a compression backend for server backups.
+
+        Args:
+            level (int): The compression level, defaults to the backend's own default.
+            threads (int): The number of compression threads, defaults to the number of CPUs.
+        """
+        self.level = level if level is not None else self.DEFAULT_LEVEL
+        self.threads = threads or DEFAULT_THREADS
+
+    def open(self, path):
+        """Returns a writable binary stream that compresses into path."""
+        raise NotImplementedError
+
+class GzipBackend(CompressionBackend):
+    NAME = "gzip"
+    EXTENSION = ".tar.gz"
+    DEFAULT_LEVEL = 6
+
+    def open(self, path):
+        """Compresses with pigz, or without it in independently compressed frames on self.threads threads."""
+        pigz = shutil.which('pigz')
+        if pigz:
+            return ExternalCompressorWriter([pigz, '-p', str(self.threads), f"-{self.level}", '-c'], path)
+        return IndexedGzipWriter(path, self.level, self.threads)
+
+class ZstdBackend(CompressionBackend):
+    NAME = "zstd"
+    EXTENSION = ".tar.zst"
+    DEFAULT_LEVEL = 3
+
+    def open(self, path):
+        zstd = shutil.which('zstd')
+        if zstd:
+            return ExternalCompressorWriter([zstd, f"-T{self.threads}", f"-{self.level}", '-q', '-c'], path)
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd compression requires the 'zstd' command or the 'zstandard' package.")
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=self.threads)
+        return compressor.stream_writer(open(path, 'wb'), closefd=True)
+
+class IndexedGzipBackend(CompressionBackend):
+    NAME = "gzip-indexed"
+    EXTENSION = ".tar.gz"
+    DEFAULT_LEVEL = 6
+    INDEXED = True
+
+    def open(self, path):
+        return IndexedGzipWriter(path, self.level, self.threads)
+
+class NoCompressionBackend(CompressionBackend):
+    NAME = "none"
+    EXTENSION = ".tar"
+
+    def open(self, path):
+        return open(path, 'wb')
+
+COMPRESSION_BACKENDS = {backend.NAME: backend for backend in (GzipBackend, IndexedGzipBackend, ZstdBackend, NoCompressionBackend)}
+BACKUP_EXTENSIONS = tuple(sorted({backend.EXTENSION for backend in COMPRESSION_BACKENDS.values()}))
+
+def get_compression_backend(name=DEFAULT_COMPRESSION, level=None, threads=None):
+    if name not in COMPRESSION_BACKENDS:
+        raise ValueError(f"Unknown compression '{name}', expected one of: {', '.join(COMPRESSION_BACKENDS)}")
+    return COMPRESSION_BACKENDS[name](level=level, threads=threads)
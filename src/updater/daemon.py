@@ -0,0 +1,133 @@
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+from updater.http_client import get_http_client
+from updater.metrics import get_metrics
+
+DEFAULT_POLL_INTERVAL = 300
+DEFAULT_JITTER = 30
+DEFAULT_STATUS_FILE = "updater_status.json"
+
+class UpdateDaemon:
+    def __init__(self, watchers, on_update, on_backup=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                 jitter=DEFAULT_JITTER, backup_interval=0, status_file=DEFAULT_STATUS_FILE):
+        """
+        Initializes a long-running scheduler that polls for new builds and runs backups.
+
+        Args:
+            watchers (dict): Maps an artifact name to a callable returning its latest build key,
+                e.g. (version, build). Watchers should be cheap; they run on every poll.
+            on_update (callable): Called with the names of changed artifacts; returns the result
+                dicts of UpdatePlan.run (artifact, path, seconds, error).
+            on_backup (callable): Called every backup_interval seconds.
+            poll_interval (float): The number of seconds between polls.
+            jitter (float): The maximum number of seconds randomly added to or removed from each interval.
+            backup_interval (float): The number of seconds between backups, 0 to disable.
+            status_file (str): Where the daemon's status is written as JSON.
+        """
+        self.watchers = watchers
+        self.on_update = on_update
+        self.on_backup = on_backup
+        self.poll_interval = poll_interval
+        self.jitter = jitter
+        self.backup_interval = backup_interval
+        self.status_file = status_file
+        self.latest = {}
+        self.status = {
+            'pid': os.getpid(),
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'artifacts': {name: {} for name in watchers},
+            'last_backup': None,
+        }
+
+    def poll(self):
+        """Checks every watcher once and updates the artifacts whose build changed."""
+        changed = {}
+        now = datetime.now().isoformat(timespec='seconds')
+        for name, check in self.watchers.items():
+            artifact_status = self.status['artifacts'][name]
+            artifact_status['last_checked'] = now
+            try:
+                key = check()
+            except Exception as e:
+                print(f"Error checking {name} for a new build: {e}")
+                artifact_status['error'] = str(e)
+                continue
+            artifact_status['error'] = None
+            if key is not None and key != self.latest.get(name):
+                changed[name] = key
+
+        if changed:
+            print(f"\n--- New builds found: {', '.join(changed)} ---")
+            try:
+                results = self.on_update(list(changed))
+            except (Exception, SystemExit) as e:
+                error = f"{type(e).__name__}: {e}"
+                print(f"Error updating {', '.join(changed)} ({error}). Retrying on the next poll.")
+                for name in changed:
+                    self.status['artifacts'][name]['error'] = error
+                self.write_status()
+                results = []
+            for result in results:
+                artifact_status = self.status['artifacts'][result['artifact']]
+                if result['error']:
+                    artifact_status['error'] = result['error']
+                    continue
+                self.latest[result['artifact']] = changed[result['artifact']]
+                artifact_status.update({
+                    'build': list(changed[result['artifact']]),
+                    'path': result['path'],
+                    'last_updated': datetime.now().isoformat(timespec='seconds'),
+                })
+        get_http_client().save()
+        get_metrics().flush()
+
+    def backup(self):
+        started = time.monotonic()
+        self.on_backup()
+        self.status['last_backup'] = {
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'seconds': round(time.monotonic() - started, 1),
+        }
+        get_metrics().flush()
+
+    def _next_interval(self, interval):
+        return max(1, interval + random.uniform(-self.jitter, self.jitter))
+
+    def write_status(self, **extra):
+        self.status.update(extra)
+        temp_file = f"{self.status_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(self.status, f, indent=4)
+        os.replace(temp_file, self.status_file)
+
+    def run(self):
+        """Polls and backs up on schedule until interrupted."""
+        print(f"--- Update daemon started, polling every {self.poll_interval}s ---")
+        next_poll = time.monotonic()
+        next_backup = time.monotonic() + self._next_interval(self.backup_interval) \
+            if self.backup_interval and self.on_backup else None
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_poll:
+                    self.poll()
+                    next_poll = time.monotonic() + self._next_interval(self.poll_interval)
+                if next_backup is not None and now >= next_backup:
+                    self.backup()
+                    next_backup = time.monotonic() + self._next_interval(self.backup_interval)
+                wall_clock = time.time() - time.monotonic()
+                self.write_status(
+                    state='idle',
+                    next_poll=datetime.fromtimestamp(wall_clock + next_poll).isoformat(timespec='seconds'),
+                    next_backup=datetime.fromtimestamp(wall_clock + next_backup).isoformat(timespec='seconds')
+                    if next_backup is not None else None,
+                )
+                wake_up = min(next_poll, next_backup) if next_backup is not None else next_poll
+                time.sleep(max(0, wake_up - time.monotonic()))
+        except KeyboardInterrupt:
+            print("--- Update daemon stopped ---")
+            self.write_status(state='stopped')
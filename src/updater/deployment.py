@@ -0,0 +1,266 @@
+import json
+import os
+import shutil
+import time
+import zipfile
+from datetime import datetime
+
+from updater.fingerprints import get_fingerprint_index
+from updater.metrics import get_metrics
+from updater.server_control import RconConnectionLost, RconError
+
+DEPLOY_DIRECTORY = ".deployments"
+RELEASE_MANIFEST = "release.json"
+RELEASE_TIMESTAMP_FORMAT = "%Y-%m-%d-%H%M%S"
+DEFAULT_SERVER_JAR = "server.jar"
+DEFAULT_KEEP_RELEASES = 3
+PLUGIN_DESCRIPTORS = ("plugin.yml", "paper-plugin.yml")
+
+def verify_jar(filepath, server_jar=False):
+    """Raises ValueError unless filepath is an intact jar: a server jar with a Main-Class, or a plugin with a descriptor."""
+    try:
+        with zipfile.ZipFile(filepath) as jar:
+            broken = jar.testzip()
+            if broken:
+                raise ValueError(f"{filepath} is corrupt at {broken}")
+            names = set(jar.namelist())
+            if server_jar:
+                manifest = jar.read('META-INF/MANIFEST.MF').decode('utf-8', errors='replace') \
+                    if 'META-INF/MANIFEST.MF' in names else ''
+                if 'Main-Class:' not in manifest:
+                    raise ValueError(f"{filepath} has no Main-Class and can't be started as a server")
+            elif not names.intersection(PLUGIN_DESCRIPTORS):
+                raise ValueError(f"{filepath} has no {' or '.join(PLUGIN_DESCRIPTORS)} and isn't a plugin")
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ValueError(f"{filepath} is not a readable jar: {e}")
+
+def deploy_path(artifact, artifact_name, server_jar=DEFAULT_SERVER_JAR):
+    """Returns where an artifact goes in the server directory: deploy_as, the server jar for Paper, else plugins/<name>.jar."""
+    if 'deploy_as' in artifact:
+        return artifact['deploy_as'] or None
+    if artifact.get('type') == 'paper':
+        return server_jar
+    return f"plugins/{artifact_name}.jar"
+
+def deployed_target(server_directory, path):
+    """Returns the jar a server symlink into .deployments points at, or None for any other path."""
+    if not os.path.islink(path):
+        return None
+    deploy_directory = os.path.realpath(os.path.join(server_directory, DEPLOY_DIRECTORY))
+    target = os.path.realpath(path)
+    if os.path.commonpath([deploy_directory, target]) != deploy_directory or not os.path.isfile(target):
+        return None
+    return target
+
+def deployed_files(server_directory):
+    """Maps the server paths that are symlinks into the active release to the jars they point at."""
+    manifest_path = os.path.join(server_directory, DEPLOY_DIRECTORY, "current", RELEASE_MANIFEST)
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        relative_paths = json.load(f)['files']
+    deployed = {}
+    for relative_path in relative_paths:
+        target = deployed_target(server_directory, os.path.join(server_directory, relative_path))
+        if target:
+            deployed[relative_path] = target
+    return deployed
+
+class Deployment:
+    def __init__(self, server_directory, server_jar=DEFAULT_SERVER_JAR, keep=DEFAULT_KEEP_RELEASES):
+        """
+        Manages the jars a server runs as releases that can be switched with one symlink.
+
+        Every release is a directory under <server_directory>/.deployments/releases holding hard
+        links to its jars. The jars in the server directory are symlinks into .deployments/current,
+        which points at the active release, so switching releases (or rolling back to the previous
+        one) is a single atomic rename and nothing is copied while the server is down.
+
+        Args:
+            server_directory (str): The absolute path to the Minecraft server directory.
+            server_jar (str): The path, relative to the server directory, the server jar is started from.
+            keep (int): The number of releases kept besides the current and previous ones.
+        """
+        self.server_directory = server_directory
+        self.server_jar = server_jar
+        self.keep = keep
+        self.deploy_directory = os.path.join(server_directory, DEPLOY_DIRECTORY)
+        self.releases_directory = os.path.join(self.deploy_directory, "releases")
+        self.current_link = os.path.join(self.deploy_directory, "current")
+        self.previous_link = os.path.join(self.deploy_directory, "previous")
+        os.makedirs(self.releases_directory, exist_ok=True)
+
+    def list_releases(self):
+        """Returns the releases oldest first, in the order their manifests were created."""
+        releases = [name for name in os.listdir(self.releases_directory)
+                    if os.path.isfile(os.path.join(self.releases_directory, name, RELEASE_MANIFEST))]
+        return sorted(releases, key=lambda release: (self.load_release(release).get('created', ''), release))
+
+    def _linked_release(self, link):
+        return os.path.basename(os.readlink(link)) if os.path.islink(link) else None
+
+    def current_release(self):
+        return self._linked_release(self.current_link)
+
+    def previous_release(self):
+        return self._linked_release(self.previous_link)
+
+    def load_release(self, release):
+        with open(os.path.join(self.releases_directory, release, RELEASE_MANIFEST), 'r') as f:
+            return json.load(f)
+
+    def stage(self, files):
+        """
+        Verifies new jars and stages a release next to the running one, without touching the server.
+
+        Args:
+            files (dict): Maps a path relative to the server directory to the downloaded jar that goes there.
+                Paths not listed keep the current release's jar.
+
+        Returns:
+            The name of the staged release, or the current one if nothing changed.
+        """
+        current = self.current_release()
+        manifest = self.load_release(current)['files'] if current else {}
+        release_files = dict(manifest)
+        sources = {}
+        with get_metrics().span("stage"):
+            for relative_path, source in files.items():
+                digest = get_fingerprint_index(self.deploy_directory).sha256(source)
+                if manifest.get(relative_path, {}).get('sha256') == digest:
+                    continue
+                verify_jar(source, server_jar=relative_path == self.server_jar)
+                release_files[relative_path] = {'sha256': digest, 'source': os.path.abspath(source)}
+                sources[relative_path] = source
+            if not sources:
+                print(f"Release {current} already has these jars, nothing to stage.")
+                return current
+
+            release = self._new_release_name()
+            release_directory = os.path.join(self.releases_directory, release)
+            temp_directory = f"{release_directory}.tmp"
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            for relative_path in release_files:
+                source = sources.get(relative_path) or os.path.join(self.releases_directory, current, relative_path)
+                self._place(source, os.path.join(temp_directory, relative_path))
+            self._write_manifest(temp_directory, release_files, "staged")
+            os.rename(temp_directory, release_directory)
+        print(f"Staged release {release}: {', '.join(sorted(sources))}")
+        return release
+
+    def _new_release_name(self):
+        base = datetime.now().strftime(RELEASE_TIMESTAMP_FORMAT)
+        release, suffix = base, 1
+        while os.path.exists(os.path.join(self.releases_directory, release)):
+            suffix += 1
+            release = f"{base}-{suffix}"
+        return release
+
+    @staticmethod
+    def _place(source, target):
+        """Hardlinks source to target, copying only when they're on different filesystems."""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    @staticmethod
+    def _write_manifest(release_directory, release_files, kind):
+        os.makedirs(release_directory, exist_ok=True)
+        with open(os.path.join(release_directory, RELEASE_MANIFEST), 'w') as f:
+            json.dump({'created': datetime.now().isoformat(), 'kind': kind, 'files': release_files}, f, indent=4)
+
+    def _adopt_existing(self, relative_paths):
+        """Records the jars the server ran before its first deployment as a release, so it can be rolled back to."""
+        release = self._new_release_name()
+        release_directory = os.path.join(self.releases_directory, release)
+        release_files = {}
+        for relative_path in relative_paths:
+            path = os.path.join(self.server_directory, relative_path)
+            if os.path.isfile(path) and not os.path.islink(path):
+                self._place(path, os.path.join(release_directory, relative_path))
+                digest = get_fingerprint_index(self.deploy_directory).sha256(path)
+                release_files[relative_path] = {'sha256': digest, 'source': path}
+        self._write_manifest(release_directory, release_files, "adopted")
+        self._switch_link(self.current_link, release)
+        print(f"Adopted the server's existing jars as release {release}")
+        return release
+
+    def _switch_link(self, link, release):
+        temp_link = f"{link}.tmp"
+        if os.path.lexists(temp_link):
+            os.remove(temp_link)
+        os.symlink(os.path.join("releases", release), temp_link)
+        os.replace(temp_link, link)
+
+    def _link_server_files(self, relative_paths):
+        """Points the server's jar paths at .deployments/current; files already there have the same content."""
+        for relative_path in relative_paths:
+            path = os.path.join(self.server_directory, relative_path)
+            target = os.path.relpath(os.path.join(self.current_link, relative_path), os.path.dirname(path))
+            if os.path.islink(path) and os.readlink(path) == target:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_link = f"{path}.deploy.tmp"
+            if os.path.lexists(temp_link):
+                os.remove(temp_link)
+            os.symlink(target, temp_link)
+            os.replace(temp_link, path)
+
+    def _remove_stale_links(self, relative_paths, release_files):
+        """Removes server symlinks the active release has no jar for any more."""
+        for relative_path in relative_paths:
+            path = os.path.join(self.server_directory, relative_path)
+            if relative_path not in release_files and os.path.islink(path) and not os.path.exists(path):
+                os.remove(path)
+
+    def activate(self, release):
+        """Switches the server to a staged release in one atomic rename; the old one becomes the previous release."""
+        release_files = self.load_release(release)['files']
+        current = self.current_release() or self._adopt_existing(release_files)
+        if release == current:
+            return False
+        current_files = self.load_release(current)['files']
+        self._link_server_files(current_files)
+        started = time.monotonic()
+        self._switch_link(self.current_link, release)
+        self._switch_link(self.previous_link, current)
+        get_metrics().gauge("deploy_switch_seconds", time.monotonic() - started)
+        self._link_server_files(release_files)
+        self._remove_stale_links(current_files, release_files)
+        print(f"Activated release {release} (previous: {current})")
+        self.prune()
+        return True
+
+    def prune(self):
+        """Deletes the releases created first beyond keep, never the current or previous one."""
+        active = {self.current_release(), self.previous_release()}
+        removable = [release for release in self.list_releases() if release not in active]
+        for release in removable[:max(0, len(removable) - self.keep)]:
+            shutil.rmtree(os.path.join(self.releases_directory, release), ignore_errors=True)
+            print(f"Removed old release {release}")
+
+def switch_release(deployment, release, control=None, restart_command=None, warning_seconds=0):
+    """
+    Activates a staged release inside a restart window: players are warned, the symlink is switched
+    and restart_command is sent, so the downtime is the restart itself. Without a running server or
+    a restart_command the release is activated for the next start.
+    """
+    if release == deployment.current_release():
+        return False
+    if not (control and restart_command and control.is_running()):
+        deployment.activate(release)
+        print("The new release takes effect the next time the server starts.")
+        return True
+    try:
+        if warning_seconds:
+            control.send(f"say Restarting for an update in {warning_seconds} seconds.")
+            time.sleep(warning_seconds)
+        deployment.activate(release)
+        control.send(restart_command)
+    except RconConnectionLost:
+        print(f"The server closed {control.name} while handling '{restart_command}', as it does when restarting.")
+    except (OSError, RconError) as e:
+        print(f"Warning: Could not restart the server over {control.name} ({e}). Restart it to load release {release}.")
+    return True
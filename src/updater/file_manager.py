@@ -1,10 +1,25 @@
-import glob
+import shutil
 import subprocess
+import tarfile
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime
+
+from updater.archiver import Archiver, ExcludeMatcher, walk_directory
+from updater.backup_retention import BackupCatalog, RetentionPolicy, apply_retention
+from updater.compression import DEFAULT_COMPRESSION, get_compression_backend
+from updater.deployment import deployed_files
+from updater.incremental_backup import DEFAULT_FULL_EVERY, IncrementalBackup
+from updater.indexed_archive import IndexedArchive
+from updater.metrics import get_metrics
+from updater.server_control import RconError, open_control_channel
 
 class FileManager:
-    def __init__(self, server_directory, backup_directory, screen_name="minecraft"):
+    def __init__(self, server_directory, backup_directory, screen_name="minecraft", compression=DEFAULT_COMPRESSION,
+                 compression_level=None, compression_threads=None, verbose=False, backup_mode="archive",
+                 full_every=DEFAULT_FULL_EVERY, snapshot_first=False, retention=None, region_aware=True,
+                 rcon=None):
         """
         Initializes the FileManager with server and backup directories.
 
@@ -12,90 +27,270 @@ class FileManager:
             server_directory (str): The absolute path to the Minecraft server directory.
             backup_directory (str): The absolute path to the directory where backups will be stored.
             screen_name (str): The name of the screen session running the Minecraft server.
+            compression (str): The backup compression backend: "gzip", "zstd" or "none".
+            compression_level (int): The compression level, defaults to the backend's default.
+            compression_threads (int): The number of compression threads, defaults to the number of CPUs.
+            verbose (bool): Whether to list every archived file.
+            backup_mode (str): "archive" for a full archive per backup, "incremental" for deduplicated snapshots.
+            full_every (int): In incremental mode, rehash every file on every Nth snapshot.
+            snapshot_first (bool): Copy the server directory while saving is off, turn saving back on
+                and write the backup from the copy in the background.
+            retention (dict): RetentionPolicy settings (hourly, daily, weekly, monthly, days_to_keep, max_total_gb).
+            region_aware (bool): In incremental mode, store region files per Minecraft chunk and only
+                read the chunks the server saved since the previous snapshot.
+            rcon (dict): RconClient settings (host, port, password, timeout). When the server answers
+                over RCON, backups wait for "save-all flush" to finish; otherwise screen is used.
         """
         self.server_directory = server_directory
         self.backup_directory = backup_directory
         self.screen_name = screen_name
+        self.compression = get_compression_backend(compression, compression_level, compression_threads)
+        self.verbose = verbose
+        self.backup_mode = backup_mode
+        self.full_every = full_every
+        self.snapshot_first = snapshot_first
+        self.retention = retention or {}
+        self.region_aware = region_aware
+        self.rcon = rcon
+        self.background_backup = None
+        self.save_off_seconds = None
         os.makedirs(self.backup_directory, exist_ok=True)
 
     def create_server_backup(self, exclude_patterns=None, days_to_keep=30):
         """Executes a backup of the Minecraft server files."""
+        metrics = get_metrics()
+        with metrics.labels(server=os.path.basename(self.server_directory)), metrics.span("backup"):
+            self._create_server_backup(exclude_patterns, days_to_keep)
+
+    def _create_server_backup(self, exclude_patterns=None, days_to_keep=30):
         timestamp_format = "%Y-%m-%d %H:%M:%S"
         start_time = datetime.now().strftime(timestamp_format)
         server_dirname = os.path.basename(self.server_directory)
-        backup_filename = f"mcbackup_{server_dirname}_{datetime.now().strftime('%Y-%m-%d-%H')}.tar.gz"
+        backup_filename = f"mcbackup_{server_dirname}_{datetime.now().strftime('%Y-%m-%d-%H')}{self.compression.EXTENSION}"
         backup_path = os.path.join(self.backup_directory, backup_filename)
 
         print(f"Starting server backup at {start_time} for {server_dirname}")
 
-        try:
-            subprocess.run(['screen', '-list'], check=True, capture_output=True, text=True)
-            self._send_screen_command(self.screen_name, f"say Backup starting at {start_time}. World no longer saving!...")
-            self._send_screen_command(self.screen_name, "save-off")
-            self._send_screen_command(self.screen_name, "save-all")
-            screen_running = True
-        except (FileNotFoundError, subprocess.CalledProcessError):
-            print("Warning: 'screen' is not running or not found. Skipping server save management.")
-            screen_running = False
+        control = open_control_channel(self.screen_name, self.rcon)
+        save_off_started = time.monotonic()
+        if not control.is_running():
+            print(f"Warning: {control.name} is not running or not found. Skipping server save management.")
+            control = None
+        elif not self._pause_saving(control, start_time):
+            control = None
 
+        staging_directory = None
         try:
-            os.chdir(self.server_directory)
+            try:
+                if self.snapshot_first:
+                    staging_directory = os.path.join(self.backup_directory, f".staging_{server_dirname}_{os.getpid()}")
+                    with get_metrics().span("snapshot_copy"):
+                        self._copy_server_directory(staging_directory, exclude_patterns)
+                else:
+                    with get_metrics().span("write"):
+                        self._write_backup(self.server_directory, backup_path, exclude_patterns)
+            finally:
+                self._resume_saving(control, save_off_started, timestamp_format)
 
-            files_to_backup = glob.glob('*')
-            tar_command = ['tar', '-czvf', backup_path]
+            if self.snapshot_first:
+                self.background_backup = threading.Thread(
+                    target=self._finish_backup,
+                    args=(staging_directory, backup_path, exclude_patterns, days_to_keep, server_dirname),
+                    name=f"backup-{server_dirname}",
+                )
+                self.background_backup.start()
+                print(f"Compressing backup of {server_dirname} in the background.")
+                return
+            self._finish_backup(None, backup_path, exclude_patterns, days_to_keep, server_dirname, write=False)
+
+        except FileNotFoundError as e:
+            print(f"Error: '{e.filename}' not found.")
+        except subprocess.CalledProcessError as e:
+            print(f"Error during backup: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred during backup: {e}")
+        finally:
+            if staging_directory and self.background_backup is None:
+                shutil.rmtree(staging_directory, ignore_errors=True)
 
-            if exclude_patterns:
-                for pattern in exclude_patterns:
-                    tar_command.extend(['--exclude', pattern])
+    def report_retention(self, days_to_keep=30):
+        """Prints which backups the retention policy would keep and delete without deleting anything."""
+        return self._remove_old_backups(days_to_keep, dry_run=True)
 
-            tar_command.extend(files_to_backup)
+    def wait_for_background_backup(self):
+        """Blocks until a backup compressing in the background has finished."""
+        if self.background_backup is not None:
+            self.background_backup.join()
+            self.background_backup = None
 
-            print(f"Executing backup command: {' '.join(tar_command)}")
-            subprocess.run(tar_command, check=True)
+    def _pause_saving(self, control, start_time):
+        """Turns saving off and flushes the world, returning False if the server stopped answering."""
+        try:
+            control.send(f"say Backup starting at {start_time}. World no longer saving!...")
+            control.send("save-off")
+            flush_started = time.monotonic()
+            if control.save_all():
+                print(f"World flushed to disk in {time.monotonic() - flush_started:.2f}s.")
+                get_metrics().gauge("save_flush_seconds", time.monotonic() - flush_started)
+            return True
+        except (OSError, RconError) as e:
+            print(f"Warning: Lost connection to {control.name} ({e}). Skipping server save management.")
+            return False
 
-            if screen_running:
-                self._send_screen_command(self.screen_name, "save-on")
+    def _resume_saving(self, control, save_off_started, timestamp_format):
+        self.save_off_seconds = time.monotonic() - save_off_started
+        get_metrics().gauge("save_off_seconds", self.save_off_seconds)
+        if control is not None:
+            try:
+                control.send("save-on")
                 end_time = datetime.now().strftime(timestamp_format)
-                self._send_screen_command(self.screen_name, f"say Backup complete at {end_time}! World now saving.")
-            else:
-                print(f"Backup complete at {datetime.now().strftime(timestamp_format)}.")
+                control.send(f"say Backup complete at {end_time}! World now saving.")
+            except (OSError, RconError) as e:
+                print(f"Warning: Could not turn saving back on over {control.name} ({e}). Run 'save-on' manually.")
+        else:
+            print(f"Backup complete at {datetime.now().strftime(timestamp_format)}.")
+        print(f"Save-off window lasted {self.save_off_seconds:.1f}s.")
 
-            self._remove_old_backups(days_to_keep, server_dirname=server_dirname)
+    def _finish_backup(self, source_directory, backup_path, exclude_patterns, days_to_keep, server_dirname, write=True):
+        metrics = get_metrics()
+        try:
+            with metrics.labels(server=server_dirname):
+                if write:
+                    with metrics.span("write"):
+                        backup_path = self._write_backup(source_directory, backup_path, exclude_patterns)
+                if self.backup_mode != "incremental":
+                    BackupCatalog(self.backup_directory).add(backup_path)
+                with metrics.span("retention"):
+                    self._remove_old_backups(days_to_keep, server_dirname=server_dirname)
             print(f"Server backup completed successfully to {backup_path}")
-
-        except FileNotFoundError:
-            print("Error: 'tar' command not found. Ensure it's in your system's PATH.")
         except subprocess.CalledProcessError as e:
             print(f"Error during backup: {e}")
         except Exception as e:
             print(f"An unexpected error occurred during backup: {e}")
+        finally:
+            if write and source_directory != self.server_directory:
+                shutil.rmtree(source_directory, ignore_errors=True)
 
-    def _send_screen_command(self, screen_name, command):
-        """Sends a command to a running screen session."""
-        try:
-            subprocess.run(['screen', '-r', screen_name, '-X', 'stuff', f"{command}\n"], check=True)
-            print(f"Sent command to screen '{screen_name}': {command}")
-        except FileNotFoundError:
-            print("Error: 'screen' command not found. Ensure it's installed.")
-        except subprocess.CalledProcessError as e:
-            print(f"Warning: Could not send command to screen '{screen_name}'. Is the session running?")
-
-    def _remove_old_backups(self, days, server_dirname=None):
-        """Removes backup files older than the specified number of days, optionally filtering by server directory name."""
-        cutoff = datetime.now() - timedelta(days=days)
-        print(f"Removing backup files older than {cutoff.strftime('%Y-%m-%d')} in {self.backup_directory}")
-        for filename in os.listdir(self.backup_directory):
-            filepath = os.path.join(self.backup_directory, filename)
-            if os.path.isfile(filepath):
-                try:
-                    modified_time = datetime.fromtimestamp(os.path.getmtime(filepath))
-                    if modified_time < cutoff and filename.startswith("mcbackup_") and filename.endswith(".tar.gz"):
-                        if server_dirname:
-                            if f"mcbackup_{server_dirname}_" in filename:
-                                print(f"Deleting old backup: {filepath}")
-                                os.remove(filepath)
-                        else:
-                            print(f"Deleting old backup: {filepath}")
-                            os.remove(filepath)
-                except Exception as e:
-                    print(f"Error checking or deleting {filepath}: {e}")
+    def _write_backup(self, source_directory, backup_path, exclude_patterns=None):
+        """Writes an archive or incremental snapshot of source_directory and returns where it went."""
+        if self.backup_mode == "incremental":
+            incremental_backup = self.get_incremental_backup(source_directory)
+            snapshot = incremental_backup.create_snapshot(exclude_patterns)
+            return os.path.join(incremental_backup.snapshots_directory, f"{snapshot}.json")
+        self._create_archive(source_directory, backup_path, exclude_patterns)
+        return backup_path
+
+    def _copy_paths(self, exclude_patterns=None):
+        """Returns the paths to copy whole, descending only into directories that hold an excluded path."""
+        excluded = []
+        entries = list(walk_directory(self.server_directory, ExcludeMatcher(exclude_patterns), excluded))
+        split_directories = {""}
+        for relative_path in excluded:
+            parts = relative_path.split('/')
+            split_directories.update('/'.join(parts[:depth]) for depth in range(1, len(parts)))
+        return [relative_path for relative_path, _ in entries
+                if relative_path not in split_directories and relative_path.rpartition('/')[0] in split_directories]
+
+    def _copy_server_directory(self, staging_directory, exclude_patterns=None):
+        """
+        Copies the server directory without the excluded paths, using reflinks where the filesystem
+        supports them, and copies deployed jars in place of their symlinks.
+        """
+        shutil.rmtree(staging_directory, ignore_errors=True)
+        os.makedirs(staging_directory)
+        paths = self._copy_paths(exclude_patterns)
+        started = time.monotonic()
+        if paths:
+            try:
+                subprocess.run(['cp', '-a', '--parents', '--reflink=auto'] + paths + [staging_directory],
+                               check=True, cwd=self.server_directory)
+            except (FileNotFoundError, subprocess.CalledProcessError):
+                shutil.rmtree(staging_directory, ignore_errors=True)
+                os.makedirs(staging_directory)
+                for relative_path in paths:
+                    source = os.path.join(self.server_directory, relative_path)
+                    target = os.path.join(staging_directory, relative_path)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if os.path.isdir(source) and not os.path.islink(source):
+                        shutil.copytree(source, target, symlinks=True)
+                    else:
+                        shutil.copy2(source, target, follow_symlinks=False)
+        for relative_path, target in deployed_files(self.server_directory).items():
+            staged_path = os.path.join(staging_directory, relative_path)
+            if os.path.islink(staged_path):
+                os.remove(staged_path)
+                shutil.copy2(target, staged_path)
+        print(f"Copied server directory to {staging_directory} in {time.monotonic() - started:.1f}s")
+
+    def get_incremental_backup(self, source_directory=None):
+        server_dirname = os.path.basename(self.server_directory)
+        repository_directory = os.path.join(self.backup_directory, f"incremental_{server_dirname}")
+        return IncrementalBackup(source_directory or self.server_directory, repository_directory, self.full_every,
+                                 region_aware=self.region_aware)
+
+    def _create_archive(self, source_directory, backup_path, exclude_patterns=None):
+        archiver = Archiver(source_directory, exclude_patterns, self.verbose)
+        print(f"Compressing backup with {self.compression.NAME} using {self.compression.threads} threads")
+        members = [] if self.compression.INDEXED else None
+        with self.compression.open(backup_path) as writer:
+            stats = archiver.write(writer, members)
+            if members is not None:
+                writer.close()
+                writer.write_index(members)
+        print(f"Archived {stats}")
+        metrics = get_metrics()
+        backup_size = os.path.getsize(backup_path)
+        metrics.count("archived_bytes_total", stats.bytes)
+        metrics.gauge("backup_bytes", backup_size)
+        if backup_size:
+            metrics.gauge("compression_ratio", stats.bytes / backup_size)
+
+    def find_backup(self, backup):
+        """Returns the path of a backup archive given as a path or as a filename in the backup directory."""
+        return backup if os.path.exists(backup) else os.path.join(self.backup_directory, backup)
+
+    def verify_backup(self, backup, workers=None):
+        """Checks every file in an indexed backup archive against its recorded SHA-256."""
+        backup_path = self.find_backup(backup)
+        if not IndexedArchive.exists(backup_path):
+            print(f"Error: {backup_path} has no index. Only backups made with 'gzip-indexed' compression can be verified.")
+            return False
+        started = time.monotonic()
+        archive = IndexedArchive(backup_path)
+        failures = archive.verify(workers)
+        for name, reason in failures:
+            print(f"FAILED {name}: {reason}")
+        files = sum(1 for member in archive.members if member['type'] == 'file')
+        print(f"Verified {files - len(failures)} of {files} files in {backup_path} "
+              f"in {time.monotonic() - started:.1f}s")
+        return not failures
+
+    def restore_backup(self, backup, target_directory, paths=None):
+        """Extracts a backup archive, or only the given paths, reading just their part of an indexed archive."""
+        backup_path = self.find_backup(backup)
+        if IndexedArchive.exists(backup_path):
+            return IndexedArchive(backup_path).extract(target_directory, paths)
+        print(f"{backup_path} has no index, reading the whole archive.")
+        prefixes = [path.strip('/') for path in paths or []]
+        restored = 0
+        with tarfile.open(backup_path, 'r:*') as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extraction_filter = tarfile.data_filter
+            for member in tar:
+                if prefixes and not any(member.name == prefix or member.name.startswith(prefix + '/')
+                                        for prefix in prefixes):
+                    continue
+                tar.extract(member, target_directory)
+                restored += 1
+        print(f"Restored {restored} entries from {backup_path} to {target_directory}")
+        return restored
+
+    def _remove_old_backups(self, days, server_dirname=None, dry_run=False):
+        """Removes a server's backups that fall outside the retention policy, or only reports them when dry_run is set."""
+        server_dirname = server_dirname or os.path.basename(self.server_directory)
+        policy = RetentionPolicy(**dict({'days_to_keep': days}, **self.retention))
+        if not dry_run:
+            print(f"Applying backup retention for {server_dirname} in {self.backup_directory}")
+        if self.backup_mode == "incremental":
+            return self.get_incremental_backup().apply_retention(policy, dry_run)
+        return apply_retention(self.backup_directory, server_dirname, policy, dry_run)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+
+from updater.metrics import get_metrics
+
+HASH_CHUNK_SIZE = 1024 * 1024
+INDEX_FILENAME = ".fingerprints.json"
+
+def hash_file(filepath, chunk_size=HASH_CHUNK_SIZE):
+    """Returns the SHA-256 of a file, reading it in fixed-size chunks."""
+    metrics = get_metrics()
+    sha256 = hashlib.sha256()
+    size = 0
+    with metrics.span("hash"):
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(chunk)
+                size += len(chunk)
+    metrics.count("hashed_bytes_total", size)
+    return sha256.hexdigest()
+
+class FingerprintIndex:
+    def __init__(self, index_file):
+        """
+        Initializes an index of file hashes keyed by path and validated by (size, mtime, inode).
+
+        Args:
+            index_file (str): The JSON file the index is kept in.
+        """
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            print(f"Error decoding fingerprint index '{self.index_file}'. Starting with an empty index.")
+            return {}
+
+    def _save(self):
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(self._entries, f, indent=4)
+        os.replace(temp_file, self.index_file)
+
+    @staticmethod
+    def _fingerprint(filepath):
+        stat = os.stat(filepath)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+
+    def lookup(self, filepath):
+        """Returns the recorded hash if the file has not changed since it was recorded."""
+        key = os.path.abspath(filepath)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry:
+            fingerprint = self._fingerprint(filepath)
+            if all(entry.get(field) == value for field, value in fingerprint.items()):
+                get_metrics().count("fingerprint_hits_total")
+                return entry['sha256']
+        get_metrics().count("fingerprint_misses_total")
+        return None
+
+    def record(self, filepath, sha256):
+        entry = self._fingerprint(filepath)
+        entry['sha256'] = sha256
+        with self._lock:
+            self._entries[os.path.abspath(filepath)] = entry
+            self._entries = {path: value for path, value in self._entries.items() if os.path.exists(path)}
+            self._save()
+
+    def sha256(self, filepath):
+        """Returns the SHA-256 of a file, only reading it when it changed since the last time."""
+        file_hash = self.lookup(filepath)
+        if file_hash is None:
+            file_hash = hash_file(filepath)
+            self.record(filepath, file_hash)
+        return file_hash
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_fingerprint_index(directory):
+    """Returns the fingerprint index shared by every downloader writing to a directory."""
+    index_file = os.path.abspath(os.path.join(directory, INDEX_FILENAME))
+    with _indexes_lock:
+        if index_file not in _indexes:
+            _indexes[index_file] = FingerprintIndex(index_file)
+        return _indexes[index_file]
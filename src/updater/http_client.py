@@ -0,0 +1,152 @@
+import atexit
+import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from urllib.parse import urlsplit
+
+from updater.build_cache import get_build_cache
+from updater.metrics import get_metrics
+from updater.mirror import MirrorRecorder, rewrite_url
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_POOL_SIZE = 10
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class HttpClient:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 pool_size=DEFAULT_POOL_SIZE, cache=True, mirror_url=None, record_directory=None):
+        """
+        Initializes the HTTP client shared by every downloader.
+
+        Connections are pooled and kept alive per host, idempotent requests are retried with
+        exponential backoff on connection errors, timeouts and 5xx responses, and JSON
+        responses are revalidated with ETag/If-Modified-Since.
+
+        Args:
+            timeout (float): The connect and read timeout in seconds.
+            retries (int): The maximum number of retries per request.
+            backoff_factor (float): The base delay in seconds between retries.
+            pool_size (int): The number of connections kept open per host.
+            cache (bool): Whether validated JSON responses are kept in the build cache database between runs.
+            mirror_url (str): A mirror (see updater.mirror) to send every request to instead of upstream.
+            record_directory (str): Store every fetched response here so this host can serve as a mirror.
+        """
+        self.timeout = timeout
+        self.cache = cache
+        self.mirror_url = mirror_url
+        self.recorder = MirrorRecorder(record_directory) if record_directory else None
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def save(self):
+        """Writes responses that changed since the last save to the build cache database."""
+        if self.cache:
+            get_build_cache().flush()
+
+    def url_for(self, url):
+        return rewrite_url(self.mirror_url, url) if self.mirror_url else url
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.get(self.url_for(url), **kwargs)
+        self._count_request(url, 'GET', response)
+        if self.recorder and not kwargs.get('stream') and response.status_code == 200:
+            self.recorder.record_bytes(url, response.content, response.headers.get('Content-Type', 'text/html'))
+        return response
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('allow_redirects', True)
+        response = self.session.head(self.url_for(url), **kwargs)
+        self._count_request(url, 'HEAD', response)
+        return response
+
+    @staticmethod
+    def _count_request(url, method, response):
+        get_metrics().count("http_requests_total", host=urlsplit(url).netloc, method=method,
+                            status=response.status_code)
+
+    def record_bytes(self, url, body, content_type):
+        """Adds a response body to the mirror being recorded, if any."""
+        if self.recorder:
+            self.recorder.record_bytes(url, body, content_type)
+
+    def record_file(self, url, filepath, content_type="application/java-archive"):
+        """Adds a downloaded artifact to the mirror being recorded, if any."""
+        if self.recorder:
+            self.recorder.record_file(url, filepath, content_type)
+
+    def get_json(self, url, headers=None):
+        """Fetches a JSON document, answering from the cache when the server replies 304 Not Modified."""
+        request_headers = dict(headers or {})
+        cached = get_build_cache().get_response(url) if self.cache else None
+        if cached:
+            if cached.get('etag'):
+                request_headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                request_headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(self.url_for(url), headers=request_headers, timeout=self.timeout)
+        self._count_request(url, 'GET', response)
+        metrics = get_metrics()
+        if response.status_code == 304 and cached:
+            metrics.count("http_cache_hits_total")
+            data = cached['data']
+            if self.recorder:
+                self.recorder.record_bytes(url, json.dumps(data).encode(), 'application/json')
+            return data
+        response.raise_for_status()
+        metrics.count("http_cache_misses_total")
+        metrics.count("http_bytes_total", len(response.content))
+        data = response.json()
+        if self.recorder:
+            self.recorder.record_bytes(url, response.content, 'application/json')
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if self.cache and (etag or last_modified):
+            get_build_cache().put_response(url, etag, last_modified, data)
+        return data
+
+    def close(self):
+        self.save()
+        self.session.close()
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def configure_http_client(**settings):
+    """Replaces the shared HTTP client, e.g. with settings from config.yaml."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = HttpClient(**settings)
+        return _http_client
+
+def get_http_client():
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
+
+@atexit.register
+def _close_http_client():
+    if _http_client is not None:
+        _http_client.close()
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+
+from updater.archiver import ExcludeMatcher, walk_directory
+from updater.deployment import deployed_target
+from updater.indexed_archive import restore_path
+from updater.region_file import REGION_EXTENSION, SECTOR_SIZE, read_chunk_record, read_region_header
+
+CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_FULL_EVERY = 24
+DEFAULT_COMPRESSION_LEVEL = 6
+SNAPSHOT_TIMESTAMP_FORMAT = "%Y-%m-%d-%H%M%S-%f"
+LEGACY_SNAPSHOT_TIMESTAMP_FORMAT = "%Y-%m-%d-%H%M%S"
+
+class IncrementalBackup:
+    def __init__(self, server_directory, repository_directory, full_every=DEFAULT_FULL_EVERY,
+                 compression_level=DEFAULT_COMPRESSION_LEVEL, region_aware=True):
+        """
+        Initializes an incremental, deduplicated backup repository for one server.
+
+        Files are split into fixed-size chunks stored once under their SHA-256 in a chunk store.
+        Every snapshot is a manifest of (path, size, mtime, chunks); files whose size and mtime
+        match the previous snapshot reuse its chunks without being read.
+
+        Region files (.mca) are stored per Minecraft chunk instead: the header is read, and only
+        chunks whose location or save timestamp changed since the previous snapshot are read and
+        stored. Restore writes every chunk back at its recorded sector.
+
+        Args:
+            server_directory (str): The absolute path to the Minecraft server directory.
+            repository_directory (str): The directory holding the chunk store and snapshot manifests.
+            full_every (int): Rehash every file on every Nth snapshot, 0 to never force it.
+            compression_level (int): The zlib level used for stored chunks.
+            region_aware (bool): Store region files per Minecraft chunk.
+        """
+        self.server_directory = server_directory
+        self.repository_directory = repository_directory
+        self.full_every = full_every
+        self.compression_level = compression_level
+        self.region_aware = region_aware
+        self.chunks_directory = os.path.join(repository_directory, "chunks")
+        self.snapshots_directory = os.path.join(repository_directory, "snapshots")
+        os.makedirs(self.chunks_directory, exist_ok=True)
+        os.makedirs(self.snapshots_directory, exist_ok=True)
+
+    def list_snapshots(self):
+        return sorted(filename[:-len(".json")] for filename in os.listdir(self.snapshots_directory)
+                      if filename.endswith(".json"))
+
+    def load_manifest(self, snapshot):
+        with open(os.path.join(self.snapshots_directory, f"{snapshot}.json"), 'r') as f:
+            return json.load(f)
+
+    def snapshot_entries(self):
+        """Returns (snapshot, None, timestamp, stored bytes) tuples, newest first, as RetentionPolicy.select expects."""
+        entries = []
+        for snapshot in self.list_snapshots():
+            timestamp = _snapshot_timestamp(snapshot)
+            if timestamp is None:
+                continue
+            entries.append((snapshot, None, timestamp, self.load_manifest(snapshot).get('stored_bytes', 0)))
+        return sorted(entries, key=lambda entry: entry[2], reverse=True)
+
+    def apply_retention(self, policy, dry_run=False):
+        """Deletes the snapshots a RetentionPolicy doesn't keep, then the chunks no kept snapshot uses."""
+        keep, delete = policy.select(self.snapshot_entries())
+        if dry_run:
+            print(f"--- Retention report for snapshots in {self.repository_directory} ---")
+            for snapshot, _, _, _ in keep:
+                print(f"keep    {snapshot}")
+            for snapshot, _, _, _ in delete:
+                print(f"delete  {snapshot}")
+            return [entry[0] for entry in delete]
+        for snapshot, _, _, _ in delete:
+            os.remove(os.path.join(self.snapshots_directory, f"{snapshot}.json"))
+            print(f"Deleting old snapshot: {snapshot}")
+        if delete:
+            self.collect_garbage()
+        return [entry[0] for entry in delete]
+
+    def _referenced_chunks(self):
+        referenced = set()
+        for snapshot in self.list_snapshots():
+            for entry in self.load_manifest(snapshot)['files'].values():
+                if 'region' in entry:
+                    referenced.add(entry['region']['header'])
+                    referenced.update(chunk[4] for chunk in entry['region']['chunks'])
+                else:
+                    referenced.update(entry['chunks'])
+        return referenced
+
+    def collect_garbage(self):
+        """Deletes stored chunks that no snapshot references and returns how many bytes that freed."""
+        referenced = self._referenced_chunks()
+        removed = freed = 0
+        for root, _, filenames in os.walk(self.chunks_directory):
+            for filename in filenames:
+                if filename in referenced:
+                    continue
+                path = os.path.join(root, filename)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        print(f"Removed {removed} unreferenced chunks ({freed} bytes) from {self.chunks_directory}")
+        return freed
+
+    def _is_full_due(self, snapshots):
+        if not snapshots:
+            return True
+        if not self.full_every:
+            return False
+        since_full = 0
+        for snapshot in reversed(snapshots):
+            if self.load_manifest(snapshot).get('full'):
+                break
+            since_full += 1
+        return since_full + 1 >= self.full_every
+
+    def create_snapshot(self, exclude_patterns=None):
+        """Stores the files that changed since the previous snapshot and returns the new snapshot's name."""
+        snapshots = self.list_snapshots()
+        previous_files = self.load_manifest(snapshots[-1])['files'] if snapshots else {}
+        full = self._is_full_due(snapshots)
+
+        files = {}
+        stats = {'files': 0, 'changed_files': 0, 'new_chunks': 0, 'new_bytes': 0,
+                 'region_chunks_read': 0, 'region_chunks_reused': 0}
+        for relative_path, path in self._walk(exclude_patterns or []):
+            stat = os.stat(path)
+            previous = previous_files.get(relative_path)
+            stats['files'] += 1
+            if (not full and previous and previous['size'] == stat.st_size
+                    and previous['mtime_ns'] == stat.st_mtime_ns):
+                files[relative_path] = previous
+                continue
+            stats['changed_files'] += 1
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'mode': stat.st_mode & 0o7777}
+            region = None
+            if self.region_aware and relative_path.endswith(REGION_EXTENSION):
+                region = self._store_region(path, stat.st_size, None if full else previous, stats)
+            if region is not None:
+                entry['region'] = region
+            else:
+                entry['chunks'] = self._store_file(path, stats)
+            files[relative_path] = entry
+
+        snapshot = datetime.now().strftime(SNAPSHOT_TIMESTAMP_FORMAT)
+        manifest = {'created': datetime.now().isoformat(), 'full': full, 'stored_bytes': stats['new_bytes'], 'files': files}
+        manifest_path = os.path.join(self.snapshots_directory, f"{snapshot}.json")
+        if os.path.exists(manifest_path):
+            raise FileExistsError(f"Snapshot {snapshot} already exists in {self.snapshots_directory}")
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, manifest_path)
+
+        kind = "full" if full else "incremental"
+        print(f"Created {kind} snapshot {snapshot}: {stats['changed_files']} of {stats['files']} files changed, "
+              f"{stats['new_chunks']} new chunks ({stats['new_bytes']} bytes)")
+        if stats['region_chunks_read'] or stats['region_chunks_reused']:
+            print(f"Region files: read {stats['region_chunks_read']} changed Minecraft chunks, "
+                  f"reused {stats['region_chunks_reused']}")
+        return snapshot
+
+    def _walk(self, exclude_patterns):
+        for relative_path, entry in walk_directory(self.server_directory, ExcludeMatcher(exclude_patterns)):
+            if entry.is_file(follow_symlinks=False):
+                yield relative_path, entry.path
+            elif entry.is_symlink():
+                target = deployed_target(self.server_directory, entry.path)
+                if target:
+                    yield relative_path, target
+
+    def _store_file(self, path, stats):
+        chunks = []
+        with open(path, 'rb') as f:
+            for data in iter(lambda: f.read(CHUNK_SIZE), b''):
+                chunks.append(self.store_chunk(data, stats))
+        return chunks
+
+    def _store_region(self, path, size, previous, stats):
+        """Stores a region file's header and changed Minecraft chunks, or returns None if it isn't a valid region file."""
+        previous_chunks = {}
+        if previous and 'region' in previous:
+            previous_chunks = {chunk[0]: chunk for chunk in previous['region']['chunks']}
+        with open(path, 'rb') as f:
+            header, region_chunks = read_region_header(f, size)
+            if region_chunks is None:
+                return None
+            chunks = []
+            for chunk in region_chunks:
+                known = previous_chunks.get(chunk.index)
+                if known and known[1:4] == chunk.location:
+                    chunks.append(known)
+                    stats['region_chunks_reused'] += 1
+                    continue
+                digest = self.store_chunk(read_chunk_record(f, chunk), stats)
+                chunks.append([chunk.index] + chunk.location + [digest])
+                stats['region_chunks_read'] += 1
+        return {'header': self.store_chunk(header, stats), 'chunks': chunks}
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunks_directory, digest[:2], digest)
+
+    def store_chunk(self, data, stats=None):
+        """Stores a chunk unless it already exists and returns its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        chunk_path = self._chunk_path(digest)
+        if not os.path.exists(chunk_path):
+            os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+            temp_path = f"{chunk_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(data, self.compression_level))
+            os.replace(temp_path, chunk_path)
+            if stats is not None:
+                stats['new_chunks'] += 1
+                stats['new_bytes'] += len(data)
+        return digest
+
+    def read_chunk(self, digest):
+        with open(self._chunk_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} is corrupt.")
+        return data
+
+    def restore(self, snapshot, target_directory, paths=None):
+        """Rebuilds the server directory as it was at a snapshot, optionally limited to some paths."""
+        files = self.load_manifest(snapshot)['files']
+        restored = 0
+        for relative_path, entry in files.items():
+            if paths and not any(relative_path == path or relative_path.startswith(path.rstrip('/') + '/')
+                                 for path in paths):
+                continue
+            target_path = restore_path(target_directory, relative_path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            if os.path.islink(target_path):
+                os.remove(target_path)
+            with open(target_path, 'wb') as f:
+                if 'region' in entry:
+                    self._restore_region(f, entry)
+                else:
+                    for digest in entry['chunks']:
+                        f.write(self.read_chunk(digest))
+            os.chmod(target_path, entry['mode'])
+            os.utime(target_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            restored += 1
+        print(f"Restored {restored} files from snapshot {snapshot} to {target_directory}")
+        return restored
+
+    def _restore_region(self, f, entry):
+        """Writes a region file back from its header and chunks; unused sectors come back zeroed."""
+        f.write(self.read_chunk(entry['region']['header']))
+        for _, offset, _, _, digest in entry['region']['chunks']:
+            f.seek(offset * SECTOR_SIZE)
+            f.write(self.read_chunk(digest))
+        f.truncate(entry['size'])
+
+def _snapshot_timestamp(snapshot):
+    """Parses a snapshot name, including the second-resolution names of older snapshots, or returns None."""
+    for timestamp_format in (SNAPSHOT_TIMESTAMP_FORMAT, LEGACY_SNAPSHOT_TIMESTAMP_FORMAT):
+        try:
+            return datetime.strptime(snapshot, timestamp_format)
+        except ValueError:
+            pass
+    return None
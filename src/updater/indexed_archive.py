@@ -0,0 +1,229 @@
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_FRAME_SIZE = 4 * 1024 * 1024
+INDEX_SUFFIX = ".index.json"
+INDEX_FORMAT = 1
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+def index_path(archive_path):
+    return f"{archive_path}{INDEX_SUFFIX}"
+
+def restore_path(target_directory, name):
+    """Returns where a backed-up path goes, raising ValueError if it would land outside target_directory or behind a symlink."""
+    root = os.path.realpath(target_directory)
+    target_path = os.path.normpath(os.path.join(root, name))
+    parent = os.path.realpath(os.path.dirname(target_path))
+    if os.path.isabs(name) or os.path.commonpath([root, target_path]) != root \
+            or os.path.commonpath([root, parent]) != root or target_path == root:
+        raise ValueError(f"Refusing to extract {name!r} outside {target_directory}")
+    return target_path
+
+class IndexedGzipWriter:
+    def __init__(self, path, level=6, threads=1, frame_size=DEFAULT_FRAME_SIZE):
+        """
+        Writes a gzip file as a series of independent gzip members ("frames") of frame_size bytes each.
+
+        The result is an ordinary .gz file that gzip and tar read as one stream, but any frame can
+        be decompressed on its own starting from its offset. Frames are compressed on threads.
+
+        Args:
+            path (str): The file to write.
+            level (int): The gzip compression level.
+            threads (int): The number of frames compressed at the same time.
+            frame_size (int): The number of uncompressed bytes per frame.
+        """
+        self.path = path
+        self.level = level
+        self.frame_size = frame_size
+        self.frames = []
+        self.position = 0
+        self._output = open(path, 'wb')
+        self._buffer = bytearray()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads))
+        self._pending = []
+        self._threads = max(1, threads)
+        self._frame_offset = 0
+        self._compressed_offset = 0
+
+    def write(self, data):
+        self._buffer += data
+        self.position += len(data)
+        while len(self._buffer) >= self.frame_size:
+            self._submit(bytes(self._buffer[:self.frame_size]))
+            del self._buffer[:self.frame_size]
+        return len(data)
+
+    def _submit(self, data):
+        self._pending.append((self._frame_offset, len(data), self._executor.submit(gzip.compress, data, self.level)))
+        self._frame_offset += len(data)
+        while len(self._pending) > self._threads * 2:
+            self._write_frame()
+
+    def _write_frame(self):
+        offset, size, future = self._pending.pop(0)
+        compressed = future.result()
+        self._output.write(compressed)
+        self.frames.append([offset, size, self._compressed_offset, len(compressed)])
+        self._compressed_offset += len(compressed)
+
+    def close(self):
+        if self._output.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            while self._pending:
+                self._write_frame()
+        finally:
+            self._executor.shutdown()
+            self._output.close()
+
+    def write_index(self, members):
+        """Writes the sidecar index of frames and tar members (as collected by Archiver.write) next to the archive."""
+        index = {'format': INDEX_FORMAT, 'frames': self.frames, 'members': members}
+        temp_path = f"{index_path(self.path)}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, index_path(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class _FrameReader:
+    def __init__(self, archive):
+        self.archive = archive
+        self.file = open(archive.path, 'rb')
+        self.frame = None
+        self.data = b''
+
+    def read(self, offset, length):
+        """Yields the uncompressed bytes [offset, offset + length) one frame at a time."""
+        while length > 0:
+            frame = self.archive.frame_at(offset)
+            if frame is not self.frame:
+                self.file.seek(frame[2])
+                self.data = zlib.decompress(self.file.read(frame[3]), GZIP_WBITS)
+                if len(self.data) != frame[1]:
+                    raise ValueError(f"Frame at {frame[2]} has {len(self.data)} bytes, expected {frame[1]}")
+                self.frame = frame
+            start = offset - frame[0]
+            data = self.data[start:start + length]
+            yield data
+            offset += len(data)
+            length -= len(data)
+
+    def close(self):
+        self.file.close()
+
+class IndexedArchive:
+    def __init__(self, path):
+        """
+        Opens a backup archive written with an IndexedGzipWriter through its sidecar index.
+
+        Args:
+            path (str): The archive; its index is expected at path + ".index.json".
+        """
+        self.path = path
+        with open(index_path(path), 'r') as f:
+            index = json.load(f)
+        if index.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format {index.get('format')} for {path}")
+        self.frames = index['frames']
+        self.members = index['members']
+        self._frame_starts = [frame[0] for frame in self.frames]
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(index_path(path))
+
+    def frame_at(self, offset):
+        position = bisect.bisect_right(self._frame_starts, offset) - 1
+        if position < 0 or offset >= self.frames[position][0] + self.frames[position][1]:
+            raise ValueError(f"Offset {offset} is outside {self.path}")
+        return self.frames[position]
+
+    def _verify_members(self, members):
+        failures = []
+        reader = _FrameReader(self)
+        try:
+            for member in members:
+                sha256 = hashlib.sha256()
+                try:
+                    for data in reader.read(member['data_offset'], member['size']):
+                        sha256.update(data)
+                except (ValueError, zlib.error, OSError) as e:
+                    failures.append((member['name'], str(e)))
+                    continue
+                if sha256.hexdigest() != member['sha256']:
+                    failures.append((member['name'], "checksum mismatch"))
+        finally:
+            reader.close()
+        return failures
+
+    def verify(self, workers=None):
+        """Checks every file's SHA-256 against the index, reading the archive in parallel, and returns the failures."""
+        files = [member for member in self.members if member['type'] == 'file']
+        workers = max(1, workers or os.cpu_count() or 1)
+        total = sum(member['size'] for member in files) or 1
+        batches = [[]]
+        batch_bytes = 0
+        for member in files:
+            if batch_bytes >= total / workers and len(batches) < workers:
+                batches.append([])
+                batch_bytes = 0
+            batches[-1].append(member)
+            batch_bytes += member['size']
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [failure for failures in executor.map(self._verify_members, batches) for failure in failures]
+
+    def select(self, paths=None):
+        """Returns the members at or under any of paths, or every member."""
+        if not paths:
+            return list(self.members)
+        prefixes = [path.strip('/') for path in paths]
+        return [member for member in self.members
+                if any(member['name'] == prefix or member['name'].startswith(prefix + '/') for prefix in prefixes)]
+
+    def extract(self, target_directory, paths=None):
+        """Restores the selected members into target_directory, reading only the frames that hold them."""
+        members = self.select(paths)
+        reader = _FrameReader(self)
+        try:
+            for member in members:
+                target_path = restore_path(target_directory, member['name'])
+                if member['type'] == 'directory':
+                    os.makedirs(target_path, exist_ok=True)
+                    continue
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                if member['type'] == 'symlink':
+                    if os.path.lexists(target_path):
+                        os.remove(target_path)
+                    os.symlink(member['linkname'], target_path)
+                    continue
+                if member['type'] != 'file':
+                    continue
+                if os.path.islink(target_path):
+                    os.remove(target_path)
+                sha256 = hashlib.sha256()
+                with open(target_path, 'wb') as f:
+                    for data in reader.read(member['data_offset'], member['size']):
+                        sha256.update(data)
+                        f.write(data)
+                if sha256.hexdigest() != member['sha256']:
+                    raise ValueError(f"{member['name']} does not match its checksum in {self.path}")
+                os.chmod(target_path, member['mode'])
+                os.utime(target_path, (member['mtime'], member['mtime']))
+        finally:
+            reader.close()
+        print(f"Restored {len(members)} entries from {self.path} to {target_directory}")
+        return len(members)
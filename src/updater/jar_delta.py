@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import struct
+import zipfile
+import zlib
+
+from updater.fingerprints import hash_file
+
+MAGIC = b"MCJDELTA1\n"
+COPY = 0
+LITERAL = 1
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+DATA_DESCRIPTOR_FLAG = 0x08
+COPY_BUFFER_SIZE = 1024 * 1024
+DELTA_QUERY = "delta_from"
+
+def delta_url(download_url, base_sha256):
+    """Returns the URL a mirror serves the delta from the jar with base_sha256 to download_url under."""
+    separator = '&' if '?' in download_url else '?'
+    return f"{download_url}{separator}{DELTA_QUERY}={base_sha256}"
+
+def _zip_records(path):
+    """Returns (offset, length) of every local file record (header, data and data descriptor) in a zip."""
+    records = []
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{path} is not a jar: {e}")
+    with archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            f.seek(info.header_offset)
+            header = f.read(LOCAL_HEADER.size)
+            fields = LOCAL_HEADER.unpack(header)
+            if fields[0] != LOCAL_HEADER_SIGNATURE:
+                raise ValueError(f"Bad local header for {info.filename} in {path}")
+            length = LOCAL_HEADER.size + fields[9] + fields[10] + info.compress_size
+            if fields[2] & DATA_DESCRIPTOR_FLAG:
+                f.seek(info.header_offset + length)
+                signature = f.read(4)
+                signed = len(signature) == 4 and struct.unpack('<I', signature)[0] == DATA_DESCRIPTOR_SIGNATURE
+                length += 16 if signed else 12
+            records.append((info.header_offset, length))
+    return sorted(records)
+
+def _read(f, offset, length):
+    f.seek(offset)
+    return f.read(length)
+
+def create_delta(base_path, target_path, delta_path):
+    """
+    Writes a delta that rebuilds target_path byte for byte from base_path and returns its size.
+
+    Zip records (local header plus compressed data) that are identical in both jars are copied
+    from the base; everything else, including the central directory, is stored zlib-compressed.
+    """
+    base_records = {}
+    with open(base_path, 'rb') as base:
+        for offset, length in _zip_records(base_path):
+            base_records.setdefault(hashlib.sha1(_read(base, offset, length)).digest(), (offset, length))
+
+    operations = []
+    literals = zlib.compressobj(6)
+    compressed = []
+    target_sha256 = hashlib.sha256()
+    target_size = os.path.getsize(target_path)
+
+    def add(operation):
+        previous = operations[-1] if operations else None
+        if previous and previous[0] == operation[0] == LITERAL:
+            previous[1] += operation[1]
+        elif previous and previous[0] == operation[0] == COPY and previous[1] + previous[2] == operation[1]:
+            previous[2] += operation[2]
+        else:
+            operations.append(list(operation))
+
+    def add_literal(data):
+        if data:
+            compressed.append(literals.compress(data))
+            add((LITERAL, len(data)))
+
+    position = 0
+    with open(target_path, 'rb') as target:
+        for offset, length in _zip_records(target_path):
+            add_literal(_read(target, position, offset - position))
+            record = _read(target, offset, length)
+            match = base_records.get(hashlib.sha1(record).digest())
+            if match and match[1] == length:
+                add((COPY, match[0], length))
+            else:
+                add_literal(record)
+            position = offset + length
+        add_literal(_read(target, position, target_size - position))
+        target.seek(0)
+        for chunk in iter(lambda: target.read(COPY_BUFFER_SIZE), b''):
+            target_sha256.update(chunk)
+    compressed.append(literals.flush())
+
+    header = json.dumps({
+        'base_sha256': hash_file(base_path),
+        'target_sha256': target_sha256.hexdigest(),
+        'target_size': target_size,
+        'operations': operations,
+    }).encode()
+    temp_path = f"{delta_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('>I', len(header)))
+        f.write(header)
+        for data in compressed:
+            f.write(data)
+    os.replace(temp_path, delta_path)
+    return os.path.getsize(delta_path)
+
+class _LiteralReader:
+    def __init__(self, f):
+        self.f = f
+        self.decompressor = zlib.decompressobj()
+        self.buffer = b''
+        self.position = 0
+
+    def read(self, length):
+        if len(self.buffer) - self.position < length:
+            pending = [self.buffer[self.position:]]
+            available = len(pending[0])
+            while available < length:
+                data = self.f.read(COPY_BUFFER_SIZE)
+                data = self.decompressor.decompress(data) if data else self.decompressor.flush()
+                if not data:
+                    raise ValueError("Delta ends before all literal data was read")
+                pending.append(data)
+                available += len(data)
+            self.buffer = b''.join(pending)
+            self.position = 0
+        data = self.buffer[self.position:self.position + length]
+        self.position += length
+        return data
+
+def apply_delta(base_path, delta_path, target_path, base_sha256=None):
+    """Rebuilds a jar from base_path and a delta into target_path and returns the rebuilt jar's SHA-256."""
+    with open(delta_path, 'rb') as delta:
+        if delta.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{delta_path} is not a jar delta")
+        header_size = delta.read(4)
+        if len(header_size) != 4:
+            raise ValueError(f"{delta_path} is truncated")
+        header = json.loads(delta.read(struct.unpack('>I', header_size)[0]))
+        if base_sha256 and header['base_sha256'] != base_sha256:
+            raise ValueError("The delta was made from a different base jar")
+        literals = _LiteralReader(delta)
+        sha256 = hashlib.sha256()
+        with open(base_path, 'rb') as base, open(target_path, 'wb') as target:
+            for operation in header['operations']:
+                if operation[0] == COPY:
+                    base.seek(operation[1])
+                    remaining = operation[2]
+                    while remaining > 0:
+                        data = base.read(min(COPY_BUFFER_SIZE, remaining))
+                        if not data:
+                            raise ValueError("The delta copies past the end of the base jar")
+                        sha256.update(data)
+                        target.write(data)
+                        remaining -= len(data)
+                else:
+                    data = literals.read(operation[1])
+                    sha256.update(data)
+                    target.write(data)
+    file_hash = sha256.hexdigest()
+    if file_hash != header['target_sha256']:
+        raise ValueError("The rebuilt jar does not match the delta's target hash")
+    return file_hash
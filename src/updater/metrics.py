@@ -0,0 +1,173 @@
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+
+METRIC_PREFIX = "updater_"
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+def _prometheus_labels(key):
+    if not key:
+        return ""
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+class Metrics:
+    def __init__(self, jsonl_file=None, prometheus_file=None, summary=False):
+        """
+        Collects spans, counters and gauges labelled per phase, server and artifact.
+
+        Nothing is printed or written unless asked for: spans are appended to jsonl_file and the
+        counters and gauges are written to prometheus_file (for node_exporter's textfile collector)
+        on flush(). Labels set with labels() apply to everything recorded in the same thread.
+
+        Args:
+            jsonl_file (str): Append one JSON object per finished span and per flush here, or None.
+            prometheus_file (str): Write counters and gauges here in the Prometheus text format, or None.
+            summary (bool): Print the time spent per phase when the process exits.
+        """
+        self.jsonl_file = jsonl_file
+        self.prometheus_file = prometheus_file
+        self.summary = summary
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {}
+        self._gauges = {}
+        self._events = []
+
+    def current_labels(self):
+        return dict(getattr(self._local, 'labels', {}))
+
+    @contextlib.contextmanager
+    def labels(self, **labels):
+        """Adds labels, e.g. server or artifact, to everything recorded in this thread inside the block."""
+        previous = getattr(self._local, 'labels', {})
+        self._local.labels = dict(previous, **labels)
+        try:
+            yield
+        finally:
+            self._local.labels = previous
+
+    def _labels(self, labels):
+        return dict(self.current_labels(), **labels)
+
+    def count(self, name, value=1, **labels):
+        key = (name, _label_key(self._labels(labels)))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        key = (name, _label_key(self._labels(labels)))
+        with self._lock:
+            self._gauges[key] = value
+
+    def total(self, name, **labels):
+        """Returns the sum of a counter over every label set that includes the given labels."""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(value for (counter, key), value in self._counters.items()
+                       if counter == name and wanted.issubset(key))
+
+    @contextlib.contextmanager
+    def span(self, phase, **labels):
+        """Times the block as one run of phase; failed runs are counted with error="true"."""
+        span_labels = self._labels(labels)
+        started = time.monotonic()
+        error = None
+        try:
+            with self.labels(**labels):
+                yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.monotonic() - started
+            self.count("phase_seconds_total", seconds, phase=phase, **span_labels)
+            self.count("phase_runs_total", phase=phase, error="true" if error else None, **span_labels)
+            if self.jsonl_file:
+                event = {'time': time.time(), 'type': 'span', 'phase': phase, 'seconds': round(seconds, 6),
+                         'labels': span_labels}
+                if error:
+                    event['error'] = error
+                with self._lock:
+                    self._events.append(event)
+
+    def flush(self):
+        """Appends pending spans to the JSON-lines file and rewrites the Prometheus textfile."""
+        with self._lock:
+            events, self._events = self._events, []
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        if self.jsonl_file:
+            events.append({'time': time.time(), 'type': 'totals',
+                           'counters': [{'name': name, 'labels': dict(key), 'value': value}
+                                        for (name, key), value in sorted(counters.items())],
+                           'gauges': [{'name': name, 'labels': dict(key), 'value': value}
+                                      for (name, key), value in sorted(gauges.items())]})
+            with open(self.jsonl_file, 'a') as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+        if self.prometheus_file:
+            self._write_prometheus(counters, gauges)
+
+    def _write_prometheus(self, counters, gauges):
+        lines = []
+        for metric_type, values in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+                for (metric, key), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{METRIC_PREFIX}{name}{_prometheus_labels(key)} {value!r}")
+        directory = os.path.dirname(self.prometheus_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = f"{self.prometheus_file}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_file, self.prometheus_file)
+
+    def print_summary(self):
+        with self._lock:
+            phases = {}
+            for (name, key), value in self._counters.items():
+                if name == "phase_seconds_total":
+                    phase = dict(key)['phase']
+                    phases[phase] = phases.get(phase, 0.0) + value
+        if not phases:
+            return
+        print("\n--- Time per phase ---")
+        for phase, seconds in sorted(phases.items(), key=lambda item: -item[1]):
+            print(f"{phase:<16} {seconds:8.2f}s")
+
+    def close(self):
+        self.flush()
+        if self.summary:
+            self.print_summary()
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def configure_metrics(**settings):
+    """Replaces the shared metrics collector, e.g. with settings from config.yaml."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is not None:
+            _metrics.flush()
+        _metrics = Metrics(**settings)
+        return _metrics
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+@atexit.register
+def _close_metrics():
+    if _metrics is not None:
+        _metrics.close()
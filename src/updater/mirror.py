@@ -0,0 +1,154 @@
+import email.utils
+import hashlib
+import json
+import os
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlsplit
+
+DEFAULT_MIRROR_PORT = 8765
+RESOURCE_FILENAME = "__resource__"
+HEADERS_SUFFIX = ".headers.json"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def rewrite_url(mirror_url, url):
+    """Maps https://host/path?query to <mirror_url>/host/path?query."""
+    parts = urlsplit(url)
+    rewritten = f"{mirror_url.rstrip('/')}/{parts.netloc}{parts.path}"
+    return f"{rewritten}?{parts.query}" if parts.query else rewritten
+
+def mirror_path(root, url):
+    """Returns where a mirrored URL is stored under root, raising ValueError if it would lie outside root."""
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split('/') if segment not in ('', '.', '..')]
+    filename = RESOURCE_FILENAME
+    if parts.query:
+        filename = f"{filename}_{quote(parts.query, safe='')}"
+    path = os.path.join(root, parts.netloc, *segments, filename)
+    real_root = os.path.realpath(root)
+    if not parts.netloc or parts.netloc in ('.', '..') or \
+            os.path.commonpath([real_root, os.path.realpath(path)]) != real_root:
+        raise ValueError(f"{url} does not map to a path inside {root}")
+    return path
+
+class MirrorRecorder:
+    def __init__(self, root):
+        """
+        Stores upstream responses under root so a MirrorServer can replay them.
+
+        Args:
+            root (str): The mirror directory.
+        """
+        self.root = root
+
+    def _target(self, url, content_type):
+        path = mirror_path(self.root, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}{HEADERS_SUFFIX}", 'w') as f:
+            json.dump({'content_type': content_type}, f)
+        return path
+
+    def record_bytes(self, url, body, content_type="application/octet-stream"):
+        path = self._target(url, content_type)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(body)
+        os.replace(temp_path, path)
+
+    def record_file(self, url, filepath, content_type="application/java-archive"):
+        path = self._target(url, content_type)
+        temp_path = f"{path}.tmp"
+        try:
+            os.link(filepath, temp_path)
+        except OSError:
+            shutil.copyfile(filepath, temp_path)
+        os.replace(temp_path, path)
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    server_version = "MinecraftUpdaterMirror"
+    mirror_root = "."
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        request = urlsplit(self.path)
+        host, _, upstream_path = request.path.lstrip('/').partition('/')
+        upstream_url = f"https://{host}/{upstream_path}" + (f"?{request.query}" if request.query else "")
+        try:
+            path = mirror_path(self.mirror_root, upstream_url)
+        except ValueError:
+            self.send_error(404)
+            return
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        stat = os.stat(path)
+        etag = '"%s"' % hashlib.sha1(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        try:
+            with open(f"{path}{HEADERS_SUFFIX}", 'r') as f:
+                content_type = json.load(f).get('content_type', 'application/octet-stream')
+        except (FileNotFoundError, json.JSONDecodeError):
+            content_type = 'application/octet-stream'
+
+        start, end = 0, stat.st_size - 1
+        range_header = self.headers.get('Range', '')
+        if range_header.startswith('bytes=') and ',' not in range_header and stat.st_size:
+            first, _, last = range_header[len('bytes='):].partition('-')
+            try:
+                start = int(first) if first else max(0, stat.st_size - int(last))
+                end = min(int(last), stat.st_size - 1) if first and last else stat.st_size - 1
+            except ValueError:
+                start, end = 0, stat.st_size - 1
+            if start >= stat.st_size or end < start:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{stat.st_size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{stat.st_size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(max(0, end - start + 1)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True))
+        self.end_headers()
+        if not send_body:
+            return
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(COPY_BUFFER_SIZE, remaining))
+                if not data:
+                    break
+                self.wfile.write(data)
+                remaining -= len(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def create_mirror_server(root, host="127.0.0.1", port=DEFAULT_MIRROR_PORT, handler_class=MirrorRequestHandler):
+    """Returns a threaded HTTP server replaying everything recorded under root."""
+    handler = type('BoundMirrorRequestHandler', (handler_class,), {'mirror_root': os.path.abspath(root)})
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve_mirror(root, host="127.0.0.1", port=DEFAULT_MIRROR_PORT):
+    server = create_mirror_server(root, host, port)
+    print(f"--- Serving mirror of {root} on http://{host}:{server.server_address[1]} ---")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("--- Mirror stopped ---")
+    finally:
+        server.server_close()
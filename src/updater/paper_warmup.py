@@ -0,0 +1,150 @@
+import os
+import shutil
+import subprocess
+import threading
+
+from updater.metrics import get_metrics
+
+DEFAULT_WARMUP_DIRECTORY = "paper_warmup"
+DEFAULT_JAVA = "java"
+DEFAULT_WARMUP_TIMEOUT = 600
+DEFAULT_KEEP_BUILDS = 3
+COMPLETE_MARKER = ".complete"
+SEEDED_DIRECTORIES = ("cache", "libraries")
+
+class PaperWarmup:
+    def __init__(self, cache_directory=DEFAULT_WARMUP_DIRECTORY, java=DEFAULT_JAVA, timeout=DEFAULT_WARMUP_TIMEOUT,
+                 keep=DEFAULT_KEEP_BUILDS, enabled=True):
+        """
+        Runs Paper's paperclip patch step ahead of a restart and caches its output per build.
+
+        A new Paper jar patches the Mojang server and unpacks its libraries into cache/, versions/
+        and libraries/ on first start. Running "java -Dpaperclip.patchonly=true -jar" in a staging
+        directory does that work while the old build is still running; apply() then hard-links the
+        result into the server directory, where paperclip finds the files with matching hashes.
+
+        Args:
+            cache_directory (str): The directory holding one prepared directory per build SHA-256.
+            java (str): The java executable to run paperclip with.
+            timeout (float): The number of seconds the patch step may take.
+            keep (int): The number of prepared builds kept.
+            enabled (bool): Whether new Paper builds are warmed up at all.
+        """
+        self.cache_directory = cache_directory
+        self.java = java
+        self.timeout = timeout
+        self.keep = keep
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def build_directory(self, build_sha256):
+        return os.path.join(self.cache_directory, build_sha256)
+
+    def is_warm(self, build_sha256):
+        return os.path.exists(os.path.join(self.build_directory(build_sha256), COMPLETE_MARKER))
+
+    def _completed_builds(self):
+        if not os.path.isdir(self.cache_directory):
+            return []
+        builds = [entry for entry in os.scandir(self.cache_directory)
+                  if os.path.exists(os.path.join(entry.path, COMPLETE_MARKER))]
+        return sorted(builds, key=lambda entry: os.stat(os.path.join(entry.path, COMPLETE_MARKER)).st_mtime_ns)
+
+    def warm(self, jar_path, build_sha256):
+        """Prepares a Paper build unless it already is, returning its directory or None if paperclip failed."""
+        metrics = get_metrics()
+        build_directory = self.build_directory(build_sha256)
+        with self._lock:
+            if self.is_warm(build_sha256):
+                metrics.count("paper_warmup_hits_total")
+                return build_directory
+            metrics.count("paper_warmup_misses_total")
+            staging_directory = f"{build_directory}.tmp"
+            shutil.rmtree(staging_directory, ignore_errors=True)
+            os.makedirs(staging_directory)
+            self._seed(staging_directory)
+            print(f"Warming up {os.path.basename(jar_path)} in {staging_directory}...")
+            try:
+                with metrics.span("warmup"):
+                    subprocess.run(
+                        [self.java, "-Dpaperclip.patchonly=true", "-jar", os.path.abspath(jar_path)],
+                        cwd=staging_directory, check=True, capture_output=True, text=True, timeout=self.timeout,
+                    )
+            except FileNotFoundError:
+                print(f"Warning: '{self.java}' not found. Skipping the Paper warm-up.")
+                shutil.rmtree(staging_directory, ignore_errors=True)
+                return None
+            except subprocess.CalledProcessError as e:
+                print(f"Warning: The Paper warm-up failed with exit code {e.returncode}: {e.stderr.strip()[-500:]}")
+                shutil.rmtree(staging_directory, ignore_errors=True)
+                return None
+            except subprocess.TimeoutExpired:
+                print(f"Warning: The Paper warm-up took longer than {self.timeout}s and was stopped.")
+                shutil.rmtree(staging_directory, ignore_errors=True)
+                return None
+            open(os.path.join(staging_directory, COMPLETE_MARKER), 'w').close()
+            shutil.rmtree(build_directory, ignore_errors=True)
+            os.rename(staging_directory, build_directory)
+            self._prune()
+        print(f"Paper build {build_sha256[:12]} is patched and cached in {build_directory}")
+        return build_directory
+
+    def _seed(self, staging_directory):
+        """Links the Mojang jar and libraries of the newest prepared build in, so paperclip only fetches what changed."""
+        builds = self._completed_builds()
+        if builds:
+            _link_tree(builds[-1].path, staging_directory, SEEDED_DIRECTORIES)
+
+    def _prune(self):
+        builds = self._completed_builds()
+        for entry in builds[:max(0, len(builds) - self.keep)]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def apply(self, build_sha256, server_directory):
+        """Hard-links a prepared build's patched jar and libraries into a server directory, returning the files added."""
+        if not self.is_warm(build_sha256):
+            return 0
+        added = _link_tree(self.build_directory(build_sha256), server_directory)
+        print(f"Placed {added} prepared Paper files in {server_directory}")
+        return added
+
+def _link_tree(source_directory, target_directory, directories=None):
+    """Hard-links every file under source_directory (or only under the given subdirectories) that isn't already linked."""
+    added = 0
+    for root, _, filenames in os.walk(source_directory):
+        relative_root = os.path.relpath(root, source_directory)
+        if directories and relative_root.split(os.sep)[0] not in directories:
+            continue
+        for filename in filenames:
+            if filename == COMPLETE_MARKER:
+                continue
+            source = os.path.join(root, filename)
+            target = os.path.join(target_directory, relative_root, filename)
+            if os.path.exists(target) and os.path.samefile(source, target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp_target = f"{target}.tmp"
+            if os.path.exists(temp_target):
+                os.remove(temp_target)
+            try:
+                os.link(source, temp_target)
+            except OSError:
+                shutil.copy2(source, temp_target)
+            os.replace(temp_target, target)
+            added += 1
+    return added
+
+_paper_warmup = None
+_paper_warmup_lock = threading.Lock()
+
+def configure_paper_warmup(**settings):
+    """Replaces the shared warm-up step, e.g. with settings from config.yaml."""
+    global _paper_warmup
+    with _paper_warmup_lock:
+        _paper_warmup = PaperWarmup(**settings)
+        return _paper_warmup
+
+def get_paper_warmup():
+    """Returns the shared warm-up step, or None unless it was configured and enabled."""
+    with _paper_warmup_lock:
+        return _paper_warmup if _paper_warmup is not None and _paper_warmup.enabled else None
@@ -0,0 +1,58 @@
+import struct
+
+SECTOR_SIZE = 4096
+CHUNKS_PER_REGION = 32 * 32
+REGION_HEADER_SIZE = 2 * SECTOR_SIZE
+REGION_EXTENSION = ".mca"
+
+class RegionChunk:
+    def __init__(self, index, offset, sectors, timestamp):
+        """
+        One entry of a region file's location and timestamp tables.
+
+        Args:
+            index (int): The chunk's position in the 32x32 region, x + z * 32.
+            offset (int): The first sector of the chunk's record.
+            sectors (int): The number of sectors the record occupies.
+            timestamp (int): When the server last saved the chunk, in seconds since the epoch.
+        """
+        self.index = index
+        self.offset = offset
+        self.sectors = sectors
+        self.timestamp = timestamp
+
+    @property
+    def location(self):
+        return [self.offset, self.sectors, self.timestamp]
+
+def read_region_header(f, file_size):
+    """
+    Returns (header, chunks) for an Anvil region file open at f.
+
+    chunks lists the populated chunks, or is None when the header is not valid: too short, or a
+    populated chunk lies inside the header or past the end of the file.
+    """
+    f.seek(0)
+    header = f.read(REGION_HEADER_SIZE)
+    if len(header) < REGION_HEADER_SIZE:
+        return header, None
+    chunks = []
+    for index in range(CHUNKS_PER_REGION):
+        location = struct.unpack_from('>I', header, index * 4)[0]
+        if not location:
+            continue
+        offset, sectors = location >> 8, location & 0xFF
+        if offset * SECTOR_SIZE < REGION_HEADER_SIZE or (offset + sectors) * SECTOR_SIZE > file_size:
+            return header, None
+        timestamp = struct.unpack_from('>I', header, SECTOR_SIZE + index * 4)[0]
+        chunks.append(RegionChunk(index, offset, sectors, timestamp))
+    return header, chunks
+
+def read_chunk_record(f, chunk):
+    """Returns a chunk's record (length, compression type and data) without the sector padding."""
+    f.seek(chunk.offset * SECTOR_SIZE)
+    data = f.read(chunk.sectors * SECTOR_SIZE)
+    if len(data) < 4:
+        return data
+    length = struct.unpack_from('>I', data)[0]
+    return data[:4 + length] if 4 + length <= len(data) else data
@@ -0,0 +1,219 @@
+import atexit
+import itertools
+import select
+import socket
+import struct
+import subprocess
+import threading
+
+DEFAULT_RCON_PORT = 25575
+DEFAULT_RCON_TIMEOUT = 60
+RCON_LOGIN = 3
+RCON_COMMAND = 2
+RCON_RESPONSE = 0
+RCON_AUTH_FAILED = -1
+SAVE_COMPLETE_MESSAGE = "Saved the game"
+
+class RconError(Exception):
+    pass
+
+class RconConnectionLost(RconError):
+    """The connection dropped after a command was sent, so the server may have run it."""
+
+class RconClient:
+    def __init__(self, host="127.0.0.1", port=DEFAULT_RCON_PORT, password="", timeout=DEFAULT_RCON_TIMEOUT):
+        """
+        Initializes a Minecraft RCON client that keeps one authenticated connection open.
+
+        Commands run synchronously on the server's main thread, so a command's response arrives
+        once it has finished; "save-all flush" answers after the world is written to disk.
+
+        Args:
+            host (str): The server's address.
+            port (int): The server's rcon.port.
+            password (str): The server's rcon.password.
+            timeout (float): The number of seconds to wait for a response.
+        """
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._socket = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _send_packet(self, request_id, packet_type, payload):
+        body = struct.pack('<ii', request_id, packet_type) + payload.encode('utf-8') + b'\0\0'
+        self._socket.sendall(struct.pack('<i', len(body)) + body)
+
+    def _receive_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise RconError("The server closed the RCON connection")
+            data += chunk
+        return data
+
+    def _receive_packet(self):
+        length = struct.unpack('<i', self._receive_exactly(4))[0]
+        body = self._receive_exactly(length)
+        request_id, packet_type = struct.unpack_from('<ii', body)
+        return request_id, packet_type, body[8:-2]
+
+    def connect(self):
+        with self._lock:
+            self._connect()
+
+    def _connect(self):
+        if self._socket is not None:
+            return
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            request_id = next(self._ids)
+            self._send_packet(request_id, RCON_LOGIN, self.password)
+            while True:
+                response_id, packet_type, _ = self._receive_packet()
+                if packet_type == RCON_COMMAND:
+                    break
+            if response_id == RCON_AUTH_FAILED or response_id != request_id:
+                raise RconError(f"RCON login to {self.host}:{self.port} was refused")
+        except (OSError, RconError):
+            self._close()
+            raise
+
+    def _is_stale(self):
+        """Returns True if the server closed the idle connection, e.g. because it restarted."""
+        readable, _, _ = select.select([self._socket], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return not self._socket.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def command(self, command):
+        """
+        Runs a command and returns the server's response.
+
+        A connection that dropped while idle is reopened, and a command that could not be sent is
+        sent again once. Once a command was sent it is never repeated: if the connection drops
+        before the response, e.g. because the command was "stop", RconConnectionLost is raised.
+
+        The server splits long responses into several packets without marking the last one, so an
+        empty RCON_RESPONSE packet follows the command; the server answers it only after the whole
+        response was sent, which ends the response.
+        """
+        with self._lock:
+            if self._socket is not None and self._is_stale():
+                self._close()
+            for attempt in range(2):
+                sent = False
+                try:
+                    self._connect()
+                    request_id = next(self._ids)
+                    end_id = next(self._ids)
+                    self._send_packet(request_id, RCON_COMMAND, command)
+                    sent = True
+                    self._send_packet(end_id, RCON_RESPONSE, "")
+                    payloads = []
+                    while True:
+                        response_id, packet_type, payload = self._receive_packet()
+                        if response_id == end_id:
+                            return b''.join(payloads).decode('utf-8', errors='replace')
+                        if response_id == request_id and packet_type == RCON_RESPONSE:
+                            payloads.append(payload)
+                except (OSError, RconError) as e:
+                    self._close()
+                    if sent:
+                        raise RconConnectionLost(f"The RCON connection dropped after '{command}' was sent: {e}")
+                    if attempt:
+                        raise
+
+    def _close(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            finally:
+                self._socket = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+class RconControl:
+    def __init__(self, client):
+        """Controls a server through an RconClient."""
+        self.client = client
+        self.name = f"RCON {client.host}:{client.port}"
+
+    def is_running(self):
+        try:
+            self.client.connect()
+            return True
+        except (OSError, RconError):
+            return False
+
+    def send(self, command):
+        response = self.client.command(command)
+        print(f"Sent command over {self.name}: {command}")
+        return response
+
+    def save_all(self):
+        """Flushes the world to disk and returns True once the server confirmed it."""
+        response = self.send("save-all flush")
+        return SAVE_COMPLETE_MESSAGE in (response or "")
+
+class ScreenControl:
+    def __init__(self, screen_name):
+        """Controls a server by typing commands into its screen session."""
+        self.screen_name = screen_name
+        self.name = f"screen '{screen_name}'"
+
+    def is_running(self):
+        try:
+            subprocess.run(['screen', '-list'], check=True, capture_output=True, text=True)
+            return True
+        except (FileNotFoundError, subprocess.CalledProcessError):
+            return False
+
+    def send(self, command):
+        """Sends a command to a running screen session; screen gives no response."""
+        try:
+            subprocess.run(['screen', '-r', self.screen_name, '-X', 'stuff', f"{command}\n"], check=True)
+            print(f"Sent command to screen '{self.screen_name}': {command}")
+        except FileNotFoundError:
+            print("Error: 'screen' command not found. Ensure it's installed.")
+        except subprocess.CalledProcessError:
+            print(f"Warning: Could not send command to screen '{self.screen_name}'. Is the session running?")
+        return None
+
+    def save_all(self):
+        """Asks the server to save; screen can't tell when it has finished, so this returns False."""
+        self.send("save-all flush")
+        return False
+
+_rcon_clients = {}
+_rcon_clients_lock = threading.Lock()
+
+def get_rcon_client(host="127.0.0.1", port=DEFAULT_RCON_PORT, password="", timeout=DEFAULT_RCON_TIMEOUT):
+    """Returns the shared client for a server, so every backup reuses the same connection."""
+    with _rcon_clients_lock:
+        client = _rcon_clients.get((host, port))
+        if client is None or client.password != password:
+            client = _rcon_clients[(host, port)] = RconClient(host, port, password, timeout)
+        return client
+
+def open_control_channel(screen_name, rcon=None):
+    """Returns an RCON control channel when rcon settings are given and the server answers, else screen."""
+    if rcon:
+        control = RconControl(get_rcon_client(**rcon))
+        if control.is_running():
+            return control
+        print(f"Warning: Could not connect over {control.name}. Falling back to screen '{screen_name}'.")
+    return ScreenControl(screen_name)
+
+@atexit.register
+def _close_rcon_clients():
+    for client in list(_rcon_clients.values()):
+        client.close()
@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from downloaders.registry import DOWNLOADERS, artifact_name, create_artifact
+from updater.metrics import get_metrics
+
+DEFAULT_MAX_WORKERS = 3
+
+class UpdatePlan:
+    def __init__(self, artifacts):
+        """
+        Builds a dependency-aware execution plan from artifact specs.
+
+        Each spec may list the names of artifacts it must run after under 'after'. Names not in
+        the plan are ignored, so a server can drop an artifact another one is ordered after.
+
+        Args:
+            artifacts (list): Artifact specs as found under 'artifacts:' in config.yaml.
+        """
+        self.artifacts = {}
+        for artifact in artifacts:
+            name = artifact_name(artifact)
+            if name in self.artifacts:
+                raise ValueError(f"Artifact '{name}' is listed more than once.")
+            if artifact.get('type') not in DOWNLOADERS:
+                raise ValueError(f"Artifact '{name}' has unknown type '{artifact.get('type')}', "
+                                 f"expected one of: {', '.join(sorted(DOWNLOADERS))}")
+            self.artifacts[name] = artifact
+        self.dependencies = {
+            name: [dependency for dependency in artifact.get('after', []) if dependency in self.artifacts]
+            for name, artifact in self.artifacts.items()
+        }
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order = []
+        remaining = dict(self.dependencies)
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if all(d in order for d in dependencies)]
+            if not ready:
+                raise ValueError(f"Artifacts have circular 'after' dependencies: {', '.join(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+        return order
+
+    def run(self, download_directory, max_workers=DEFAULT_MAX_WORKERS, names=None):
+        """Runs the plan (or only the named artifacts) concurrently, returning one result per artifact."""
+        selected = [name for name in self.order if names is None or name in names]
+        handles = {name: create_artifact(self.artifacts[name], download_directory) for name in selected}
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            running = {}
+            while len(results) < len(selected):
+                for name in selected:
+                    if name in results or name in running.values():
+                        continue
+                    dependencies = [d for d in self.dependencies[name] if d in handles]
+                    failed = [d for d in dependencies if d in results and results[d]['error']]
+                    if failed:
+                        results[name] = _result(name, None, 0.0, f"skipped, {', '.join(failed)} failed")
+                    elif all(d in results for d in dependencies):
+                        running[executor.submit(_run_download, name, handles[name].download)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return [results[name] for name in selected]
+
+    def watchers(self, download_directory):
+        """Returns the daemon watchers of the artifacts that can report their latest build."""
+        watchers = {}
+        for name in self.order:
+            handle = create_artifact(self.artifacts[name], download_directory)
+            if handle.latest_build:
+                watchers[name] = handle.latest_build
+        return watchers
+
+def _result(name, filepath, seconds, error):
+    return {'artifact': name, 'path': filepath, 'seconds': seconds, 'error': error}
+
+def _run_download(name, download):
+    start = time.monotonic()
+    metrics = get_metrics()
+    try:
+        with metrics.labels(artifact=name), metrics.span("artifact"):
+            filepath = download()
+        error = None if filepath else "no file downloaded"
+    except Exception as e:
+        filepath = None
+        error = str(e)
+    return _result(name, filepath, time.monotonic() - start, error)
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from updater.artifact_downloader import PART_SUFFIX, ArtifactDownloader
+from updater.http_client import HttpClient
+
+BODY = os.urandom(256 * 1024 + 123)
+BODY_SHA256 = hashlib.sha256(BODY).hexdigest()
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.server.requests.append(("HEAD", None))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        byte_range = self.headers.get("Range")
+        self.server.requests.append(("GET", byte_range))
+        match = re.match(r"bytes=(\d+)-(\d*)$", byte_range or "")
+        if not match or not self.server.ranges:
+            self._send(200, BODY)
+            return
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(BODY) - 1
+        if start >= len(BODY):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(BODY)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send(206, BODY[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(BODY)}"})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    server.requests = []
+    server.ranges = True
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/paper.jar"
+
+def downloader(**settings):
+    return ArtifactDownloader(HttpClient(retries=0, cache=False), chunk_size=64 * 1024, **settings)
+
+def test_downloads_and_verifies(server, tmp_path):
+    filepath = tmp_path / "paper.jar"
+    assert downloader().download(url(server), str(filepath), BODY_SHA256) == str(filepath)
+    assert filepath.read_bytes() == BODY
+    assert not os.path.exists(f"{filepath}{PART_SUFFIX}")
+
+def test_resumes_part_file_with_range_request(server, tmp_path):
+    filepath = tmp_path / "paper.jar"
+    (tmp_path / f"paper.jar{PART_SUFFIX}").write_bytes(BODY[:100000])
+    assert downloader().download(url(server), str(filepath), BODY_SHA256) == str(filepath)
+    assert filepath.read_bytes() == BODY
+    assert server.requests == [("GET", "bytes=100000-")]
+
+def test_restarts_when_server_ignores_range(server, tmp_path):
+    server.ranges = False
+    filepath = tmp_path / "paper.jar"
+    (tmp_path / f"paper.jar{PART_SUFFIX}").write_bytes(BODY[:100000])
+    assert downloader().download(url(server), str(filepath), BODY_SHA256) == str(filepath)
+    assert filepath.read_bytes() == BODY
+
+def test_complete_part_file_is_promoted_on_416(server, tmp_path):
+    filepath = tmp_path / "paper.jar"
+    (tmp_path / f"paper.jar{PART_SUFFIX}").write_bytes(BODY)
+    assert downloader().download(url(server), str(filepath), BODY_SHA256) == str(filepath)
+    assert filepath.read_bytes() == BODY
+    assert server.requests == [("GET", f"bytes={len(BODY)}-")]
+
+def test_wrong_part_file_is_downloaded_again_on_416(server, tmp_path):
+    filepath = tmp_path / "paper.jar"
+    (tmp_path / f"paper.jar{PART_SUFFIX}").write_bytes(bytes(len(BODY)))
+    assert downloader().download(url(server), str(filepath), BODY_SHA256) == str(filepath)
+    assert filepath.read_bytes() == BODY
+    assert server.requests == [("GET", f"bytes={len(BODY)}-"), ("GET", None)]
+
+def test_segmented_download(server, tmp_path):
+    filepath = tmp_path / "paper.jar"
+    result = downloader(segments=4, parallel_threshold=1).download(url(server), str(filepath), BODY_SHA256)
+    assert result == str(filepath)
+    assert filepath.read_bytes() == BODY
+    ranges = sorted(byte_range for method, byte_range in server.requests if method == "GET")
+    assert len(ranges) == 4
+    assert server.requests[0] == ("HEAD", None)
+
+def test_hash_mismatch_removes_part_file(server, tmp_path):
+    filepath = tmp_path / "paper.jar"
+    assert downloader().download(url(server), str(filepath), "0" * 64) is None
+    assert not os.path.exists(filepath)
+    assert not os.path.exists(f"{filepath}{PART_SUFFIX}")
@@ -0,0 +1,78 @@
+import os
+from datetime import datetime, timedelta
+
+from updater.backup_retention import BACKUP_TIMESTAMP_FORMAT, BackupCatalog, RetentionPolicy, apply_retention
+
+NOW = datetime(2026, 3, 31, 18)
+GIB = 1024 ** 3
+
+def backup_name(timestamp, server="survival"):
+    return f"mcbackup_{server}_{timestamp.strftime(BACKUP_TIMESTAMP_FORMAT)}.tar.gz"
+
+def backups(count=240, every_hours=6, size=1):
+    """Catalog entries newest first: one backup every few hours for 60 days up to NOW."""
+    timestamps = [NOW - timedelta(hours=every_hours * step) for step in range(count)]
+    return [(backup_name(timestamp), "survival", timestamp, size) for timestamp in timestamps]
+
+def kept(policy, entries=None):
+    keep, delete = policy.select(entries or backups(), now=NOW)
+    assert len(keep) + len(delete) == len(entries or backups())
+    return [timestamp for _, _, timestamp, _ in keep]
+
+def test_daily_keeps_newest_backup_of_each_day():
+    assert kept(RetentionPolicy(daily=3)) == [datetime(2026, 3, 31, 18), datetime(2026, 3, 30, 18),
+                                              datetime(2026, 3, 29, 18)]
+
+def test_weekly_keeps_newest_backup_of_each_iso_week():
+    assert kept(RetentionPolicy(weekly=3)) == [datetime(2026, 3, 31, 18), datetime(2026, 3, 29, 18),
+                                               datetime(2026, 3, 22, 18)]
+
+def test_monthly_keeps_newest_backup_of_each_month():
+    assert kept(RetentionPolicy(monthly=3)) == [datetime(2026, 3, 31, 18), datetime(2026, 2, 28, 18),
+                                                datetime(2026, 1, 31, 18)]
+
+def test_tiers_are_combined():
+    assert kept(RetentionPolicy(hourly=2, daily=2, weekly=2, monthly=2)) == [
+        datetime(2026, 3, 31, 18), datetime(2026, 3, 31, 12), datetime(2026, 3, 30, 18),
+        datetime(2026, 3, 29, 18), datetime(2026, 2, 28, 18),
+    ]
+
+def test_days_to_keep_applies_without_tiers():
+    timestamps = kept(RetentionPolicy(days_to_keep=2))
+    assert timestamps[0] == NOW
+    assert timestamps[-1] == NOW - timedelta(days=2)
+    assert len(timestamps) == 9
+
+def test_newest_backup_is_always_kept():
+    entries = [(backup_name(NOW - timedelta(days=90)), "survival", NOW - timedelta(days=90), 1)]
+    assert kept(RetentionPolicy(days_to_keep=7), entries) == [NOW - timedelta(days=90)]
+
+def test_max_total_gb_trims_oldest_kept_backups():
+    entries = backups(size=GIB)
+    assert kept(RetentionPolicy(daily=5, max_total_gb=3), entries) == [
+        datetime(2026, 3, 31, 18), datetime(2026, 3, 30, 18), datetime(2026, 3, 29, 18),
+    ]
+    keep, delete = RetentionPolicy(daily=5, max_total_gb=0.5).select(entries, now=NOW)
+    assert [timestamp for _, _, timestamp, _ in keep] == [NOW]
+    assert len(delete) == len(entries) - 1
+
+def test_apply_retention_deletes_files_and_updates_catalog(tmp_path):
+    for step in range(4):
+        timestamp = NOW - timedelta(days=step)
+        (tmp_path / backup_name(timestamp)).write_bytes(b"backup")
+        (tmp_path / backup_name(timestamp, "creative")).write_bytes(b"backup")
+    policy = RetentionPolicy(daily=2)
+
+    assert apply_retention(str(tmp_path), "survival", policy, dry_run=True) == [
+        backup_name(NOW - timedelta(days=2)), backup_name(NOW - timedelta(days=3)),
+    ]
+    assert len(os.listdir(tmp_path)) == 9
+
+    apply_retention(str(tmp_path), "survival", policy)
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("mcbackup_survival")) == [
+        backup_name(NOW - timedelta(days=1)), backup_name(NOW),
+    ]
+    assert len(BackupCatalog(str(tmp_path)).list("creative")) == 4
+    assert [entry[0] for entry in BackupCatalog(str(tmp_path)).list("survival", rescan=True)] == [
+        backup_name(NOW), backup_name(NOW - timedelta(days=1)),
+    ]
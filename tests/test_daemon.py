@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from updater.daemon import UpdateDaemon
+
+@pytest.fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+def test_failed_update_is_recorded_and_retried(tmp_path):
+    calls = []
+
+    def update(names):
+        calls.append(names)
+        if len(calls) == 1:
+            raise OSError("No space left on device")
+        return [{'artifact': "paper", 'path': "paper.jar", 'seconds': 0.1, 'error': None}]
+
+    status_file = tmp_path / "status.json"
+    daemon = UpdateDaemon({"paper": lambda: ("1.21.4", 100)}, update, status_file=str(status_file))
+    daemon.poll()
+    status = json.loads(status_file.read_text())
+    assert status['artifacts']['paper']['error'] == "OSError: No space left on device"
+    assert 'build' not in status['artifacts']['paper']
+
+    daemon.poll()
+    assert calls == [["paper"], ["paper"]]
+    assert daemon.status['artifacts']['paper']['build'] == ["1.21.4", 100]
+    daemon.poll()
+    assert len(calls) == 2
+
+def test_exit_from_update_does_not_stop_polling(tmp_path):
+    def update(names):
+        raise SystemExit(1)
+
+    daemon = UpdateDaemon({"paper": lambda: ("1.21.4", 100)}, update, status_file=str(tmp_path / "status.json"))
+    daemon.poll()
+    assert daemon.status['artifacts']['paper']['error'] == "SystemExit: 1"
@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from updater.archiver import Archiver
+from updater.deployment import Deployment, deployed_files
+from updater.file_manager import FileManager
+from updater.incremental_backup import IncrementalBackup
+
+def make_plugin(path, version):
+    with zipfile.ZipFile(path, 'w') as jar:
+        jar.writestr("plugin.yml", f"name: Example\nversion: {version}\n")
+
+@pytest.fixture
+def server(tmp_path):
+    server_directory = tmp_path / "server"
+    (server_directory / "plugins").mkdir(parents=True)
+    (server_directory / "server.properties").write_text("motd=test\n")
+    jar = tmp_path / "Example.jar"
+    make_plugin(jar, "1.0")
+    deployment = Deployment(str(server_directory))
+    deployment.activate(deployment.stage({"plugins/Example.jar": str(jar)}))
+    return server_directory
+
+def test_server_jar_is_a_link_into_the_release(server):
+    assert os.path.islink(server / "plugins" / "Example.jar")
+    assert list(deployed_files(str(server))) == ["plugins/Example.jar"]
+
+def test_archive_stores_deployed_jar_contents(server):
+    buffer = io.BytesIO()
+    Archiver(str(server)).write(buffer)
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer) as tar:
+        member = tar.getmember("plugins/Example.jar")
+        assert member.isreg()
+        assert tar.extractfile(member).read() == (server / "plugins" / "Example.jar").read_bytes()
+        assert not any(name.startswith(".deployments") for name in tar.getnames())
+
+def test_incremental_snapshot_restores_deployed_jar(server, tmp_path):
+    backup = IncrementalBackup(str(server), str(tmp_path / "repository"))
+    snapshot = backup.create_snapshot()
+    backup.restore(snapshot, str(tmp_path / "restore"))
+    restored = tmp_path / "restore" / "plugins" / "Example.jar"
+    assert not os.path.islink(restored)
+    assert restored.read_bytes() == (server / "plugins" / "Example.jar").read_bytes()
+
+def test_staging_copy_replaces_deployed_links(server, tmp_path):
+    file_manager = FileManager(str(server), str(tmp_path / "backups"))
+    staging_directory = tmp_path / "staging"
+    file_manager._copy_server_directory(str(staging_directory))
+    staged = staging_directory / "plugins" / "Example.jar"
+    assert not os.path.islink(staged)
+    assert staged.read_bytes() == (server / "plugins" / "Example.jar").read_bytes()
+
+def write_release(deployment, name, created):
+    release_directory = os.path.join(deployment.releases_directory, name)
+    os.makedirs(release_directory)
+    with open(os.path.join(release_directory, "release.json"), 'w') as f:
+        json.dump({'created': created, 'kind': "staged", 'files': {}}, f)
+
+def test_releases_are_ordered_and_pruned_by_creation(tmp_path):
+    deployment = Deployment(str(tmp_path / "server"), keep=1)
+    write_release(deployment, "2026-01-01-000000-9", "2026-01-01T00:00:09")
+    write_release(deployment, "2026-01-01-000000-10", "2026-01-01T00:00:10")
+    write_release(deployment, "2026-01-01-000000", "2026-01-01T00:00:00")
+    assert deployment.list_releases() == ["2026-01-01-000000", "2026-01-01-000000-9", "2026-01-01-000000-10"]
+    deployment.prune()
+    assert deployment.list_releases() == ["2026-01-01-000000-10"]
+
+def test_adopted_release_is_named_like_staged_ones(server):
+    deployment = Deployment(str(server))
+    kinds = {deployment.load_release(release)['kind']: release for release in deployment.list_releases()}
+    assert set(kinds) == {"adopted", "staged"}
+    assert kinds["adopted"] == deployment.previous_release()
+    assert not kinds["adopted"].endswith("-adopted")
+
+def test_hashes_are_indexed_under_deployments_only(server, tmp_path):
+    assert os.path.isfile(server / ".deployments" / ".fingerprints.json")
+    assert not os.path.exists(server / ".fingerprints.json")
+    assert not os.path.exists(server / "plugins" / ".fingerprints.json")
+    assert not os.path.exists(tmp_path / ".fingerprints.json")
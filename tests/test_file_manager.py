@@ -0,0 +1,46 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from updater import file_manager as file_manager_module
+from updater.file_manager import FileManager
+
+@pytest.fixture
+def server(tmp_path):
+    server_directory = tmp_path / "server"
+    (server_directory / "plugins" / "dynmap" / "web").mkdir(parents=True)
+    (server_directory / "plugins" / "dynmap" / "web" / "tile.png").write_bytes(b"tile")
+    (server_directory / "plugins" / "dynmap" / "configuration.txt").write_text("render: true\n")
+    (server_directory / "plugins" / "Geyser.jar").write_bytes(b"jar")
+    (server_directory / "world" / "region").mkdir(parents=True)
+    (server_directory / "world" / "region" / "r.0.0.mca").write_bytes(b"region")
+    (server_directory / "logs").mkdir()
+    (server_directory / "logs" / "latest.log").write_text("log\n")
+    (server_directory / ".cache").mkdir()
+    return server_directory
+
+def copied_files(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, names in os.walk(directory) for name in names)
+
+EXPECTED = ["plugins/Geyser.jar", "plugins/dynmap/configuration.txt", "world/region/r.0.0.mca"]
+
+def test_copy_leaves_out_nested_excludes(server, tmp_path):
+    staging_directory = tmp_path / "staging"
+    FileManager(str(server), str(tmp_path / "backups"))._copy_server_directory(
+        str(staging_directory), ["logs", "plugins/dynmap/web"])
+    assert copied_files(staging_directory) == EXPECTED
+    assert oct(os.stat(staging_directory / "plugins").st_mode) == oct(os.stat(server / "plugins").st_mode)
+
+def test_copy_falls_back_after_partial_cp(server, tmp_path, monkeypatch):
+    def failing_cp(command, cwd, **kwargs):
+        shutil.copytree(os.path.join(cwd, "world"), os.path.join(command[-1], "world"))
+        raise subprocess.CalledProcessError(1, command)
+
+    monkeypatch.setattr(file_manager_module.subprocess, "run", failing_cp)
+    staging_directory = tmp_path / "staging"
+    FileManager(str(server), str(tmp_path / "backups"))._copy_server_directory(
+        str(staging_directory), ["logs", "plugins/dynmap/web"])
+    assert copied_files(staging_directory) == EXPECTED
@@ -0,0 +1,98 @@
+import json
+import os
+import struct
+
+import pytest
+
+from updater.incremental_backup import IncrementalBackup
+from updater.region_file import REGION_HEADER_SIZE, SECTOR_SIZE
+
+@pytest.fixture
+def backup(tmp_path):
+    server_directory = tmp_path / "server"
+    (server_directory / "world").mkdir(parents=True)
+    (server_directory / "world" / "level.dat").write_bytes(b"level")
+    (server_directory / "server.properties").write_text("motd=test\n")
+    return IncrementalBackup(str(server_directory), str(tmp_path / "repository"), region_aware=False)
+
+def rename_file(backup, snapshot, old_path, new_path):
+    manifest_path = os.path.join(backup.snapshots_directory, f"{snapshot}.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest['files'][new_path] = manifest['files'].pop(old_path)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+
+@pytest.mark.parametrize("name", ["../escaped.properties", "world/../../escaped.properties", "/tmp/escaped.properties"])
+def test_restore_rejects_paths_outside_target(backup, tmp_path, name):
+    snapshot = backup.create_snapshot()
+    rename_file(backup, snapshot, "server.properties", name)
+    with pytest.raises(ValueError):
+        backup.restore(snapshot, str(tmp_path / "restore"))
+    assert not (tmp_path / "escaped.properties").exists()
+    assert not os.path.exists("/tmp/escaped.properties")
+
+def test_restore_does_not_write_through_symlinks(backup, tmp_path):
+    snapshot = backup.create_snapshot()
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    target = tmp_path / "restore"
+    target.mkdir()
+    os.symlink(str(outside), str(target / "world"))
+    with pytest.raises(ValueError):
+        backup.restore(snapshot, str(target), ["world"])
+    assert not (outside / "level.dat").exists()
+
+def test_snapshots_in_the_same_second_are_kept_apart(backup):
+    first = backup.create_snapshot()
+    with open(os.path.join(backup.server_directory, "server.properties"), 'w') as f:
+        f.write("motd=changed\n")
+    second = backup.create_snapshot()
+    assert first != second
+    assert backup.list_snapshots() == [first, second]
+    assert [entry[0] for entry in backup.snapshot_entries()] == [second, first]
+
+def chunk_record(payload):
+    return struct.pack('>IB', len(payload) + 1, 2) + payload
+
+def write_region(path, records, timestamps):
+    """Writes a region file with one chunk per record, each in its own zero-padded sector."""
+    header = bytearray(REGION_HEADER_SIZE)
+    body = bytearray()
+    for index, record in enumerate(records):
+        struct.pack_into('>I', header, index * 4, ((2 + index) << 8) | 1)
+        struct.pack_into('>I', header, SECTOR_SIZE + index * 4, timestamps[index])
+        body += record.ljust(SECTOR_SIZE, b'\0')
+    path.write_bytes(bytes(header + body))
+
+@pytest.fixture
+def world(tmp_path):
+    server_directory = tmp_path / "server"
+    (server_directory / "world" / "region").mkdir(parents=True)
+    return server_directory
+
+def test_region_snapshot_stores_only_changed_chunk(world, tmp_path):
+    region = world / "world" / "region" / "r.0.0.mca"
+    records = [chunk_record(os.urandom(1000)) for _ in range(3)]
+    write_region(region, records, [100, 100, 100])
+    backup = IncrementalBackup(str(world), str(tmp_path / "repository"))
+    first = backup.create_snapshot()
+    original = region.read_bytes()
+
+    records[1] = chunk_record(os.urandom(1200))
+    write_region(region, records, [100, 200, 100])
+    os.utime(region, ns=(os.stat(region).st_mtime_ns + 10**9,) * 2)
+    second = backup.create_snapshot()
+    changed = region.read_bytes()
+
+    first_chunks = backup.load_manifest(first)['files']["world/region/r.0.0.mca"]['region']['chunks']
+    second_manifest = backup.load_manifest(second)
+    second_chunks = second_manifest['files']["world/region/r.0.0.mca"]['region']['chunks']
+    assert [chunk[4] for chunk in first_chunks][0::2] == [chunk[4] for chunk in second_chunks][0::2]
+    assert first_chunks[1][4] != second_chunks[1][4]
+    assert second_manifest['stored_bytes'] == REGION_HEADER_SIZE + len(records[1])
+
+    backup.restore(first, str(tmp_path / "first"))
+    backup.restore(second, str(tmp_path / "second"))
+    assert (tmp_path / "first" / "world" / "region" / "r.0.0.mca").read_bytes() == original
+    assert (tmp_path / "second" / "world" / "region" / "r.0.0.mca").read_bytes() == changed
@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+from updater.archiver import Archiver
+from updater.indexed_archive import IndexedArchive, IndexedGzipWriter, index_path
+
+@pytest.fixture
+def archive(tmp_path):
+    source = tmp_path / "server"
+    (source / "world").mkdir(parents=True)
+    (source / "world" / "level.dat").write_bytes(b"level" * 100)
+    (source / "server.properties").write_text("motd=test\n")
+    path = str(tmp_path / "backup.tar.gz")
+    members = []
+    with IndexedGzipWriter(path) as writer:
+        Archiver(str(source)).write(writer, members)
+        writer.close()
+        writer.write_index(members)
+    return path
+
+def rename_member(path, old_name, new_name):
+    with open(index_path(path)) as f:
+        index = json.load(f)
+    for member in index['members']:
+        if member['name'] == old_name:
+            member['name'] = new_name
+    with open(index_path(path), 'w') as f:
+        json.dump(index, f)
+
+def test_extract_restores_files(archive, tmp_path):
+    target = tmp_path / "restore"
+    IndexedArchive(archive).extract(str(target))
+    assert (target / "world" / "level.dat").read_bytes() == b"level" * 100
+    assert (target / "server.properties").read_text() == "motd=test\n"
+
+@pytest.mark.parametrize("name", ["../escaped.properties", "world/../../escaped.properties", "/tmp/escaped.properties"])
+def test_extract_rejects_paths_outside_target(archive, tmp_path, name):
+    rename_member(archive, "server.properties", name)
+    with pytest.raises(ValueError):
+        IndexedArchive(archive).extract(str(tmp_path / "restore"))
+    assert not (tmp_path / "escaped.properties").exists()
+
+def test_extract_does_not_write_through_symlinked_directory(archive, tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    target = tmp_path / "restore"
+    target.mkdir()
+    os.symlink(str(outside), str(target / "world"))
+    with pytest.raises(ValueError):
+        IndexedArchive(archive).extract(str(target), ["world/level.dat"])
+    assert not (outside / "level.dat").exists()
+
+def test_extract_replaces_symlinked_file(archive, tmp_path):
+    outside = tmp_path / "outside.properties"
+    outside.write_text("untouched")
+    target = tmp_path / "restore"
+    target.mkdir()
+    os.symlink(str(outside), str(target / "server.properties"))
+    IndexedArchive(archive).extract(str(target), ["server.properties"])
+    assert outside.read_text() == "untouched"
+    assert not os.path.islink(target / "server.properties")
+    assert (target / "server.properties").read_text() == "motd=test\n"
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+import zipfile
+
+import pytest
+
+from updater.artifact_downloader import ArtifactDownloader
+from updater.http_client import HttpClient
+from updater.jar_delta import apply_delta, create_delta, delta_url
+from updater.mirror import MirrorRecorder, create_mirror_server
+
+URL = "https://api.papermc.io/v2/projects/paper/versions/1.21.4/builds/2/downloads/paper-1.21.4-2.jar"
+LIBRARY = os.urandom(256 * 1024)
+
+def write_jar(path, entries):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as jar:
+        for name, data in entries.items():
+            jar.writestr(name, data)
+    return str(path)
+
+def sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@pytest.fixture
+def jars(tmp_path):
+    base = write_jar(tmp_path / "paper-1.21.4-1.jar", {
+        "META-INF/MANIFEST.MF": "Main-Class: io.papermc.paperclip.Main\n",
+        "libraries/library.jar": LIBRARY,
+        "version.json": '{"build": 1}',
+        "removed.txt": "only in the old build",
+    })
+    target = write_jar(tmp_path / "paper-1.21.4-2.jar", {
+        "META-INF/MANIFEST.MF": "Main-Class: io.papermc.paperclip.Main\n",
+        "libraries/library.jar": LIBRARY,
+        "version.json": '{"build": 2}',
+        "added.txt": "only in the new build",
+    })
+    return base, target
+
+def test_delta_rebuilds_target_byte_for_byte(jars, tmp_path):
+    base, target = jars
+    delta_path = str(tmp_path / "update.delta")
+    delta_size = create_delta(base, target, delta_path)
+    assert delta_size < os.path.getsize(target) / 4
+
+    rebuilt = str(tmp_path / "rebuilt.jar")
+    assert apply_delta(base, delta_path, rebuilt, sha256(base)) == sha256(target)
+    with open(rebuilt, 'rb') as f, open(target, 'rb') as expected:
+        assert f.read() == expected.read()
+    with zipfile.ZipFile(rebuilt) as jar:
+        assert jar.read("version.json") == b'{"build": 2}'
+        assert jar.read("added.txt") == b"only in the new build"
+        assert "removed.txt" not in jar.namelist()
+
+def test_delta_from_another_base_is_rejected(jars, tmp_path):
+    base, target = jars
+    delta_path = str(tmp_path / "update.delta")
+    create_delta(base, target, delta_path)
+    with pytest.raises(ValueError):
+        apply_delta(target, delta_path, str(tmp_path / "rebuilt.jar"), sha256(target))
+
+def test_non_jar_is_rejected(tmp_path):
+    text = tmp_path / "notes.txt"
+    text.write_text("not a zip")
+    with pytest.raises(ValueError):
+        create_delta(str(text), str(text), str(tmp_path / "update.delta"))
+
+@pytest.fixture
+def mirror(jars, tmp_path):
+    base, target = jars
+    root = str(tmp_path / "mirror")
+    recorder = MirrorRecorder(root)
+    recorder.record_file(URL, target)
+    delta_path = str(tmp_path / "recorded.delta")
+    create_delta(base, target, delta_path)
+    recorder.record_file(delta_url(URL, sha256(base)), delta_path, "application/octet-stream")
+    server = create_mirror_server(root, port=0)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+def download(mirror_url, filepath, base_path):
+    downloader = ArtifactDownloader(HttpClient(retries=0, cache=False, mirror_url=mirror_url), delta=True)
+    return downloader.download(URL, str(filepath), base_path=base_path)
+
+def test_download_applies_recorded_delta(jars, mirror, tmp_path, capsys):
+    base, target = jars
+    filepath = tmp_path / "downloads" / "paper-1.21.4-2.jar"
+    assert download(mirror, filepath, base) == str(filepath)
+    assert sha256(filepath) == sha256(target)
+    assert "Rebuilt paper-1.21.4-2.jar" in capsys.readouterr().out
+
+def test_download_falls_back_when_no_delta_from_base_was_recorded(jars, mirror, tmp_path, capsys):
+    _, target = jars
+    other_base = write_jar(tmp_path / "paper-1.21.3-9.jar", {"version.json": '{"build": 9}'})
+    filepath = tmp_path / "downloads" / "paper-1.21.4-2.jar"
+    assert download(mirror, filepath, other_base) == str(filepath)
+    assert sha256(filepath) == sha256(target)
+    assert "Rebuilt" not in capsys.readouterr().out
+
+def test_download_falls_back_when_base_is_missing(jars, mirror, tmp_path, capsys):
+    _, target = jars
+    filepath = tmp_path / "downloads" / "paper-1.21.4-2.jar"
+    assert download(mirror, filepath, str(tmp_path / "deleted.jar")) == str(filepath)
+    assert sha256(filepath) == sha256(target)
+    assert "Rebuilt" not in capsys.readouterr().out
@@ -0,0 +1,54 @@
+from main import merge_artifacts
+from updater.update_plan import UpdatePlan
+
+SHARED = [
+    {'type': "paper", 'name': "Paper", 'channel': "stable"},
+    {'type': "geyser", 'name': "Geyser"},
+]
+
+def test_identical_artifacts_are_fetched_once():
+    server_artifacts = {"one": list(SHARED), "two": list(SHARED)}
+    assert merge_artifacts(server_artifacts) == SHARED
+    assert server_artifacts == {"one": SHARED, "two": SHARED}
+
+def test_differing_artifact_gets_a_per_server_name():
+    pinned = [
+        {'type': "paper", 'name': "Paper", 'version': "1.21.4"},
+        {'type': "viaversion", 'name': "ViaVersion"},
+        {'type': "spigotmc", 'name': "ViaBackwards", 'url': "https://example.invalid", 'filename': "ViaBackwards.jar",
+         'after': ["ViaVersion", "Paper"]},
+    ]
+    server_artifacts = {"one": list(pinned), "two": list(SHARED)}
+    merged = merge_artifacts(server_artifacts)
+    assert [artifact['name'] for artifact in merged] == ["Paper", "ViaVersion", "ViaBackwards", "Paper@two", "Geyser"]
+    assert server_artifacts["one"] == pinned
+    assert server_artifacts["two"][0] == {'type': "paper", 'name': "Paper@two", 'channel': "stable"}
+
+    server_artifacts = {"two": list(SHARED), "one": list(pinned)}
+    merged = merge_artifacts(server_artifacts)
+    assert [artifact['name'] for artifact in merged] == ["Paper", "Geyser", "Paper@one", "ViaVersion", "ViaBackwards"]
+    assert server_artifacts["one"][0] == {'type': "paper", 'name': "Paper@one", 'version': "1.21.4"}
+    assert server_artifacts["one"][2]['after'] == ["ViaVersion", "Paper@one"]
+    assert UpdatePlan(merged).order.index("Paper@one") < UpdatePlan(merged).order.index("ViaBackwards")
+
+def test_renamed_plugin_keeps_its_deploy_path():
+    server_artifacts = {
+        "one": [{'type': "geyser", 'name': "Geyser"}],
+        "two": [{'type': "geyser", 'name': "Geyser", 'channel': "beta"}],
+    }
+    merge_artifacts(server_artifacts)
+    assert server_artifacts["two"] == [
+        {'type': "geyser", 'name': "Geyser@two", 'channel': "beta", 'deploy_as': "plugins/Geyser.jar"},
+    ]
+
+def test_dependent_of_renamed_artifact_is_renamed_too():
+    backwards = {'type': "spigotmc", 'name': "ViaBackwards", 'url': "https://example.invalid",
+                 'filename': "ViaBackwards.jar", 'after': ["ViaVersion"]}
+    server_artifacts = {
+        "one": [{'type': "viaversion", 'name': "ViaVersion"}, backwards],
+        "two": [{'type': "viaversion", 'name': "ViaVersion", 'cache_ttl': 60}, backwards],
+    }
+    merged = merge_artifacts(server_artifacts)
+    assert [artifact['name'] for artifact in merged] == ["ViaVersion", "ViaBackwards", "ViaVersion@two", "ViaBackwards@two"]
+    assert server_artifacts["two"][1]['after'] == ["ViaVersion@two"]
+    assert server_artifacts["two"][1]['deploy_as'] == "plugins/ViaBackwards.jar"
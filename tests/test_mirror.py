@@ -0,0 +1,73 @@
+import http.client
+import threading
+
+import pytest
+
+from updater.mirror import MirrorRecorder, create_mirror_server, mirror_path, rewrite_url
+
+BODY = bytes(range(256)) * 4
+URL = "https://api.papermc.io/v2/projects/paper"
+
+@pytest.fixture
+def mirror(tmp_path):
+    root = tmp_path / "mirror"
+    MirrorRecorder(str(root)).record_bytes(URL, BODY, 'application/json')
+    (tmp_path / "__resource__").write_bytes(b"outside the mirror")
+    (tmp_path / "secret").mkdir()
+    (tmp_path / "secret" / "__resource__").write_bytes(b"outside the mirror")
+    server = create_mirror_server(str(root), port=0)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+def request(port, path, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+def test_rewrite_url_keeps_host_path_and_query():
+    assert rewrite_url("http://mirror:8765/", "https://host/a/b?x=1") == "http://mirror:8765/host/a/b?x=1"
+
+def test_serves_recorded_response(mirror):
+    status, headers, body = request(mirror, "/api.papermc.io/v2/projects/paper")
+    assert status == 200
+    assert body == BODY
+    assert headers['Content-Type'] == 'application/json'
+
+def test_revalidates_with_etag(mirror):
+    _, headers, _ = request(mirror, "/api.papermc.io/v2/projects/paper")
+    status, _, body = request(mirror, "/api.papermc.io/v2/projects/paper", {'If-None-Match': headers['ETag']})
+    assert status == 304
+    assert body == b''
+
+def test_serves_byte_ranges(mirror):
+    status, headers, body = request(mirror, "/api.papermc.io/v2/projects/paper", {'Range': 'bytes=10-19'})
+    assert status == 206
+    assert body == BODY[10:20]
+    assert headers['Content-Range'] == f"bytes 10-19/{len(BODY)}"
+
+@pytest.mark.parametrize("range_header", ["bytes=20-10", f"bytes={len(BODY)}-"])
+def test_rejects_unsatisfiable_ranges(mirror, range_header):
+    status, headers, body = request(mirror, "/api.papermc.io/v2/projects/paper", {'Range': range_header})
+    assert status == 416
+    assert headers['Content-Range'] == f"bytes */{len(BODY)}"
+
+@pytest.mark.parametrize("path", ["/../", "/..", "/../secret", "/api.papermc.io/../../secret"])
+def test_does_not_serve_outside_the_root(mirror, path):
+    status, _, body = request(mirror, path)
+    assert status == 404
+    assert b"outside the mirror" not in body
+
+def test_unknown_resource_is_not_found(mirror):
+    assert request(mirror, "/api.papermc.io/v2/projects/velocity")[0] == 404
+
+@pytest.mark.parametrize("url", ["https://../secret", "https:///secret"])
+def test_mirror_path_rejects_urls_outside_the_root(tmp_path, url):
+    with pytest.raises(ValueError):
+        mirror_path(str(tmp_path), url)
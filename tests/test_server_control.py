@@ -0,0 +1,89 @@
+import socket
+import zipfile
+
+import pytest
+
+from benchmarks.fake_rcon import MAX_PAYLOAD_BYTES, FakeRconServer
+from updater.deployment import Deployment, switch_release
+from updater.server_control import (RconClient, RconConnectionLost, RconControl, RconError, ScreenControl,
+                                    open_control_channel)
+
+@pytest.fixture
+def fake_server():
+    server = FakeRconServer(password="secret")
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def client(fake_server):
+    settings = fake_server.settings()
+    client = RconClient(settings['host'], settings['port'], settings['password'], timeout=5)
+    yield client
+    client.close()
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_command_returns_response(client, fake_server):
+    assert client.command("save-off") == "Automatic saving is now disabled"
+    assert fake_server.commands == ["save-off"]
+
+def test_save_all_waits_for_confirmation(client):
+    assert RconControl(client).save_all()
+
+def test_wrong_password_is_refused(fake_server):
+    settings = fake_server.settings()
+    client = RconClient(settings['host'], settings['port'], "wrong", timeout=5)
+    with pytest.raises(RconError):
+        client.connect()
+    assert not RconControl(client).is_running()
+    assert fake_server.commands == []
+
+def test_multi_packet_response_is_joined(client, fake_server):
+    response = "".join(f"{number:05d} é\n" for number in range(2000))
+    assert len(response.encode('utf-8')) > 3 * MAX_PAYLOAD_BYTES
+    fake_server.responses["list"] = response
+    assert client.command("list") == response
+    assert client.command("save-on") == "Automatic saving is now enabled"
+
+def test_reconnects_after_dropped_connection(client, fake_server):
+    client.command("save-off")
+    fake_server.drop_connections()
+    assert client.command("save-on") == "Automatic saving is now enabled"
+    assert fake_server.connections == 2
+    assert fake_server.commands == ["save-off", "save-on"]
+
+def test_control_channel_uses_rcon_when_server_answers(fake_server):
+    control = open_control_channel("minecraft", dict(fake_server.settings(), timeout=5))
+    assert isinstance(control, RconControl)
+
+def test_control_channel_falls_back_to_screen_on_wrong_password(fake_server):
+    settings = dict(fake_server.settings(), password="wrong", timeout=5)
+    control = open_control_channel("minecraft", settings)
+    assert isinstance(control, ScreenControl)
+    assert control.screen_name == "minecraft"
+
+def test_control_channel_falls_back_to_screen_when_port_is_closed():
+    control = open_control_channel("minecraft", {'host': "127.0.0.1", 'port': closed_port(), 'timeout': 5})
+    assert isinstance(control, ScreenControl)
+
+def test_command_is_not_repeated_when_connection_drops_after_sending(client, fake_server):
+    client.command("save-off")
+    with pytest.raises(RconConnectionLost):
+        client.command("restart")
+    assert fake_server.commands == ["save-off", "restart"]
+    assert client.command("save-on") == "Automatic saving is now enabled"
+
+def test_switch_release_sends_restart_once(fake_server, tmp_path):
+    deployment = Deployment(str(tmp_path / "server"))
+    jar = tmp_path / "Example.jar"
+    with zipfile.ZipFile(jar, 'w') as f:
+        f.writestr("plugin.yml", "name: Example\n")
+    release = deployment.stage({"plugins/Example.jar": str(jar)})
+    control = open_control_channel("minecraft", dict(fake_server.settings(), timeout=5))
+    assert switch_release(deployment, release, control, "restart")
+    assert fake_server.commands == ["restart"]
+    assert deployment.current_release() == release
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from downloaders.registry import DOWNLOADERS, ArtifactHandle
+from updater.update_plan import UpdatePlan
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """Registers a "fake" artifact type whose download records its name and fails if the spec says so."""
+    finished = []
+    lock = threading.Lock()
+
+    def factory(download_directory, artifact):
+        def download():
+            if artifact.get('fail'):
+                raise OSError(f"{artifact['name']} is unavailable")
+            with lock:
+                finished.append(artifact['name'])
+            return f"{download_directory}/{artifact['name']}.jar"
+        return ArtifactHandle(download, lambda: (artifact['name'], 1))
+
+    monkeypatch.setitem(DOWNLOADERS, "fake", factory)
+    return finished
+
+def fake(name, after=None, fail=False):
+    return {'type': "fake", 'name': name, 'after': after or [], 'fail': fail}
+
+def test_order_puts_dependencies_first(downloads):
+    plan = UpdatePlan([fake("ViaBackwards", ["ViaVersion"]), fake("ViaRewind", ["ViaBackwards"]),
+                       fake("ViaVersion"), fake("Paper")])
+    assert plan.order.index("ViaVersion") < plan.order.index("ViaBackwards") < plan.order.index("ViaRewind")
+
+def test_run_waits_for_dependencies(downloads, tmp_path):
+    plan = UpdatePlan([fake("ViaRewind", ["ViaBackwards"]), fake("ViaBackwards", ["ViaVersion"]), fake("ViaVersion")])
+    results = plan.run(str(tmp_path), max_workers=3)
+    assert downloads == ["ViaVersion", "ViaBackwards", "ViaRewind"]
+    assert [result['error'] for result in results] == [None, None, None]
+
+def test_dependents_of_failed_artifact_are_skipped(downloads, tmp_path):
+    plan = UpdatePlan([fake("ViaVersion", fail=True), fake("ViaBackwards", ["ViaVersion"]),
+                       fake("ViaRewind", ["ViaBackwards"]), fake("Paper")])
+    results = {result['artifact']: result for result in plan.run(str(tmp_path))}
+    assert results["ViaVersion"]['error'] == "ViaVersion is unavailable"
+    assert results["ViaBackwards"]['error'] == "skipped, ViaVersion failed"
+    assert results["ViaRewind"]['error'] == "skipped, ViaBackwards failed"
+    assert results["Paper"]['error'] is None
+    assert downloads == ["Paper"]
+
+def test_dependencies_outside_the_plan_are_ignored(downloads, tmp_path):
+    plan = UpdatePlan([fake("ViaBackwards", ["ViaVersion"])])
+    assert plan.dependencies == {"ViaBackwards": []}
+    assert plan.run(str(tmp_path))[0]['error'] is None
+
+def test_run_only_named_artifacts(downloads, tmp_path):
+    plan = UpdatePlan([fake("ViaVersion"), fake("ViaBackwards", ["ViaVersion"]), fake("Paper")])
+    assert [result['artifact'] for result in plan.run(str(tmp_path), names=["Paper"])] == ["Paper"]
+    assert downloads == ["Paper"]
+
+def test_cycles_are_rejected(downloads):
+    with pytest.raises(ValueError, match="circular"):
+        UpdatePlan([fake("A", ["C"]), fake("B", ["A"]), fake("C", ["B"]), fake("D")])
+
+def test_duplicate_and_unknown_artifacts_are_rejected(downloads):
+    with pytest.raises(ValueError, match="more than once"):
+        UpdatePlan([fake("Paper"), fake("Paper")])
+    with pytest.raises(ValueError, match="unknown type"):
+        UpdatePlan([{'type': "bukkit", 'name': "Paper"}])
+
+def test_watchers_report_latest_builds(downloads, tmp_path):
+    watchers = UpdatePlan([fake("ViaBackwards", ["ViaVersion"]), fake("ViaVersion")]).watchers(str(tmp_path))
+    assert list(watchers) == ["ViaVersion", "ViaBackwards"]
+    assert watchers["ViaVersion"]() == ("ViaVersion", 1)